@@ -0,0 +1,5 @@
+from .benchmark_utils import (timed, traced, listing_page, read_pages, corpus,
+                              serve_pages, raw_tables, load_synthetic)
+
+__all__ = (timed, traced, listing_page, read_pages, corpus, serve_pages,
+           raw_tables, load_synthetic)
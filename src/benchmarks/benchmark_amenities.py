@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import click
+import numpy as np
+import pandas as pd
+from src.features import create_amenity_features, create_pipeline
+from src.benchmarks import timed, traced
+
+# Tokens of the other features column, as found on the website
+TOKENS = ['Infissi esterni in doppio vetro / legno',
+          'Infissi esterni in triplo vetro / PVC',
+          'Infissi esterni in vetro / metallo', 'Giardino privato',
+          'Giardino comune', 'Arredato', 'Parzialmente Arredato',
+          'Solo Cucina Arredata', 'Balcone', 'Terrazza', 'Esposizione doppia',
+          'Esposizione esterna', 'Esposizione interna', 'Fibra ottica',
+          'Cancello elettrico', 'Cantina', 'Impianto di allarme', 'Mansarda',
+          'Taverna', 'Cablato', 'Idromassaggio', 'Piscina', 'Porta blindata',
+          'Armadio a muro', 'Portiere intera giornata', 'Caminetto', '']
+
+AMENITY_COLUMNS = ['Infissi', 'Giardino', 'Arredato', 'Terrazza',
+                   'Esposizione', 'Fibra_ottica', 'Cancello_elettrico',
+                   'Cantina', 'Impianto_di_allarme', 'Mansarda', 'Taverna',
+                   'Cablato', 'Idromassaggio', 'Piscina']
+
+
+def other_features(n_rows, seed=0):
+    """Return a synthetic other features column: values of up to 10
+    tokens separated by newlines, with blank tokens and missing
+    values."""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(0, 11, n_rows)
+    tokens = rng.choice(TOKENS, sizes.sum())
+    values = np.array(['\n'.join(value) for value in
+                       np.split(tokens, np.cumsum(sizes)[:-1])],
+                      dtype=object)
+    values[rng.random(n_rows) < 0.05] = None
+    return pd.DataFrame({'Altre caratteristiche': values})
+
+
+def string_parser(row):
+    """Parse string values in other features column to extract all the
+    features and store them in a list."""
+    if pd.notnull(row['Altre caratteristiche']):
+        string_list = row['Altre caratteristiche'].split('\n')
+        row['Altre_caratteristiche'] = ([string.strip().replace(' ', '_')
+                                         for string in string_list if
+                                         string.strip() != ''])
+    else:
+        row['Altre_caratteristiche'] = []
+    return row['Altre_caratteristiche']
+
+
+def create_parsed_features(data):
+    """Create feature from parsed attributes."""
+    data['Altre_caratteristiche'] = data['Altre caratteristiche'].copy()
+    data['Altre_caratteristiche'] = data.apply(string_parser, axis=1)
+    return data
+
+
+def create_windows(data):
+    """Create windows feature."""
+    data['Infissi'] = (data['Altre_caratteristiche']
+                       .apply(lambda x: str([y for y in x if 'Infissi' in y]))
+                       .str.extract('(doppio|triplo)', expand=False)
+                       .fillna('singolo'))
+    return data
+
+
+def create_garden(data):
+    """Create garden feature."""
+    data['Giardino'] = (data['Altre_caratteristiche']
+                        .apply(lambda x: str([y for y in x if 'Giardino' in
+                                              y]))
+                        .str.extract('(comune|privato)', expand=False)
+                        .fillna('non presente'))
+    return data
+
+
+def create_furnished(data):
+    """Create furnished feature."""
+    data['Arredato'] = (data['Altre_caratteristiche']
+                        .apply(lambda x: str([y for y in x if 'Arredat' in
+                                              y])))
+    data['Arredato'] = (data['Arredato']
+                        .replace({'[\'Parzialmente_'
+                                  'Arredato\']': 'parzialmente',
+                                  '[\'Solo_Cucina_Arredata\']': 'parzialmente',
+                                  '[\'Arredato\']': 'totalmente',
+                                  '[]': 'no'}))
+    return data
+
+
+def create_terrace(data):
+    """Create terrace features."""
+    data['Terrazza'] = (data['Altre_caratteristiche']
+                        .apply(lambda x: str([y for y in x if 'Terrazza' in y
+                                              or 'Balcone' in y])))
+    data.loc[~(data['Terrazza'] == '[]'), 'Terrazza'] = 'sì'
+    data.loc[data['Terrazza'] == '[]', 'Terrazza'] = 'no'
+    return data
+
+
+def create_exposure(data):
+    """Create exposure feature."""
+    data['Esposizione'] = (data['Altre_caratteristiche']
+                           .apply(lambda x: str([y for y in x if
+                                                 'Esposizione' in y]))
+                           .str.extract('(doppia|esterna|interna)',
+                                        expand=False)
+                           .fillna('esterna'))
+    return data
+
+
+def create_other_features(data):
+    """Create columns for each other feature extracted."""
+    features_list = ['Fibra_ottica', 'Cancello_elettrico', 'Cantina',
+                     'Impianto_di_allarme', 'Mansarda', 'Taverna',
+                     'Cablato', 'Idromassaggio', 'Piscina']
+    for feature in features_list:
+        mask = data['Altre_caratteristiche'].apply(lambda x: feature in x)
+        data[feature] = np.where(mask, 'sì', 'no')
+    return data
+
+
+# The chain of row-by-row steps create_amenity_features replaced
+old_chain = create_pipeline([create_parsed_features, create_windows,
+                             create_garden, create_furnished,
+                             create_terrace, create_exposure,
+                             create_other_features])
+
+
+@click.command()
+@click.option('--n-rows', type=int, default=1000000,
+              help='Number of synthetic listings.')
+def main(n_rows):
+    """Benchmark the time and peak traced memory of create_amenity_features
+    against the row-by-row chain of steps it replaced, on synthetic
+    listings, and check that they create the same features. The old
+    chain needs the pandas 1 pinned in requirements.txt
+    (pandas~=1.1.4)."""
+    data = other_features(n_rows)
+
+    # Time the steps without tracing, which slows down allocations
+    old, old_seconds = timed(old_chain, data.copy())
+    new, new_seconds = timed(create_amenity_features, data.copy())
+    old_peak = traced(old_chain, data.copy())[2]
+    new_peak = traced(create_amenity_features, data.copy())[2]
+    pd.testing.assert_frame_equal(new[AMENITY_COLUMNS],
+                                  old[AMENITY_COLUMNS])
+
+    print('{} listings, identical features'.format(n_rows))
+    print('{:<10}{:>10}{:>18}'.format('', 'seconds', 'peak memory MB'))
+    print('{:<10}{:>10.1f}{:>18.0f}'.format('old chain', old_seconds,
+                                            old_peak))
+    print('{:<10}{:>10.1f}{:>18.0f}'.format('new step', new_seconds,
+                                            new_peak))
+    print('speedup {:.1f}x'.format(old_seconds / new_seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import click
+import math
+import tempfile
+import pandas as pd
+from src.data import WebScraper
+from src.benchmarks import timed, corpus, serve_pages
+
+
+def crawl(url, n_pages, max_workers):
+    """Crawl the local website from scratch and return the scraped
+    DataFrames."""
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = WebScraper(raw_dir=tmp + '/', interim_dir=tmp, website=url,
+                             n_pages=n_pages, max_workers=max_workers,
+                             delta=False)
+        return scraper.get_data()
+
+
+@click.command()
+@click.option('--n-listings', type=int, default=200,
+              help='Number of listings served.')
+@click.option('--per-page', type=int, default=25,
+              help='Number of listings linked from each index page.')
+@click.option('--delay', type=float, default=0.02,
+              help='Server latency per request in seconds.')
+@click.option('--workers', type=int, multiple=True, default=(1, 2, 4, 8),
+              help='Numbers of concurrent connections to compare.')
+@click.option('--pages-dir', type=click.Path(exists=True), default=None,
+              help='Directory of recorded listing pages (*.html) to serve '
+                   'instead of synthetic pages.')
+def main(n_listings, per_page, delay, workers, pages_dir):
+    """Benchmark the crawl throughput of WebScraper against a local HTTP
+    server standing in for the website, for several numbers of
+    concurrent connections, and check that they scrape the same
+    DataFrames."""
+    pages = corpus(n_listings, pages_dir)
+    n_pages = math.ceil(n_listings / per_page)
+    requests = n_pages + n_listings
+
+    reference, lines = None, []
+    with serve_pages(pages, per_page, delay) as url:
+        for max_workers in workers:
+            dfs, seconds = timed(crawl, url, n_pages, max_workers)
+            if reference is None:
+                reference = dfs
+            for df, expected in zip(dfs, reference):
+                pd.testing.assert_frame_equal(df, expected)
+            lines.append('{:>8}{:>10.2f}{:>12.1f}'.format(
+                max_workers, seconds, requests / seconds))
+
+    print('{} requests, {:.0f} ms server latency'.format(requests,
+                                                         1000 * delay))
+    print('{:>8}{:>10}{:>12}'.format('workers', 'seconds', 'pages/s'))
+    print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    main()
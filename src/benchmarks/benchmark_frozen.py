@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import click
+import statistics
+import tempfile
+from src.features import parse_config, clean_data, clean_data_frozen
+from src.benchmarks import timed, load_synthetic
+
+
+@click.command()
+@click.option('--n-rows', type=int, default=20000,
+              help='Number of synthetic training listings.')
+@click.option('--batch-sizes', type=str, default='1,10,100,1000',
+              help='Comma-separated numbers of raw listings per call.')
+@click.option('--repeat', type=int, default=50,
+              help='Number of calls timed per batch size.')
+@click.option('--config-file', type=str, default='config.yml')
+def main(n_rows, batch_sizes, repeat, config_file):
+    """Benchmark the latency of the frozen cleaning pipeline saved to
+    cleaning.pkl on batches of raw listings, as when pricing listings at
+    request time: the median wall time per call and per listing."""
+    config = parse_config(config_file)
+    with tempfile.TemporaryDirectory() as tmp:
+        data = load_synthetic(tmp, config, n_rows)
+
+    fitted = {}
+    clean_data(config, statistics=fitted)(data.copy())
+    frozen = clean_data_frozen(config, data.columns).set_state(
+        {'statistics': fitted})
+
+    print('{:>8}{:>14}{:>16}'.format('batch', 'ms per call',
+                                     'ms per listing'))
+    for batch_size in map(int, batch_sizes.split(',')):
+        seconds = statistics.median(
+            timed(frozen.transform, data.iloc[i * batch_size % n_rows:]
+                  .iloc[:batch_size])[1] for i in range(repeat))
+        print('{:>8}{:>14.2f}{:>16.3f}'.format(
+            batch_size, 1000 * seconds, 1000 * seconds / batch_size))
+
+
+if __name__ == '__main__':
+    main()
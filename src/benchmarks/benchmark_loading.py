@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import click
+import os
+import shutil
+import tempfile
+import pandas as pd
+from src.features import (parse_config, read_data, load_raw_data,
+                          convert_raw_data)
+from src.benchmarks import timed, raw_tables
+
+
+def load_serial_excel(path, config):
+    """Load the raw Excel files one after the other and drop the unused
+    columns afterwards, as load_raw_data did before projection."""
+    dfs = [read_data(path + filename)
+           for filename in config['cleaning']['filenames']]
+
+    df1 = dfs[0].drop(columns=config['cleaning']['drop_cols_1'])
+    df2 = dfs[1][config['cleaning']['keep_cols']]
+    df3 = dfs[2].drop(columns=config['cleaning']['drop_cols_2'])
+    return df1.join(df2).join(df3)
+
+
+def write_excel(path, config, n_rows):
+    """Write synthetic raw Excel files of n_rows listings."""
+    for filename, table in zip(config['cleaning']['filenames'],
+                               raw_tables(n_rows, config)):
+        table.to_excel(path + filename, index=False)
+
+
+@click.command()
+@click.option('--n-rows', type=int, default=120000,
+              help='Number of synthetic listings, about 10x a crawl.')
+@click.option('--raw-dir', type=click.Path(exists=True), default=None,
+              help='Directory of raw Excel files to load instead of '
+                   'synthetic ones.')
+@click.option('--config-file', type=str, default='config.yml')
+def main(n_rows, raw_dir, config_file):
+    """Benchmark the load time of the raw data: serial Excel reads, the
+    parallel Excel fallback of load_raw_data, and its projected Parquet
+    and Feather reads, checking that they load the same data."""
+    config = parse_config(config_file)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = tmp
+        if raw_dir is None:
+            print('Writing {} synthetic listings...'.format(n_rows))
+            write_excel(path, config, n_rows)
+        else:
+            # Copy the Excel files, so that converting them does not
+            # change the files load_raw_data reads from raw_dir
+            for filename in config['cleaning']['filenames']:
+                shutil.copy(raw_dir + filename, path + filename)
+        results = []
+
+        expected, seconds = timed(load_serial_excel, path, config)
+        results.append(('serial read_excel', seconds))
+        df, seconds = timed(load_raw_data, path, config)
+        results.append(('parallel Excel', seconds))
+        pd.testing.assert_frame_equal(df, expected)
+
+        for file_format in ['parquet', 'feather']:
+            filenames = convert_raw_data(path, config, file_format)
+            df, seconds = timed(load_raw_data, path, config)
+            results.append((file_format + ', projected', seconds))
+            pd.testing.assert_frame_equal(df, expected)
+            for filename in filenames:
+                os.remove(filename)
+
+    print('{} rows, {} columns loaded'.format(len(expected),
+                                              len(expected.columns)))
+    for name, seconds in results:
+        print('{:<22}{:>8.2f} s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
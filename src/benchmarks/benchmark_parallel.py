@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import click
+import os
+import tempfile
+import pandas as pd
+from src.features import parse_config, clean_data
+from src.benchmarks import timed, load_synthetic
+
+
+@click.command()
+@click.option('--sizes', type=str, default='10000,30000,100000,300000',
+              help='Comma-separated numbers of synthetic listings, of at '
+                   'least 10000 (the cleaning drops fixed rows).')
+@click.option('--n-jobs', type=str, default='1,2,4,8',
+              help='Comma-separated numbers of processes.')
+@click.option('--config-file', type=str, default='config.yml')
+def main(sizes, n_jobs, config_file):
+    """Benchmark the wall time of the cleaning pipeline run with --n-jobs
+    processes, which run its row-local stages on partitions of the data,
+    against the serial run, checking that they clean the same data, and
+    report the size from which the parallel runs pay off."""
+    config = parse_config(config_file)
+    sizes = [int(size) for size in sizes.split(',')]
+    n_jobs = [int(n) for n in n_jobs.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        data = load_synthetic(tmp, config, max(sizes))
+
+    print('{} CPUs'.format(os.cpu_count()))
+    print('{:>8}'.format('rows') + ''.join('{:>14}'.format(
+        'n_jobs={}'.format(n)) for n in n_jobs))
+    crossover = None
+    for size in sizes:
+        times = []
+        for n in n_jobs:
+            out, seconds = timed(clean_data(config, n_jobs=n),
+                                 data.iloc[:size].copy())
+            if n == n_jobs[0]:
+                expected = out
+            pd.testing.assert_frame_equal(out, expected)
+            times.append(seconds)
+        print('{:>8}'.format(size) + ''.join(
+            '{:>8.2f} s {:>3.1f}x'.format(seconds, times[0] / seconds)
+            for seconds in times))
+        if crossover is None and min(times[1:], default=times[0]) < times[0]:
+            crossover = size
+
+    if crossover is None:
+        print('No parallel run beat the serial one at these sizes')
+    else:
+        print('Parallel runs pay off from {} rows'.format(crossover))
+
+
+if __name__ == '__main__':
+    main()
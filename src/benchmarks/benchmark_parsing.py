@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import click
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+from src.data import parse_listing
+from src.benchmarks import timed, corpus
+
+
+def soup_listing(html):
+    """Extract the record of a listing with a full BeautifulSoup tree and
+    repeated find_all calls, as the scraper did before parse_listing."""
+    record = {'zona': None, 'indirizzo': None, 'tables': []}
+    html_soup = BeautifulSoup(html, 'lxml')
+
+    tables = html_soup.find_all(class_="im-features__list")
+    for table in tables[:3]:
+        titles = table.find_all(class_='im-features__title')
+        values = table.find_all(class_='im-features__value')
+        record['tables'].append({
+            'titles': [title.text for title in titles],
+            'values': [value.text.strip() for value in values]
+        })
+
+    container = html_soup.find('div', class_="im-relatedLink__container")
+    area = container.find_all('a') if container is not None else []
+    if not area or not area[-1].has_attr('href'):
+        return record
+    record['zona'] = area[-1]['href'][63:]
+
+    addresses = html_soup.find_all(class_="im-location")
+    record['indirizzo'] = list(set([address.text for address in
+                                    addresses]))
+    return record
+
+
+def parse_all(parser, pages):
+    """Parse the pages and return their records, the wall time in
+    seconds and the growth of the peak resident memory in MB. It counts
+    the memory allocated by libxml2, which tracemalloc does not see, so
+    it must run in a fresh process."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    records, seconds = timed(lambda: [parser(html) for html in pages])
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return records, seconds, (after - before) / 1e3
+
+
+@click.command()
+@click.option('--n-pages', type=int, default=500,
+              help='Number of pages parsed.')
+@click.option('--pages-dir', type=click.Path(exists=True), default=None,
+              help='Directory of saved listing pages (*.html) to parse '
+                   'instead of synthetic pages.')
+def main(n_pages, pages_dir):
+    """Benchmark the parse throughput and peak memory of parse_listing
+    against the BeautifulSoup extraction it replaced, over a corpus of
+    listing pages, and check that they extract the same records."""
+    pages = corpus(n_pages, pages_dir)
+    megabytes = sum(len(html.encode('utf-8')) for html in pages) / 1e6
+
+    results = {}
+    for name, parser in [('BeautifulSoup', soup_listing),
+                         ('lxml XPath', parse_listing)]:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results[name] = executor.submit(parse_all, parser, pages).result()
+
+    expected = results['BeautifulSoup'][0]
+    mismatches = sum(
+        record['tables'] != reference['tables']
+        or record['zona'] != reference['zona']
+        or set(record['indirizzo'] or []) != set(reference['indirizzo']
+                                                 or [])
+        for record, reference in zip(results['lxml XPath'][0], expected))
+
+    print('{} pages ({:.1f} MB), {} mismatches'.format(
+        n_pages, megabytes, mismatches))
+    print('{:<16}{:>10}{:>10}{:>16}'.format('parser', 'seconds', 'pages/s',
+                                            'peak RSS MB'))
+    for name, (_, seconds, peak) in results.items():
+        print('{:<16}{:>10.2f}{:>10.1f}{:>16.1f}'.format(
+            name, seconds, n_pages / seconds, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import click
+import numpy as np
+import pandas as pd
+from sklearn.compose import TransformedTargetRegressor
+from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVR
+from src.features import (SCHEMA, parse_config, apply_schema, feature_types,
+                          load_split)
+from src.models import preprocessing_pipeline, FoldCache, Model
+from src.benchmarks import timed
+
+
+def cleaned_features(n_rows, seed=0):
+    """Return synthetic cleaned features with the columns and dtypes of
+    the schema and prices depending on the surface and district."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for col, dtype in SCHEMA.items():
+        if dtype == 'category':
+            data[col] = rng.choice(['{} {}'.format(col, i) for i in range(5)],
+                                   n_rows)
+        elif dtype == 'bool':
+            data[col] = rng.random(n_rows) < 0.3
+        else:
+            data[col] = rng.integers(0, 5, n_rows).astype(float)
+    X = pd.DataFrame(data).drop(columns=['Prezzo', 'Prezzo_per_m2'])
+    X['Superficie'] = np.round(rng.lognormal(4.5, 0.4, n_rows))
+    price_sqm = 3000 + 500 * pd.factorize(X['Zona'])[0]
+    y = X['Superficie'] * price_sqm * rng.lognormal(0, 0.15, n_rows)
+    return apply_schema(X), y.values
+
+
+@click.command()
+@click.option('--split-file', type=click.Path(exists=True), default=None,
+              help='Split bundle (split.parquet) to tune on instead of '
+                   'synthetic features.')
+@click.option('--n-rows', type=int, default=6672,
+              help='Number of synthetic training rows.')
+@click.option('--n-jobs', type=int, default=None,
+              help='Number of processes, defaults to the config.')
+@click.option('--config-file', type=str, default='config.yml')
+def main(split_file, n_rows, n_jobs, config_file):
+    """Benchmark the wall time of Model.tune, which searches the parameter
+    grid of the config by parallel successive halving, against the
+    exhaustive serial GridSearchCV it replaced."""
+    modeling = parse_config(config_file)['modeling']
+    n_jobs = modeling['n_jobs'] if n_jobs is None else n_jobs
+    if split_file is None:
+        X, y = cleaned_features(n_rows)
+    else:
+        X, _, y, _ = load_split(split_file)
+        y = y.values.ravel()
+
+    cat_features, bool_features, num_features = feature_types(X)
+    pipe = Pipeline([
+        ('preprocessing', preprocessing_pipeline(cat_features, num_features,
+                                                 bool_features)),
+        ('model', TransformedTargetRegressor(regressor=SVR(), func=np.log1p,
+                                             inverse_func=np.expm1))
+    ])
+
+    search = GridSearchCV(pipe, param_grid=modeling['param_grid'],
+                          cv=modeling['num_folds'],
+                          scoring=modeling['scoring'])
+    _, grid_seconds = timed(search.fit, X, y)
+
+    (model, results), halving_seconds = timed(
+        Model.tune, pipe, X, y, modeling['param_grid'],
+        cv=modeling['num_folds'], scoring=modeling['scoring'],
+        n_jobs=n_jobs, factor=modeling['halving_factor'],
+        random_state=modeling['search_seed'],
+        cache=FoldCache(modeling['fold_cache_mb']))
+    params = {name: model.get_params()[name]
+              for name in modeling['param_grid']}
+    last = results[results['iteration'] == results['iteration'].max()]
+    score = last['mean_test_score'].max()
+
+    print('{} training rows, {} candidates, {} folds'.format(
+        len(X), len(search.cv_results_['params']), modeling['num_folds']))
+    print('{:<24}{:>10}{:>14}  {}'.format('search', 'seconds', 'best score',
+                                          'best parameters'))
+    print('{:<24}{:>10.1f}{:>14.4g}  {}'.format(
+        'serial GridSearchCV', grid_seconds, search.best_score_,
+        search.best_params_))
+    print('{:<24}{:>10.1f}{:>14.4g}  {}'.format(
+        'halving, n_jobs={}'.format(n_jobs), halving_seconds, score, params))
+    print('candidates per iteration: {}, samples: {}'.format(
+        results.groupby('iteration').size().tolist(),
+        results.groupby('iteration')['n_samples'].first().tolist()))
+
+
+if __name__ == '__main__':
+    main()
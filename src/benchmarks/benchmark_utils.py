@@ -0,0 +1,285 @@
+import hashlib
+import os
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+from src.features import write_data, load_raw_data, needed_columns
+
+# Titles of the three feature tables of a listing page
+TABLE_TITLES = [
+    ['riferimento e data annuncio', 'contratto', 'tipologia', 'superficie',
+     'locali', 'piano', 'totale piani edificio', 'posti auto',
+     'disponibilità', 'tipo proprietà', 'anno di costruzione', 'stato',
+     'riscaldamento', 'climatizzazione', 'altre caratteristiche'],
+    ['prezzo', 'informazioni catastali', 'spese condominio'],
+    ['efficienza energetica', 'prestazione energetica del fabbricato',
+     'certificazione energetica'],
+]
+
+DISTRICTS = ['centro', 'campo-di-marte-liberta', 'oltrarno', 'firenze-nord',
+             'legnaia-soffiano', 'coverciano-bellariva', 'serpiolle-careggi']
+
+# Prefix of the district links, cut by the parser
+AREA_URL = 'https://www.immobiliare.it/mercato-immobiliare/toscana/firenze/'
+
+
+def timed(function, *args, **kwargs):
+    """Run a function and return its result and wall time in seconds."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def traced(function, *args, **kwargs):
+    """Run a function and return its result, wall time in seconds and
+    peak memory traced by tracemalloc in MB."""
+    tracemalloc.start()
+    try:
+        result, seconds = timed(function, *args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def listing_page(i, seed=0):
+    """Return the HTML of a synthetic listing page, with the markup the
+    scraper extracts its record from."""
+    rng = random.Random(seed * 1000003 + i)
+    tables = []
+    for titles in TABLE_TITLES:
+        entries = ''.join(
+            '<dt class="im-features__title">{}</dt>'
+            '<dd class="im-features__value"> {} {} </dd>'.format(
+                title, rng.choice(['sì', 'no', 'n/a']),
+                rng.randint(1, 10000))
+            for title in titles if rng.random() < 0.9)
+        tables.append('<dl class="im-features__list">{}</dl>'.format(entries))
+    return (
+        '<html><head><title>Annuncio {i}</title></head><body>'
+        '<span class="im-location">Via di Prova {n}</span>'
+        '<span class="im-location">Firenze</span>'
+        '<div class="im-relatedLink__container">'
+        '<a href="{url}toscana/">Toscana</a><a href="{url}{zona}/">{zona}</a>'
+        '</div>{tables}<p>{filler}</p></body></html>'
+    ).format(i=i, n=rng.randint(1, 200), url=AREA_URL,
+             zona=rng.choice(DISTRICTS), tables=''.join(tables),
+             filler='Descrizione &egrave; lunga. ' * rng.randint(50, 300))
+
+
+def read_pages(directory):
+    """Read the saved HTML pages (*.html) of a directory, in name
+    order."""
+    return [path.read_text(encoding='utf-8')
+            for path in sorted(Path(directory).glob('*.html'))]
+
+
+def corpus(n_pages, pages_dir=None, seed=0):
+    """Return n_pages listing pages: the saved pages of a directory,
+    repeated as needed, or synthetic pages."""
+    if pages_dir is None:
+        return [listing_page(i, seed) for i in range(n_pages)]
+    pages = read_pages(pages_dir)
+    if not pages:
+        raise ValueError('No .html pages in {}'.format(pages_dir))
+    return [pages[i % len(pages)] for i in range(n_pages)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve index pages linking to the listings and the listings."""
+
+    def _send(self, status, content=b'', headers=()):
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        if self.server.log is not None:
+            self.server.log.append((self.path, status))
+
+    def _throttled(self, i):
+        """Return whether to throttle this request of the i-th listing:
+        the first request of every throttle-th listing is."""
+        server = self.server
+        if not server.throttle or i % server.throttle:
+            return False
+        with server.lock:
+            first = i not in server.throttled
+            server.throttled.add(i)
+        return first
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay)
+        url = urlsplit(self.path)
+        if url.path == '/vendita-case/firenze/':
+            page = int(parse_qs(url.query).get('pag', ['1'])[0])
+            first = (page - 1) * server.per_page
+            links = ''.join(
+                '<a href="{}/annunci/{}/">Annuncio</a>'.format(server.url, i)
+                for i in range(first, min(first + server.per_page,
+                                          len(server.pages)))
+                if server.pages[i] is not None)
+            body = '<html><body>{}</body></html>'.format(links)
+        elif url.path.startswith('/annunci/'):
+            i = int(url.path.split('/')[2])
+            if self._throttled(i):
+                # Alternate between the two statuses of throttling servers
+                status = 429 if i // server.throttle % 2 == 0 else 503
+                self._send(status, headers=[('Retry-After',
+                                             str(server.retry_after))])
+                return
+            body = server.pages[i]
+        else:
+            body = None
+        if body is None:
+            self._send(404)
+            return
+
+        content = body.encode('utf-8')
+        headers = [('Content-Type', 'text/html; charset=utf-8')]
+        if server.validators:
+            etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, headers=[('ETag', etag)])
+                return
+            headers.append(('ETag', etag))
+        self._send(200, content, headers)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_pages(pages, per_page=25, delay=0.0, validators=False, log=None,
+                throttle=0, retry_after=1):
+    """Serve listing pages from a local HTTP server standing in for the
+    website, with a delay per request, and yield the URL of its first
+    index page.
+
+    The pages can be changed while serving them, and pages set to None
+    are delisted: they are no longer linked and return 404. With
+    validators, responses carry an ETag and requests with a matching
+    If-None-Match get a 304. With throttle, the first request of every
+    throttle-th listing gets a 429 or a 503, alternately, with a
+    Retry-After of retry_after seconds. If given, the log list receives
+    the path and status of every response."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.per_page = per_page
+    server.delay = delay
+    server.validators = validators
+    server.log = log
+    server.throttle = throttle
+    server.retry_after = retry_after
+    server.throttled = set()
+    server.lock = Lock()
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.url + '/vendita-case/firenze/'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# Raw values of the scraped features read by the cleaning steps
+VOCABULARY = {
+    'stato': ['Buono / Abitabile', 'Ottimo / Ristrutturato',
+              'Da ristrutturare', 'Nuovo / In costruzione'],
+    'tipo proprietà': ['Intera proprietà, classe immobile media',
+                       'Intera proprietà, classe immobile signorile',
+                       'Nuda proprietà, classe immobile economica',
+                       'Intera proprietà, immobile di lusso'],
+    'contratto': ['Vendita', 'Vendita a reddito'],
+    'tipologia': ['Appartamento', 'Attico | Intera proprietà',
+                  'Terratetto unifamiliare', 'Villa unifamiliare',
+                  'Loft', 'Mansarda', 'Villa bifamiliare'],
+    'riscaldamento': ['Autonomo, a radiatori, alimentato a metano',
+                      'Centralizzato, a pavimento, alimentato a pompa di '
+                      'calore', 'Autonomo, ad aria, alimentato a gas'],
+    'climatizzazione': ['Autonomo, freddo/caldo', 'Predisposizione impianto',
+                        'Centralizzato, freddo'],
+    'efficienza energetica': ['A4', 'A1', 'B', 'C', 'D', 'E', 'F', 'G'],
+    'piano': ['Piano terra', '2° piano, con ascensore', 'Ultimo piano',
+              '3° piano, con ascensore, con accesso disabili', 'Interrato'],
+    'totale piani edificio': ['3 piani', '4 piani', '5 piani'],
+    'posti auto': ['1 in garage/box', '1 in garage/box, 2 all\'esterno'],
+    'locali': ['3 (2 camere da letto, 1 altro), 1 bagno, cucina abitabile',
+               '5 (3 camere da letto, 2 altri), 2 bagni, cucina a vista',
+               '2 (1 camera da letto, 1 altro), 1 bagno'],
+    'altre caratteristiche': [
+        '\n'.join(tokens) for tokens in (
+            ['Infissi esterni in doppio vetro / legno', 'Esposizione doppia',
+             'Giardino privato', 'Cantina', 'Fibra ottica'],
+            ['Arredato', 'Terrazza', 'Esposizione esterna',
+             'Impianto di allarme'],
+            ['Infissi esterni in vetro / metallo', 'Parzialmente Arredato',
+             'Giardino comune', 'Cancello elettrico', 'Piscina'])],
+}
+
+
+def _values(rng, n_rows, title, sqm):
+    """Return synthetic raw values of a scraped feature, as strings with
+    some missing values, given the surface of the listings."""
+    if title == 'prezzo':
+        prices = sqm * rng.integers(2000, 8000, n_rows) // 1000 * 1000
+        values = ['€ {:,}'.format(price).replace(',', '.')
+                  for price in prices]
+    elif title == 'superficie':
+        values = ['{} m²'.format(value) for value in sqm]
+    elif title == 'zona':
+        values = rng.choice(DISTRICTS, n_rows)
+    elif title == 'indirizzo':
+        values = ["['Firenze', 'Via di Prova {}']".format(i)
+                  for i in rng.integers(1, 5000, n_rows)]
+    elif title == 'anno di costruzione':
+        return rng.integers(1800, 2021, n_rows).astype('float64')
+    elif title == 'riferimento e data annuncio':
+        values = ['{} - {:02d}/{:02d}/2020'.format(i, month, day)
+                  for i, month, day in zip(rng.integers(1, 10 ** 6, n_rows),
+                                           rng.integers(1, 13, n_rows),
+                                           rng.integers(1, 29, n_rows))]
+    else:
+        vocabulary = VOCABULARY.get(title, ['{} {}'.format(title, i)
+                                            for i in range(20)])
+        values = rng.choice(vocabulary, n_rows)
+    values = np.asarray(values, dtype=object)
+    if title not in ('prezzo', 'superficie', 'contratto'):
+        values[rng.random(n_rows) < 0.05] = None
+    return values
+
+
+def raw_tables(n_rows, config, seed=0):
+    """Return three synthetic raw tables shaped like the scraped ones,
+    with the columns the cleaning config keeps or drops from each and
+    values the cleaning steps parse."""
+    rng = np.random.default_rng(seed)
+    sqm = rng.integers(30, 300, n_rows)
+    cleaning = config['cleaning']
+    columns = [TABLE_TITLES[0] + ['indirizzo', 'zona'] +
+               cleaning['drop_cols_1'],
+               cleaning['keep_cols'] + ['altre spese', 'cauzione'],
+               TABLE_TITLES[2] + cleaning['drop_cols_2']]
+    return [pd.DataFrame({col: _values(rng, n_rows, col, sqm)
+                          for col in cols})
+            for cols in columns]
+
+
+def load_synthetic(path, config, n_rows):
+    """Write synthetic raw Parquet files of n_rows listings to a directory
+    and load their needed columns, as build_features does."""
+    for filename, table in zip(config['cleaning']['filenames'],
+                               raw_tables(n_rows, config)):
+        write_data(table, path + os.path.splitext(filename)[0] + '.parquet')
+    return load_raw_data(path, config, needed_columns(path, config))
@@ -1,3 +1,14 @@
+from .fetching_utils import create_session, fetch_all
+from .archive_utils import HtmlArchive
+from .store_utils import RecordStore
+from .parsing_utils import parse_listing
+from .pipeline_utils import StageCounters, prefetch, parse_in_order
+from .queue_utils import WorkQueue
+from .scheduling_utils import TokenBucket, RequestScheduler
+from .writing_utils import RecordWriter, read_view, view_to_csv
 from .data_collection import WebScraper
 
-__all__ = (WebScraper)
+__all__ = (create_session, fetch_all, HtmlArchive, RecordStore,
+           parse_listing, StageCounters, prefetch, parse_in_order,
+           WorkQueue, TokenBucket, RequestScheduler, RecordWriter,
+           read_view, view_to_csv, WebScraper)
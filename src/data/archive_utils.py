@@ -0,0 +1,91 @@
+import fcntl
+import hashlib
+import zlib
+from pathlib import Path
+
+
+class HtmlArchive:
+    """Content-addressed, compressed on-disk archive of raw HTML pages.
+
+    Pages are stored once per distinct content as zlib blobs appended to
+    a single data file. Two append-only index files map each content
+    digest to its (offset, length) in the data file and each URL to the
+    digest of its latest snapshot, so any page can be read back with a
+    single seek. Appends are serialized with a file lock, so several
+    processes can share the same archive."""
+
+    def __init__(self, path, level=6):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self._data_file = self.path / 'pages.bin'
+        self._blobs_file = self.path / 'blobs.idx'
+        self._urls_file = self.path / 'urls.idx'
+        self._data_file.touch()
+        self.blobs = self._read_index(self._blobs_file)
+        self.urls = self._read_index(self._urls_file)
+
+    @staticmethod
+    def _read_index(filename):
+        """Load an index file, later entries overriding earlier ones."""
+        index = {}
+        if filename.exists():
+            with open(filename, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, value = line.rstrip('\n').split('\t', 1)
+                    index[key] = value
+        return index
+
+    @staticmethod
+    def _append_index(filename, key, value):
+        """Append an entry to an index file, locked like the data file so
+        that the lines of concurrent writers do not interleave."""
+        with open(filename, 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write('{}\t{}\n'.format(key, value))
+            f.flush()
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def put(self, url, html):
+        """Store the HTML of a URL and return its content digest."""
+        content = html.encode('utf-8')
+        digest = hashlib.sha1(content).hexdigest()
+
+        if digest not in self.blobs:
+            blob = zlib.compress(content, self.level)
+            with open(self._data_file, 'ab') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                offset = f.seek(0, 2)
+                f.write(blob)
+                f.flush()
+                fcntl.flock(f, fcntl.LOCK_UN)
+            location = '{}\t{}'.format(offset, len(blob))
+            self._append_index(self._blobs_file, digest, location)
+            self.blobs[digest] = location
+
+        if self.urls.get(url) != digest:
+            self._append_index(self._urls_file, url, digest)
+            self.urls[url] = digest
+        return digest
+
+    def reload(self):
+        """Reload the indexes to see pages archived by other
+        processes."""
+        self.blobs = self._read_index(self._blobs_file)
+        self.urls = self._read_index(self._urls_file)
+
+    def get(self, url):
+        """Return the archived HTML of a URL."""
+        if url not in self.urls:
+            self.reload()
+        offset, length = map(int, self.blobs[self.urls[url]].split('\t'))
+        with open(self._data_file, 'rb') as f:
+            f.seek(offset)
+            blob = f.read(length)
+        return zlib.decompress(blob).decode('utf-8')
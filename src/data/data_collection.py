@@ -1,37 +1,101 @@
 from pathlib import Path
-from requests import get
+import time
 from bs4 import BeautifulSoup
 import re
-import pandas as pd
+from .fetching_utils import create_session, fetch_all
+from .archive_utils import HtmlArchive
+from .store_utils import RecordStore
+from .parsing_utils import parse_listing
+from .pipeline_utils import StageCounters, prefetch, parse_in_order
+from .scheduling_utils import RequestScheduler
+from .writing_utils import VIEWS, RecordWriter, read_view, view_to_csv
 
 
 class WebScraper:
-    def __init__(self, raw_dir, interim_dir, website, n_pages):
+    def __init__(self, raw_dir, interim_dir, website, n_pages,
+                 max_workers=1, delta=True, parse_workers=1,
+                 queue_size=100, rate=None, max_retries=5):
         self.raw_dir = raw_dir
         self.interim_dir = interim_dir
         self.website = website
         self.n_pages = n_pages
+        self.max_workers = max_workers
+        self.delta = delta
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.counters = StageCounters()
+        self.session = create_session(pool_size=max_workers)
+        self.scheduler = RequestScheduler(self.session,
+                                          max_workers=max_workers,
+                                          rate=rate, max_retries=max_retries)
+        self.archive = HtmlArchive(Path(raw_dir) / 'archive')
+        self.store = RecordStore(Path(raw_dir) / 'records.sqlite')
 
-    def _get_urls(self):
-        """Get full list of URLs to scrape."""
-        urls = []
+    def _fetch(self, urls, headers=None):
+        """Fetch URLs through the request scheduler, concurrently if more
+        than one worker is configured."""
+        return fetch_all(self.scheduler, urls, max_workers=self.max_workers,
+                         headers=headers)
 
-        print('Getting URLs from website...')
-        for i in range(1, self.n_pages + 1):
-            if i == 1:
-                url = self.website
-            else:
-                url = self.website + '?pag=' + str(i)
+    def _conditional_headers(self, urls, known):
+        """Get the conditional request headers for the URLs whose last
+        version is known, if delta crawling is enabled."""
+        if not self.delta:
+            return None
+        return {url: self.store.get_validators(url) for url in urls
+                if known(url)}
 
-            response = get(url)
-            html_soup = BeautifulSoup(response.text, 'html.parser')
+    def _receive(self, url, response):
+        """Archive a fresh page or read back the archived version of an
+        unmodified one, and return its HTML. Unmodified pages missing
+        from the archive, e.g. because it was removed since their
+        validators were stored, are downloaded again. Returns None for
+        pages that could not be downloaded."""
+        if response is not None and response.status_code == 304:
+            if url not in self.archive:
+                self.archive.reload()
+            if url in self.archive:
+                return self.archive.get(url)
+            response = self.scheduler.get(url, timeout=30)
+        if response is None or not response.ok or \
+                response.status_code == 304:
+            print('Failed: ' + url)
+            return None
+        self.archive.put(url, response.text)
+        self.store.set_validators(url, response.headers)
+        return response.text
+
+    def _get_page_urls(self):
+        """Get the URLs of the listing index pages."""
+        page_urls = [self.website]
+        for i in range(2, self.n_pages + 1):
+            page_urls.append(self.website + '?pag=' + str(i))
+        return page_urls
+
+    def _get_links(self, page_urls):
+        """Yield the URL of each index page with the listing URLs found
+        in it."""
+        headers = self._conditional_headers(page_urls,
+                                            lambda url: url in self.archive)
+        for url, response in self._fetch(page_urls, headers):
+            html = self._receive(url, response)
+            if html is None:
+                continue
+            html_soup = BeautifulSoup(html, 'html.parser')
 
             a = html_soup.find_all(href=re.compile("/annunci/"))
-            for item in a:
-                href = item.get('href')
-                urls.append(href)
+            yield url, [item.get('href') for item in a]
 
+    def _get_urls(self):
+        """Get full list of URLs to scrape."""
+        urls = []
+
+        print('Getting URLs from website...')
+        for i, (_, links) in enumerate(
+                self._get_links(self._get_page_urls()), 1):
+            urls.extend(links)
             print('Loop ' + str(i) + ' completed.')
+        print(self.scheduler.report())
         return urls
 
     def save_urls(self, urls):
@@ -46,25 +110,68 @@ class WebScraper:
             urls = [line.strip() for line in f]
         return urls
 
-    @staticmethod
-    def _get_titles(urls):
-        """Get all possible entry titles."""
+    def _scrape(self, urls):
+        """Download each distinct URL once, archive its raw HTML and
+        commit the extracted record to the store. When delta crawling,
+        listings that are not modified since the last crawl are only
+        marked as seen.
+
+        Downloads run in a background thread feeding a bounded queue,
+        while the pages are parsed in a process pool. Returns the URLs
+        checked, i.e. not the ones that failed to download."""
+        print('Getting data from URLs...')
+        urls = list(dict.fromkeys(urls))
+        headers = self._conditional_headers(
+            urls, lambda url: self.store.fingerprint(url) is not None)
+
+        self.counters = StageCounters()
+        pages = prefetch(self._fetch(urls, headers), self.queue_size,
+                         self.counters)
+        self._parse_and_commit(self._changed_pages(pages))
+        print(self.counters.report())
+        print(self.scheduler.report())
+        checked = self.store.checked_urls()
+        return [url for url in urls if url in checked]
+
+    def _changed_pages(self, pages):
+        """Archive downloaded pages and yield the ones that need to be
+        extracted as ((url, digest), html) items."""
+        for url, response in pages:
+            with self.counters.time('archive'):
+                html = self._receive(url, response)
+            if html is None:
+                continue
+            digest = self.archive.urls[url]
+            if self.delta and self.store.fingerprint(url) == digest:
+                self.store.touch(url)
+                print('Unchanged: ' + url)
+            else:
+                yield (url, digest), html
+
+    def _parse_and_commit(self, pages):
+        """Extract the records from ((url, digest), html) items and commit
+        them to the store in input order."""
+        records = parse_in_order(pages, parse_listing,
+                                 max_workers=self.parse_workers,
+                                 queue_size=self.queue_size,
+                                 counters=self.counters)
+        for loop, ((url, digest), record) in enumerate(records):
+            with self.counters.time('commit'):
+                self.store.add(url, record, fingerprint=digest)
+            if record['zona'] is None:
+                print('Loop ' + str(loop) + ' failed.')
+            else:
+                print('Loop ' + str(loop) + ' completed.')
+
+    def _get_titles(self):
+        """Get all possible entry titles from the stored records."""
         table_list = [[], [], []]
-        c = 0
         print('Getting all possible titles...')
-        for url in urls:
-            response = get(url)
-            html_soup = BeautifulSoup(response.text, 'lxml')
-
-            tables = html_soup.find_all(class_="im-features__list")
-            for i, table in enumerate(tables[:3]):
-                titles = table.find_all(class_='im-features__title')
-                for title in titles:
-                    if title.text not in table_list[i]:
-                        table_list[i].append(title.text)
-            if c % 500 == 0:
-                print('Loop ' + str(c) + ' completed.')
-            c += 1
+        for record in self.store.records():
+            for i, table in enumerate(record['tables']):
+                for title in table['titles']:
+                    if title not in table_list[i]:
+                        table_list[i].append(title)
         return table_list
 
     def save_titles(self, table_list):
@@ -88,83 +195,135 @@ class WebScraper:
                         all_titles[2].append(line.strip())
         return all_titles
 
-    @staticmethod
-    def _get_dicts(table_list):
-        """Create dictionaries from all possible titles."""
-        caratteristiche = {key: list() for key in table_list[0]}
-        caratteristiche['indirizzo'] = []
-        caratteristiche['zona'] = []
+    def crawl(self):
+        """Scrape the data into the record store, resuming the last
+        crawl if it was interrupted."""
+        if self.store.is_complete() or not self.store.get_urls():
+            self.store.start_crawl(self._get_urls())
+        else:
+            print('Resuming interrupted crawl...')
 
-        costi = {key: list() for key in table_list[1]}
+        checked = self.store.checked_urls()
+        self._scrape([url for url in self.store.get_urls()
+                      if url not in checked])
+        self.store.set_complete()
 
-        efficienza_energetica = {key: list() for key in table_list[2]}
+    def get_data(self):
+        """Scrape the data and return it as DataFrames."""
+        self.crawl()
+        return self._assemble()
 
-        dicts = [caratteristiche, costi, efficienza_energetica]
-        return dicts
+    def extract(self, urls=None):
+        """Extract the data again from the archived pages into the record
+        store, without network access. Defaults to the URLs of the last
+        crawl. URLs that were never archived, e.g. because their download
+        failed, are skipped."""
+        if urls is None:
+            urls = self.store.get_urls() or list(self.archive.urls)
+        missing = [url for url in urls if url not in self.archive]
+        if missing:
+            print('Not archived, skipping {} URLs.'.format(len(missing)))
+            urls = [url for url in urls if url in self.archive]
+        self.store.start_crawl(urls)
 
-    def get_data(self):
-        """Scrape the data and store it in dictionaries."""
-        urls = self._get_urls()
-        table_list = self._get_titles(urls)
-        dicts = self._get_dicts(table_list)
+        print('Extracting data from archive...')
+        self.counters = StageCounters()
+        self._parse_and_commit(((url, self.archive.urls[url]),
+                                self.archive.get(url))
+                               for url in dict.fromkeys(urls))
+        self.store.set_complete()
+        print(self.counters.report())
 
-        print('Getting data from URLs...')
-        loop = 0
-        for url in urls:
-            try:
-                response = get(url)
-                html_soup = BeautifulSoup(response.text, 'lxml')
-
-                # Get area
-                area = (html_soup
-                        .find('div', class_="im-relatedLink__container")
-                        .find_all('a'))
-                dicts[0]['zona'].append(area[-1]['href'][63:])
-
-                # Get address
-                addresses = html_soup.find_all(class_="im-location")
-                addresses_text = list(set([address.text for address in
-                                           addresses]))
-                dicts[0]['indirizzo'].append(addresses_text)
-
-                # Get tables
-                tables = html_soup.find_all(class_="im-features__list")
-
-                # Loop through the tables
-                for i, table in enumerate(tables[:3]):
-                    # Get entries (left) and values (right) for first 3 tables
-                    titles = table.find_all(class_='im-features__title')
-                    values = table.find_all(class_='im-features__value')
-
-                    titles_text = [title.text for title in titles]
-                    values_text = [value.text.strip() for value in values]
-                    entries = dict(zip(titles_text, values_text))
-
-                    c = 0
-                    for key in dicts[i].keys():
-                        if key in titles_text:
-                            dicts[i][key].append(entries[key])
-                            c += 1
-                        elif key not in ['indirizzo', 'zona']:
-                            dicts[i][key].append('n/a')
+    def extract_data(self, urls=None):
+        """Extract the data again from the archived pages and return it
+        as DataFrames."""
+        self.extract(urls)
+        return self._assemble()
 
-                print('Loop ' + str(loop) + ' completed.')
-                loop += 1
-            except AttributeError:
-                print('Loop ' + str(loop) + ' failed.')
-                loop += 1
-
-        # Convert dictionaries to dataframes and save them
-        dfs = []
-        for dict_ in dicts:
-            dfs.append(self._to_dataframe(dict_))
-        return dfs
-
-    @staticmethod
-    def _to_dataframe(dictionary):
-        """Transform dictionaries to pandas DataFrames."""
-        df = pd.DataFrame.from_dict(dictionary, orient='index').transpose()
-        return df
+    def seed_queue(self, queue):
+        """Queue the index pages of a new distributed crawl, unless a
+        crawl is already in progress in the queue."""
+        if queue.seed('page', self._get_page_urls(),
+                      reset=lambda: self.store.start_crawl([])):
+            print('Queued a new crawl.')
+        else:
+            print('Joining crawl in progress...')
+
+    def work(self, queue, worker_id, batch_size=20, lease_seconds=600,
+             poll_seconds=5):
+        """Claim and process tasks from a shared work queue until all of
+        them are done. Index pages queue the listings they link to, which
+        are then scraped like in a local crawl. Tasks whose pages could not
+        be downloaded are released to be retried, see WorkQueue.fail."""
+        while True:
+            tasks = queue.claim(worker_id, n=batch_size,
+                                lease_seconds=lease_seconds)
+            if not tasks:
+                if queue.is_finished():
+                    break
+                # Remaining tasks are leased by other workers, wait for
+                # them to finish or for their leases to expire
+                time.sleep(poll_seconds)
+                continue
+
+            ids = {payload: task_id for task_id, _, payload in tasks}
+            if tasks[0][1] == 'page':
+                for url, links in self._get_links(list(ids)):
+                    queue.add('listing', links)
+                    queue.complete(ids.pop(url), worker_id, result=links)
+            else:
+                for url in self._scrape(list(ids)):
+                    queue.complete(ids.pop(url), worker_id)
+            for task_id in ids.values():
+                queue.fail(task_id, worker_id)
+            print('Worker {}: {}'.format(worker_id, queue.counts()))
+
+    def finish_queue(self, queue):
+        """Register the listings of a finished distributed crawl in the
+        record store, in the order in which they were found in the index
+        pages. Returns False if another worker has already done so."""
+        if not queue.claim_flag('assembled'):
+            return False
+        urls = [url for links in queue.results('page') for url in links]
+        self.store.set_urls(urls)
+        self.store.set_complete()
+        return True
+
+    def assemble_queue(self, queue):
+        """Assemble the DataFrames of a finished distributed crawl.
+        Returns None if another worker has already assembled them."""
+        if not self.finish_queue(queue):
+            return None
+        return self._assemble()
+
+    def write_records(self, batch_size=1000):
+        """Stream the stored records of the current crawl into a Parquet
+        file in the interim directory and return its path."""
+        table_list = self._get_titles()
+        path = Path(self.interim_dir) / 'listings.parquet'
+
+        print('Writing records...')
+        writer = RecordWriter(path, table_list, batch_size=batch_size)
+        for record in self.store.records():
+            if record['zona'] is not None:
+                writer.write(record)
+        writer.close()
+        return path
+
+    def load_view(self, name):
+        """Load one of the scraped tables from the Parquet file."""
+        return read_view(Path(self.interim_dir) / 'listings.parquet', name)
+
+    def save_view(self, name):
+        """Save one of the scraped tables from the Parquet file to a csv
+        file, one batch at a time."""
+        view_to_csv(Path(self.interim_dir) / 'listings.parquet', name,
+                    Path(self.interim_dir) / '{}.csv'.format(name))
+
+    def _assemble(self):
+        """Write the stored records and load them back as DataFrames."""
+        self.write_records()
+        return [self.load_view(name) for name in VIEWS]
 
     def save_data(self, data, name):
         """Save DataFrame to csv files."""
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_size=10):
+    """Create a requests session backed by a keep-alive connection
+    pool."""
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _chunks(items, size):
+    """Split a list into consecutive chunks of a given size."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def fetch_all(session, urls, max_workers=1, timeout=30, headers=None):
+    """Fetch URLs with a bounded thread pool and yield (url, response)
+    pairs in the same order as the input URLs.
+
+    URLs are submitted in chunks so that only a few pages per worker are
+    held in memory at any time. Extra request headers, e.g. conditional
+    request validators, can be given per URL in a dictionary."""
+    urls = list(urls)
+    headers = headers or {}
+
+    def get(url):
+        return session.get(url, headers=headers.get(url), timeout=timeout)
+
+    if max_workers <= 1:
+        for url in urls:
+            yield url, get(url)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk in _chunks(urls, 4 * max_workers):
+            responses = executor.map(get, chunk)
+            for url, response in zip(chunk, responses):
+                yield url, response
@@ -1,15 +1,40 @@
 # -*- coding: utf-8 -*-
 import click
 import logging
+import os
+import socket
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
-from src.data import WebScraper
+from src.data import WebScraper, WorkQueue
 
 
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
-def main(input_filepath, output_filepath):
+@click.option('--max-workers', type=int, default=1,
+              help='Number of concurrent connections used for scraping.')
+@click.option('--offline', is_flag=True,
+              help='Re-extract the data from the archived pages only.')
+@click.option('--delta/--no-delta', default=True,
+              help='Only download listings that are new or modified since '
+                   'the last crawl.')
+@click.option('--parse-workers', type=int, default=1,
+              help='Number of processes used for parsing pages.')
+@click.option('--queue-size', type=int, default=100,
+              help='Maximum number of pages waiting to be parsed.')
+@click.option('--n-pages', type=int, default=366,
+              help='Number of index pages to collect listings from.')
+@click.option('--queue-file', type=click.Path(), default=None,
+              help='Shared work queue to run a distributed crawl with.')
+@click.option('--worker-id', type=str, default=None,
+              help='Name of this worker in the shared work queue.')
+@click.option('--rate', type=float, default=None,
+              help='Maximum number of requests per second.')
+@click.option('--max-retries', type=int, default=5,
+              help='Number of retries for throttled or failed requests.')
+def main(input_filepath, output_filepath, max_workers, offline, delta,
+         parse_workers, queue_size, n_pages, queue_file, worker_id, rate,
+         max_retries):
     """Runs data collecting scripts to collect data and save it in
     ../interim."""
     logger = logging.getLogger(__name__)
@@ -17,19 +42,37 @@ def main(input_filepath, output_filepath):
 
     # Define scraping variables
     website = 'https://www.immobiliare.it/vendita-case/firenze/'
-    n_pages = 366
 
     # Collect data
     scraper = WebScraper(raw_dir=input_filepath,
                          interim_dir=output_filepath,
                          website=website,
-                         n_pages=n_pages)
-    dataframes = scraper.get_data()
+                         n_pages=n_pages,
+                         max_workers=max_workers,
+                         delta=delta,
+                         parse_workers=parse_workers,
+                         queue_size=queue_size,
+                         rate=rate,
+                         max_retries=max_retries)
+    if offline:
+        scraper.extract()
+    elif queue_file:
+        queue = WorkQueue(queue_file)
+        worker_id = worker_id or '{}-{}'.format(socket.gethostname(),
+                                                os.getpid())
+        scraper.seed_queue(queue)
+        scraper.work(queue, worker_id)
+        if not scraper.finish_queue(queue):
+            logger.info('Data assembled and saved by another worker.')
+            return
+    else:
+        scraper.crawl()
 
-    # Save data
-    filenames = ['caratteristiche', 'costi', 'efficienza_energetica']
-    for df, name in zip(dataframes, filenames):
-        scraper.save_data(df, name)
+    # Save data, streaming the records to a Parquet file and the tables
+    # to csv files
+    scraper.write_records()
+    for name in ['caratteristiche', 'costi', 'efficienza_energetica']:
+        scraper.save_view(name)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+from lxml import etree
+
+
+def _has_class(name):
+    """XPath predicate matching elements that have a given class."""
+    return ('contains(concat(" ", normalize-space(@class), " "), '
+            '" {} ")'.format(name))
+
+
+_PARSER = etree.HTMLParser(encoding='utf-8')
+
+# Selectors are compiled once and reused for every listing
+_TABLES = etree.XPath('//*[{}]'.format(_has_class('im-features__list')))
+_TITLES = etree.XPath('.//*[{}]'.format(_has_class('im-features__title')))
+_VALUES = etree.XPath('.//*[{}]'.format(_has_class('im-features__value')))
+_AREA = etree.XPath('(//div[{}])[1]//a/@href'.format(
+    _has_class('im-relatedLink__container')))
+_ADDRESSES = etree.XPath('//*[{}]'.format(_has_class('im-location')))
+
+
+def _text(element):
+    """Return the text of an element and all its descendants."""
+    return ''.join(element.itertext())
+
+
+def parse_listing(html):
+    """Extract the area, the address and the feature tables of a listing
+    with precompiled XPath selectors on an lxml tree."""
+    record = {'zona': None, 'indirizzo': None, 'tables': []}
+    root = etree.fromstring(html.encode('utf-8'), _PARSER)
+    if root is None:
+        return record
+
+    # Get tables: entries (left) and values (right) for first 3 tables
+    for table in _TABLES(root)[:3]:
+        record['tables'].append({
+            'titles': [_text(title) for title in _TITLES(table)],
+            'values': [_text(value).strip() for value in _VALUES(table)]
+        })
+
+    # Get area, listings without it are only used for their titles
+    area = _AREA(root)
+    if not area:
+        return record
+    record['zona'] = area[-1][63:]
+
+    # Get address, without repeated parts, in page order: the order of a
+    # set depends on the hash seed of each worker process
+    record['indirizzo'] = list(dict.fromkeys(_text(address) for address
+                                             in _ADDRESSES(root)))
+    return record
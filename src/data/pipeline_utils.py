@@ -0,0 +1,114 @@
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from queue import Queue
+from threading import Thread
+
+
+class StageCounters:
+    """Count the items processed by each stage of the scraping pipeline
+    and the time spent in it."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def add(self, stage, seconds, count=1):
+        """Record items processed by a stage."""
+        self.counts[stage] += count
+        self.seconds[stage] += seconds
+
+    @contextmanager
+    def time(self, stage):
+        """Time a block of code as one item of a stage."""
+        start = time.perf_counter()
+        yield
+        self.add(stage, time.perf_counter() - start)
+
+    def report(self):
+        """Return a table of the items and time spent per stage."""
+        lines = ['{:<12}{:>10}{:>12}{:>12}'.format('stage', 'items',
+                                                   'seconds', 'ms/item')]
+        for stage, count in self.counts.items():
+            seconds = self.seconds[stage]
+            lines.append('{:<12}{:>10}{:>12.2f}{:>12.2f}'.format(
+                stage, count, seconds, 1000 * seconds / max(count, 1)))
+        return '\n'.join(lines)
+
+
+_DONE = object()
+
+
+def prefetch(iterable, queue_size, counters=None):
+    """Consume an iterable in a background thread and yield its items
+    through a bounded queue, so producing and consuming overlap.
+
+    Time the producer spends on each item is counted as the 'fetch'
+    stage and time the consumer waits on an empty queue as 'starved'."""
+    queue = Queue(maxsize=queue_size)
+    counters = counters or StageCounters()
+
+    def produce():
+        try:
+            start = time.perf_counter()
+            for item in iterable:
+                counters.add('fetch', time.perf_counter() - start)
+                queue.put(item)
+                start = time.perf_counter()
+            queue.put(_DONE)
+        except Exception as e:
+            queue.put(e)
+
+    thread = Thread(target=produce, daemon=True)
+    thread.start()
+    while True:
+        with counters.time('starved'):
+            item = queue.get()
+        if item is _DONE:
+            break
+        if isinstance(item, Exception):
+            raise item
+        yield item
+    thread.join()
+
+
+def _timed(function, argument):
+    """Call a function and also return the time it took."""
+    start = time.perf_counter()
+    result = function(argument)
+    return result, time.perf_counter() - start
+
+
+def parse_in_order(items, parse, max_workers=1, queue_size=100,
+                   counters=None):
+    """Apply a parsing function to the payloads of (key, payload) items
+    in a process pool and yield (key, result) pairs in input order.
+
+    At most queue_size items are in flight at any time. With a single
+    worker, items are parsed in the current process."""
+    counters = counters or StageCounters()
+
+    if max_workers <= 1:
+        for key, payload in items:
+            result, seconds = _timed(parse, payload)
+            counters.add('parse', seconds)
+            yield key, result
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for key, payload in items:
+            pending.append((key, executor.submit(_timed, parse, payload)))
+            if len(pending) >= queue_size:
+                yield _collect(pending, counters)
+        while pending:
+            yield _collect(pending, counters)
+
+
+def _collect(pending, counters):
+    """Wait for the oldest parsing job and return its key and result."""
+    key, future = pending.popleft()
+    result, seconds = future.result()
+    counters.add('parse', seconds)
+    return key, result
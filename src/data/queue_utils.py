@@ -0,0 +1,151 @@
+import json
+import sqlite3
+import time
+
+
+class WorkQueue:
+    """SQLite-backed work queue shared by several scraping workers.
+
+    Workers claim batches of tasks under a lease. A task whose lease
+    expires before it is completed, e.g. because its worker died, becomes
+    visible again and is claimed by another worker. A task that fails, or
+    whose lease expires, max_attempts times is marked as failed and is not
+    claimed again. Tasks are unique per kind and payload, so the same
+    listing is only queued once.
+
+    The queue uses SQLite's rollback journal rather than WAL, which needs
+    shared memory and does not work on network filesystems, so workers
+    on several machines can share a queue file on a filesystem with
+    working POSIX locks, e.g. NFS."""
+
+    def __init__(self, path, timeout=60, max_attempts=3):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(self.path, timeout=timeout,
+                                    isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                UNIQUE (kind, payload)
+            );
+            CREATE TABLE IF NOT EXISTS flags (
+                name TEXT PRIMARY KEY
+            );
+        """)
+
+    def _transaction(self):
+        """Start a write transaction, locking out the other workers."""
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def seed(self, kind, payloads, reset):
+        """Atomically queue the initial tasks if the queue is empty or if
+        the previous run has finished. Returns whether tasks were queued.
+
+        The reset callback is called within the transaction, so that only
+        one worker prepares a new run."""
+        self._transaction()
+        try:
+            total, done = self.conn.execute(
+                'SELECT COUNT(*), COUNT(CASE WHEN status IN (\'done\', '
+                '\'failed\') THEN 1 END) FROM tasks').fetchone()
+            finished = self.conn.execute(
+                'SELECT 1 FROM flags WHERE name = \'assembled\'').fetchone()
+            seeded = total == 0 or (total == done and finished is not None)
+            if seeded:
+                self.conn.execute('DELETE FROM tasks')
+                self.conn.execute('DELETE FROM flags')
+                self._add(kind, payloads)
+                reset()
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return seeded
+
+    def _add(self, kind, payloads):
+        self.conn.executemany('INSERT OR IGNORE INTO tasks (kind, payload) '
+                              'VALUES (?, ?)',
+                              ((kind, payload) for payload in payloads))
+
+    def add(self, kind, payloads):
+        """Queue new tasks, ignoring the ones already queued."""
+        self._transaction()
+        self._add(kind, payloads)
+        self.conn.execute('COMMIT')
+
+    def claim(self, worker_id, n=1, lease_seconds=600):
+        """Lease up to n visible tasks of the same kind, oldest first, and
+        return them as (id, kind, payload) tuples."""
+        now = time.time()
+        self._transaction()
+        self.conn.execute(
+            'UPDATE tasks SET status = \'failed\' WHERE status = '
+            '\'leased\' AND lease_until < ? AND attempts >= ?',
+            (now, self.max_attempts))
+        rows = self.conn.execute(
+            'SELECT id, kind, payload FROM tasks WHERE status = \'pending\' '
+            'OR (status = \'leased\' AND lease_until < ?) ORDER BY id '
+            'LIMIT ?', (now, n)).fetchall()
+        if rows:
+            rows = [row for row in rows if row[1] == rows[0][1]]
+        self.conn.executemany(
+            'UPDATE tasks SET status = \'leased\', owner = ?, '
+            'lease_until = ?, attempts = attempts + 1 WHERE id = ?',
+            ((worker_id, now + lease_seconds, row[0]) for row in rows))
+        self.conn.execute('COMMIT')
+        return rows
+
+    def complete(self, task_id, worker_id, result=None):
+        """Mark a leased task as done, unless its lease was lost to
+        another worker in the meantime."""
+        self._transaction()
+        self.conn.execute(
+            'UPDATE tasks SET status = \'done\', result = ? WHERE id = ? '
+            'AND owner = ? AND status = \'leased\'',
+            (json.dumps(result), task_id, worker_id))
+        self.conn.execute('COMMIT')
+
+    def fail(self, task_id, worker_id):
+        """Release a leased task that could not be processed, to be
+        claimed again, or mark it as failed after max_attempts."""
+        self._transaction()
+        self.conn.execute(
+            'UPDATE tasks SET status = CASE WHEN attempts >= ? THEN '
+            '\'failed\' ELSE \'pending\' END, owner = NULL, '
+            'lease_until = NULL WHERE id = ? AND owner = ? AND '
+            'status = \'leased\'', (self.max_attempts, task_id, worker_id))
+        self.conn.execute('COMMIT')
+
+    def counts(self):
+        """Return the number of tasks per status."""
+        return dict(self.conn.execute(
+            'SELECT status, COUNT(*) FROM tasks GROUP BY status'))
+
+    def is_finished(self):
+        """Return whether every queued task is done or has failed."""
+        counts = self.counts()
+        return bool(counts) and set(counts) <= {'done', 'failed'}
+
+    def results(self, kind):
+        """Return the results of the done tasks of a kind in queue
+        order."""
+        return [json.loads(result) for result, in self.conn.execute(
+            'SELECT result FROM tasks WHERE kind = ? AND status = \'done\' '
+            'ORDER BY id', (kind,))]
+
+    def claim_flag(self, name):
+        """Atomically set a flag and return whether this call set it."""
+        cursor = self.conn.execute('INSERT OR IGNORE INTO flags VALUES (?)',
+                                   (name,))
+        return cursor.rowcount == 1
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,187 @@
+import random
+import time
+from threading import Condition, Lock
+from requests.exceptions import ConnectionError, Timeout
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the rate of requests.
+
+    With no rate the bucket never throttles, but it can still be paused,
+    e.g. when a server asks clients to back off."""
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = Lock()
+
+    def _wait_time(self):
+        """Take a token if one is available, else return how long to wait
+        for the next one."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate is None:
+            return 0.0
+
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a request is allowed."""
+        while True:
+            with self.lock:
+                wait = self._wait_time()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back all requests for a number of seconds."""
+        with self.lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds)
+
+
+class RequestScheduler:
+    """Schedule the requests of a session with rate limiting, adaptive
+    concurrency and retries.
+
+    The number of requests in flight follows an AIMD rule: it grows by
+    about one per round of successful requests and is halved (at most
+    once per second) on a retryable error or when the recent latency
+    rises well above its long-run average. Timeouts, connection
+    errors, 429 and 5xx responses are retried with jittered exponential
+    backoff, honouring the Retry-After of 429 and 503 responses by
+    holding back all requests. The scheduler exposes the same get()
+    as a session, so it can be used wherever a session is."""
+
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, session, max_workers=1, rate=None, max_retries=5,
+                 backoff=1.0, max_backoff=60.0, latency_factor=3.0):
+        self.session = session
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_factor = latency_factor
+
+        self.limit = float(max_workers)
+        self.in_flight = 0
+        self.condition = Condition()
+        self.latency = None
+        self.baseline = None
+        self.last_decrease = 0.0
+        self.stats = {'ok': 0, 'retries': 0, 'failed': 0, 'bytes': 0}
+        self.started = None
+        self.finished = None
+
+    def _acquire_slot(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def _release_slot(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.finished = time.monotonic()
+            self.condition.notify_all()
+
+    def _decrease(self):
+        """Halve the concurrency limit, at most once per second."""
+        now = time.monotonic()
+        if now - self.last_decrease >= 1.0:
+            self.limit = max(1.0, self.limit / 2)
+            self.last_decrease = now
+
+    def _on_success(self, latency, size):
+        with self.condition:
+            self.stats['ok'] += 1
+            self.stats['bytes'] += size
+            if self.latency is None:
+                self.latency = self.baseline = latency
+            # Fast and slow moving averages of the latency
+            self.latency = 0.8 * self.latency + 0.2 * latency
+            self.baseline = 0.99 * self.baseline + 0.01 * latency
+
+            if self.latency > self.latency_factor * self.baseline:
+                self._decrease()
+            else:
+                self.limit = min(self.max_workers,
+                                 self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def _on_failure(self, response, attempt):
+        """Shrink the concurrency limit and return how long to wait before
+        retrying."""
+        with self.condition:
+            self._decrease()
+
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff * 2 ** attempt))
+        if response is not None and response.status_code in (429, 503):
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            self.bucket.pause(delay)
+        return delay
+
+    def get(self, url, headers=None, timeout=None):
+        """Request a URL, retrying on transient errors. Returns None if
+        the request still fails after all retries."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._acquire_slot()
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, headers=headers,
+                                            timeout=timeout)
+            except (ConnectionError, Timeout):
+                response = None
+            finally:
+                self._release_slot()
+
+            if (response is not None and
+                    response.status_code not in self.retry_statuses):
+                self._on_success(time.monotonic() - start,
+                                 len(response.content))
+                return response
+
+            delay = self._on_failure(response, attempt)
+            if attempt < self.max_retries:
+                with self.condition:
+                    self.stats['retries'] += 1
+                time.sleep(delay)
+
+        with self.condition:
+            self.stats['failed'] += 1
+        print('Failed to get ' + url)
+        return None
+
+    def report(self):
+        """Return a summary of the effective throughput."""
+        elapsed = 0.0
+        if self.started is not None:
+            elapsed = self.finished - self.started
+        return ('{ok} pages ({mb:.1f} MB) in {elapsed:.1f} s: {rate:.2f} '
+                'pages/s, {retries} retries, {failed} failed, concurrency '
+                '{limit:.1f}/{max_workers}'.format(
+                    ok=self.stats['ok'], mb=self.stats['bytes'] / 1e6,
+                    elapsed=elapsed,
+                    rate=self.stats['ok'] / max(elapsed, 1e-9),
+                    retries=self.stats['retries'],
+                    failed=self.stats['failed'], limit=self.limit,
+                    max_workers=self.max_workers))
@@ -0,0 +1,184 @@
+import json
+import re
+import sqlite3
+import time
+
+
+class RecordStore:
+    """Append-only SQLite store of extracted listing records.
+
+    Every record is committed as soon as it has been extracted, so an
+    interrupted crawl can be resumed by skipping the URLs that were
+    already checked during that crawl. The URL list of the current crawl
+    is stored as well, to stream the records back out in crawl order.
+
+    The store also keeps a persistent index of every listing ever seen,
+    with its content fingerprint and first/last seen timestamps, and the
+    HTTP validators (ETag, Last-Modified) of every page, so that repeated
+    crawls only need to download new or modified listings."""
+
+    def __init__(self, path, timeout=60):
+        self.path = str(path)
+        self.conn = sqlite3.connect(self.path, timeout=timeout)
+        # Rollback journal, so that workers on several machines can share
+        # the store on a network filesystem, see WorkQueue
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                seq INTEGER PRIMARY KEY,
+                url TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                url TEXT PRIMARY KEY,
+                record TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS listings (
+                url TEXT PRIMARY KEY,
+                listing_id TEXT,
+                fingerprint TEXT,
+                first_seen REAL,
+                last_seen REAL,
+                crawl INTEGER,
+                removed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def __contains__(self, url):
+        row = self.conn.execute('SELECT 1 FROM records WHERE url = ?',
+                                (url,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def _get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?',
+                                (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                          (key, str(value)))
+
+    @property
+    def crawl(self):
+        """Number of the current crawl."""
+        return int(self._get_meta('crawl', 0))
+
+    def start_crawl(self, urls):
+        """Register the URLs of a new crawl and mark the listings that are
+        no longer listed as removed. Records of previous crawls are kept,
+        so unchanged listings do not need to be extracted again."""
+        with self.conn:
+            self._set_meta('crawl', self.crawl + 1)
+            self._set_meta('complete', 0)
+        self.set_urls(urls)
+
+    def set_urls(self, urls):
+        """Set the URLs of the current crawl, e.g. once a distributed
+        crawl has discovered all of them."""
+        with self.conn:
+            self.conn.execute('DELETE FROM urls')
+            self.conn.executemany('INSERT INTO urls (url) VALUES (?)',
+                                  ((url,) for url in urls))
+            self.conn.execute('UPDATE listings SET removed = url NOT IN '
+                              '(SELECT url FROM urls)')
+
+    def set_complete(self):
+        """Mark the current crawl as complete."""
+        with self.conn:
+            self._set_meta('complete', 1)
+
+    def is_complete(self):
+        """Return whether the current crawl has been completed."""
+        return self._get_meta('complete') == '1'
+
+    def get_urls(self):
+        """Return the URLs of the current crawl in crawl order."""
+        return [url for url, in self.conn.execute(
+            'SELECT url FROM urls ORDER BY seq')]
+
+    def checked_urls(self):
+        """Return the set of URLs already checked during the current
+        crawl."""
+        return {url for url, in self.conn.execute(
+            'SELECT url FROM listings WHERE crawl = ?', (self.crawl,))}
+
+    def fingerprint(self, url):
+        """Return the content fingerprint of the last stored version of a
+        listing."""
+        row = self.conn.execute('SELECT fingerprint FROM listings WHERE '
+                                'url = ?', (url,)).fetchone()
+        return None if row is None else row[0]
+
+    def add(self, url, record, fingerprint=None):
+        """Commit the record extracted from a URL."""
+        match = re.search(r'/annunci/(\w+)', url)
+        listing_id = match.group(1) if match else url
+        now = time.time()
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO records VALUES (?, ?)',
+                              (url, json.dumps(record)))
+            self.conn.execute(
+                'INSERT INTO listings (url, listing_id, fingerprint, '
+                'first_seen, last_seen, crawl) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET '
+                'fingerprint = excluded.fingerprint, '
+                'last_seen = excluded.last_seen, crawl = excluded.crawl, '
+                'removed = 0',
+                (url, listing_id, fingerprint, now, now, self.crawl))
+
+    def touch(self, url):
+        """Mark an unchanged listing as seen during the current crawl."""
+        with self.conn:
+            self.conn.execute('UPDATE listings SET last_seen = ?, crawl = ?, '
+                              'removed = 0 WHERE url = ?',
+                              (time.time(), self.crawl, url))
+
+    def removed_urls(self):
+        """Return the URLs of the listings that have been delisted."""
+        return [url for url, in self.conn.execute(
+            'SELECT url FROM listings WHERE removed = 1')]
+
+    def get_validators(self, url):
+        """Return the conditional request headers for a URL."""
+        row = self.conn.execute('SELECT etag, last_modified FROM validators '
+                                'WHERE url = ?', (url,)).fetchone()
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers['If-None-Match'] = row[0]
+            if row[1]:
+                headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def set_validators(self, url, response_headers):
+        """Store the validators a server returned for a URL."""
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if etag or last_modified:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO validators VALUES '
+                                  '(?, ?, ?)', (url, etag, last_modified))
+
+    def records(self):
+        """Stream the records of the current crawl in crawl order."""
+        cursor = self.conn.execute(
+            'SELECT r.record FROM urls u JOIN records r ON u.url = r.url '
+            'ORDER BY u.seq')
+        for record, in cursor:
+            yield json.loads(record)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,110 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+VIEWS = ('caratteristiche', 'costi', 'efficienza_energetica')
+
+
+def view_columns(table_list):
+    """Return the columns of each view, in the same order as the
+    DataFrames built from the scraped dictionaries."""
+    columns = [list(titles) for titles in table_list]
+    columns[0] += ['indirizzo', 'zona']
+    return dict(zip(VIEWS, columns))
+
+
+class RecordWriter:
+    """Stream listing records into a typed Parquet file in fixed-size row
+    batches, so memory use does not grow with the size of the crawl.
+
+    All three tables of a listing are written to a single row, with
+    columns named '<view>/<title>'. Feature values are strings and the
+    address is a list of strings."""
+
+    def __init__(self, path, table_list, batch_size=1000):
+        self.path = str(path)
+        self.table_list = table_list
+        self.batch_size = batch_size
+
+        self.columns = ['{}/{}'.format(view, column)
+                        for view, columns in view_columns(table_list).items()
+                        for column in columns]
+        self.schema = pa.schema([
+            (column, pa.list_(pa.string()))
+            if column == 'caratteristiche/indirizzo'
+            else (column, pa.string()) for column in self.columns])
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.buffer = {column: [] for column in self.columns}
+        self.n_rows = 0
+
+    def write(self, record):
+        """Add the values of a record to the current batch."""
+        self.buffer['caratteristiche/indirizzo'].append(record['indirizzo'])
+        self.buffer['caratteristiche/zona'].append(record['zona'])
+
+        for i, view in enumerate(VIEWS):
+            if i < len(record['tables']):
+                table = record['tables'][i]
+                entries = dict(zip(table['titles'], table['values']))
+            else:
+                table, entries = None, {}
+            for key in self.table_list[i]:
+                if table is None:
+                    value = None
+                elif key in table['titles']:
+                    value = entries[key]
+                else:
+                    value = 'n/a'
+                self.buffer['{}/{}'.format(view, key)].append(value)
+
+        self.n_rows += 1
+        if self.n_rows % self.batch_size == 0:
+            self.flush()
+
+    def flush(self):
+        """Write the current batch as a row group."""
+        if self.buffer['caratteristiche/zona']:
+            batch = pa.Table.from_pydict(self.buffer, schema=self.schema)
+            self.writer.write_table(batch)
+            self.buffer = {column: [] for column in self.columns}
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def _to_view(table, view):
+    """Convert an Arrow table projected on a view to a DataFrame."""
+    df = table.to_pandas()
+    df.columns = [column[len(view) + 1:] for column in df.columns]
+    if 'indirizzo' in df.columns:
+        df['indirizzo'] = df['indirizzo'].apply(
+            lambda x: None if x is None else list(x))
+    return df
+
+
+def _view_columns(parquet_file, view):
+    return [column for column in parquet_file.schema_arrow.names
+            if column.startswith(view + '/')]
+
+
+def read_view(path, view):
+    """Read one of the scraped tables, reading only its columns."""
+    parquet_file = pq.ParquetFile(str(path))
+    columns = _view_columns(parquet_file, view)
+    return _to_view(parquet_file.read(columns=columns), view)
+
+
+def view_to_csv(path, view, filename):
+    """Write one of the scraped tables to a csv file, one row group at a
+    time."""
+    parquet_file = pq.ParquetFile(str(path))
+    columns = _view_columns(parquet_file, view)
+
+    if parquet_file.num_row_groups == 0:
+        pd.DataFrame(columns=[column[len(view) + 1:] for column in columns])\
+            .to_csv(filename, index=False)
+    for i in range(parquet_file.num_row_groups):
+        df = _to_view(parquet_file.read_row_group(i, columns=columns), view)
+        df.to_csv(filename, index=False, mode='w' if i == 0 else 'a',
+                  header=i == 0)
@@ -1,8 +1,15 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
+from src.features import apply_schema
 from src.models import Model
 
+# Names of the sì/no columns before the schema was declared, read by the
+# models trained before it, such as the shipped models/SVR.pkl
+LEGACY_NAMES = {'Fibra_ottica': 'Fibra ottica',
+                'Cancello_elettrico': 'Cancello elettrico',
+                'Impianto_di_allarme': 'Impianto di allarme'}
+
 
 def user_input_features():
     """Define and user inputs as a DataFrame."""
@@ -209,17 +216,30 @@ def user_input_features():
         'Arredato': furnished,
         'Terrazza': terrace,
         'Esposizione': exposition,
-        'Fibra ottica': fiber_optic,
-        'Cancello elettrico': gate,
+        'Fibra_ottica': fiber_optic,
+        'Cancello_elettrico': gate,
         'Cantina': cellar,
-        'Impianto di allarme': alarm,
+        'Impianto_di_allarme': alarm,
         'Mansarda': attic,
         'Taverna': tavern,
         'Cablato': cabled,
         'Idromassaggio': hydromassage,
         'Piscina': pool
     }
-    return pd.DataFrame(data, index=[0])
+    return apply_schema(pd.DataFrame(data, index=[0]))
+
+
+def _model_input(model, input_data):
+    """Return the input data of a model. Models trained on the schema read
+    booleans, the ones trained before it read sì/no strings and the
+    legacy column names."""
+    preprocessing = model.model.steps[0][1]
+    if 'booleans' in [name for name, _, _ in preprocessing.transformers]:
+        return input_data
+    input_data = input_data.copy()
+    for col in input_data.select_dtypes(bool).columns:
+        input_data[col] = np.where(input_data[col], 'sì', 'no')
+    return input_data.rename(columns=LEGACY_NAMES)
 
 
 def predict(model_filepath, config, input_data):
@@ -228,5 +248,6 @@ def predict(model_filepath, config, input_data):
     model = Model.load(model_filepath + config['predicting']['model_name'])
 
     # Predict
-    prediction = int(np.round(model.predict(input_data), -3)[0])
+    prediction = int(np.round(model.predict(_model_input(model, input_data)),
+                              -3)[0])
     return prediction
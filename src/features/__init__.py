@@ -1,42 +1,63 @@
-from .cleaning_utils import (read_data, drop_columns, drop_nans,
-                             rename_cols, drop_duplicates, drop_rows,
-                             filter_rows, clean_address, clean_district,
+from .cleaning_utils import (read_columns, read_data, iter_data, write_data,
+                             drop_columns, drop_nans, rename_cols,
+                             drop_duplicates, drop_rows, filter_rows,
+                             clean_address, clean_district, read_overrides,
                              impute_district, clean_price, clean_sqm,
                              clean_condition, clean_outliers,
                              remove_outliers_iqr, create_price_sqm,
                              create_property_class, create_property_type,
                              create_house_type, create_year_bins,
-                             create_heating, create_heating_type,
-                             create_heating_source, create_air_conditioning,
-                             create_energy_efficiency, create_listing_date,
-                             create_elevator, create_disabled_access,
-                             create_floor, create_garage_parking,
-                             create_external_parking, create_num_bathrooms,
-                             create_num_rooms, string_parser,
-                             create_parsed_features, create_windows,
-                             create_garden, create_furnished,
-                             create_terrace, create_exposure,
-                             create_other_features, create_pipeline,
-                             parse_config, filter_data, rng)
-from .cleaning_pipeline import load_raw_data, clean_data
+                             HEATING_SPEC, create_energy_efficiency,
+                             create_listing_date, LAYOUT_SPEC,
+                             create_amenity_features,
+                             create_pipeline, row_local, row_filter, reads,
+                             writes, freezable, parse_config, filter_data,
+                             rng)
+from .token_utils import TokenMatrix
+from .extraction_utils import compile_patterns, extract_features
+from .profiling_utils import (step_name, profile_step, format_profile,
+                              save_profile)
+from .parallel_utils import split_stages, run_parallel
+from .chunk_utils import fingerprint, ChunkedPipeline
+from .planning_utils import plan_pipeline, fingerprinted_columns
+from .frozen_utils import FrozenPipeline
+from .incremental_utils import (state_key, cleaning_outcome, extend_outcome,
+                                drift, save_state, load_state)
+from .cache_utils import code_hash, stage_key, StageCache
+from .cleaning_pipeline import (load_raw_data, find_raw_file, raw_columns,
+                                needed_columns, iter_raw_data,
+                                estimate_chunk_size,
+                                convert_raw_data, cleaning_steps, clean_data,
+                                clean_data_chunked, clean_data_frozen,
+                                save_cleaning, load_cleaning)
+from .schema import (SCHEMA, apply_schema, feature_types, memory_usage,
+                     memory_report)
+from .bundle_utils import (hash_files, save_split, split_files, append_split,
+                           SplitWriter, read_split_metadata, load_split)
 
-__all__ = (read_data, drop_columns, drop_nans,
-           rename_cols, drop_duplicates, drop_rows,
+__all__ = (read_columns, read_data, iter_data, write_data, drop_columns,
+           drop_nans, rename_cols, drop_duplicates, drop_rows,
            filter_rows, clean_address, clean_district,
-           impute_district, clean_price, clean_sqm,
+           read_overrides, impute_district, clean_price, clean_sqm,
            clean_condition, clean_outliers,
            remove_outliers_iqr, create_price_sqm,
            create_property_class, create_property_type,
            create_house_type, create_year_bins,
-           create_heating, create_heating_type,
-           create_heating_source, create_air_conditioning,
-           create_energy_efficiency, create_listing_date,
-           create_elevator, create_disabled_access,
-           create_floor, create_garage_parking,
-           create_external_parking, create_num_bathrooms,
-           create_num_rooms, string_parser,
-           create_parsed_features, create_windows,
-           create_garden, create_furnished,
-           create_terrace, create_exposure,
-           create_other_features, create_pipeline,
-           parse_config, filter_data, rng, load_raw_data, clean_data)
+           HEATING_SPEC, create_energy_efficiency,
+           create_listing_date, LAYOUT_SPEC,
+           create_amenity_features,
+           create_pipeline, row_local, row_filter, reads, writes,
+           freezable, parse_config, filter_data, rng, load_raw_data,
+           find_raw_file, raw_columns, needed_columns,
+           iter_raw_data, estimate_chunk_size, convert_raw_data,
+           cleaning_steps, clean_data, clean_data_chunked,
+           clean_data_frozen, save_cleaning, load_cleaning, SCHEMA,
+           apply_schema, feature_types, memory_usage, memory_report,
+           hash_files, save_split, split_files, append_split, SplitWriter,
+           read_split_metadata, load_split, TokenMatrix,
+           compile_patterns, extract_features, step_name, profile_step,
+           format_profile, save_profile, split_stages, run_parallel,
+           fingerprint, ChunkedPipeline, plan_pipeline,
+           fingerprinted_columns, FrozenPipeline,
+           state_key, cleaning_outcome, extend_outcome, drift, save_state,
+           load_state, code_hash, stage_key, StageCache)
@@ -1,48 +1,286 @@
 # -*- coding: utf-8 -*-
 import click
 import logging
+import os
+import pandas as pd
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
 from sklearn.model_selection import train_test_split
-from src.features import parse_config, load_raw_data, clean_data, rng
+from src.features import (parse_config, load_raw_data, find_raw_file,
+                          needed_columns, iter_raw_data, estimate_chunk_size,
+                          clean_data, clean_data_chunked, clean_data_frozen,
+                          save_cleaning, apply_schema,
+                          memory_report, hash_files, save_split, append_split,
+                          SplitWriter, read_split_metadata, format_profile,
+                          save_profile,
+                          state_key, cleaning_outcome, extend_outcome, drift,
+                          save_state, load_state, stage_key, StageCache)
+
+
+def save_features(X, y, output_filepath, config, source_hash):
+    """Split the features and target into train and test sets and save
+    them for modeling."""
+    seed = config['features']['split_seed']
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=config['features']['test_size'], random_state=seed)
+    save_split(output_filepath + '/split.parquet', X_train, X_test, y_train,
+               y_test, seed, source_hash)
+
+
+def save_frozen(output_filepath, config, columns, statistics):
+    """Save the cleaning pipeline for new raw rows to cleaning.pkl, frozen
+    with the statistics of the cleaning of the given columns, e.g. those
+    of a fitted chunked pipeline."""
+    frozen = clean_data_frozen(config, columns).set_state(
+        {'statistics': statistics})
+    save_cleaning(output_filepath + '/cleaning.pkl', config, frozen)
+
+
+def split_writer(output_filepath, config, columns, n_rows, source_hash):
+    """Return a SplitWriter of the split of n_rows cleaned rows with the
+    given columns."""
+    features = [col for col in columns
+                if col not in config['features']['drop_cols']]
+    return SplitWriter(output_filepath + '/split.parquet', n_rows, features,
+                       config['features']['target'],
+                       config['features']['test_size'],
+                       config['features']['split_seed'], source_hash)
+
+
+def split_bundle_id(output_filepath):
+    """Return the id of the saved split bundle, or None if there is
+    none."""
+    split_file = output_filepath + '/split.parquet'
+    if not os.path.exists(split_file):
+        return None
+    return read_split_metadata(split_file).get('bundle_id')
+
+
+def build_chunked(input_filepath, output_filepath, config, columns,
+                  source_hash):
+    """Clean the given raw columns in chunks fitting the memory budget of
+    the config and write the cleaned data and the split chunk by
+    chunk."""
+    logger = logging.getLogger(__name__)
+    chunk_size = estimate_chunk_size(input_filepath, config,
+                                     config['cleaning']['memory_budget_mb'],
+                                     columns)
+    logger.info('Cleaning data in chunks of {} rows'.format(chunk_size))
+
+    cleaning_pipeline = clean_data_chunked(config, columns).fit(
+        iter_raw_data(input_filepath, config, chunk_size, columns))
+    logger.info('Kept {} rows out of {}'.format(
+        cleaning_pipeline.n_rows, cleaning_pipeline.n_input_rows))
+
+    writer = None
+    for df_clean in cleaning_pipeline.transform(
+            iter_raw_data(input_filepath, config, chunk_size, columns)):
+        df_clean = apply_schema(df_clean)
+        df_clean.to_csv(output_filepath + '/data_clean.csv', index=False,
+                        mode='a' if writer else 'w', header=not writer)
+        if writer is None:
+            writer = split_writer(output_filepath, config, df_clean.columns,
+                                  cleaning_pipeline.n_rows, source_hash)
+        writer.write(df_clean)
+    if writer is None:
+        raise ValueError('No rows left after cleaning')
+    writer.close()
+    save_frozen(output_filepath, config, columns,
+                cleaning_pipeline.statistics)
+
+
+def build_incremental(input_filepath, output_filepath, config, columns,
+                      source_hash):
+    """Clean the raw rows added since the last incremental build with the
+    state of the global cleaning steps saved by it and append them to the
+    cleaned data and to the split, without rewriting either. The raw
+    files must only grow by appended rows.
+
+    All the rows are cleaned and split again, as build_chunked does, if
+    no state was saved for the config, the raw columns and the current
+    split, or if cleaning them again would change more than the max
+    drift of the config of the cleaned rows."""
+    logger = logging.getLogger(__name__)
+    state_file = output_filepath + '/cleaning_state.pkl'
+    key = state_key(config['cleaning'], columns,
+                    hash_files([config['cleaning']['district_overrides']]))
+    chunk_size = estimate_chunk_size(input_filepath, config,
+                                     config['cleaning']['memory_budget_mb'],
+                                     columns)
+
+    cleaning_pipeline = clean_data_chunked(config, columns)
+    outcome = load_state(state_file, cleaning_pipeline, key,
+                         split_bundle_id(output_filepath))
+    start = 0
+    if outcome is None:
+        cleaning_pipeline.fit(
+            iter_raw_data(input_filepath, config, chunk_size, columns))
+    else:
+        start = cleaning_pipeline.n_input_rows
+        cleaning_pipeline.partial_fit(
+            iter_raw_data(input_filepath, config, chunk_size, columns, start))
+        logger.info('Cleaning {} new rows'.format(
+            cleaning_pipeline.n_input_rows - start))
+        changed = drift(cleaning_pipeline, outcome)
+        if changed > config['cleaning']['max_drift']:
+            logger.info('Cleaning all the rows again, as {:.2%} of the '
+                        'cleaned rows changed'.format(changed))
+            start, outcome = 0, None
+
+    new_outcome = cleaning_outcome(cleaning_pipeline, start)
+    writer = None
+    new_rows = []
+    for df_clean in cleaning_pipeline.transform(
+            iter_raw_data(input_filepath, config, chunk_size, columns, start),
+            start):
+        df_clean = apply_schema(df_clean)
+        appending = bool(start or writer)
+        df_clean.to_csv(output_filepath + '/data_clean.csv', index=False,
+                        mode='a' if appending else 'w', header=not appending)
+        if start:
+            new_rows.append(df_clean)
+            continue
+        if writer is None:
+            writer = split_writer(output_filepath, config, df_clean.columns,
+                                  cleaning_pipeline.n_rows, source_hash)
+        writer.write(df_clean)
+
+    if writer is not None:
+        writer.close()
+    elif not start:
+        raise ValueError('No rows left after cleaning')
+    elif new_rows:
+        data = apply_schema(pd.concat(new_rows, ignore_index=True))
+        target = config['features']['target']
+        append_split(output_filepath + '/split.parquet',
+                     data.drop(columns=config['features']['drop_cols']),
+                     data[target], config['features']['test_size'],
+                     source_hash)
+
+    if outcome is not None:
+        new_outcome = extend_outcome(outcome, new_outcome)
+    save_state(state_file, cleaning_pipeline, new_outcome, key,
+               split_bundle_id(output_filepath))
+    save_frozen(output_filepath, config, columns,
+                cleaning_pipeline.statistics)
+
+
+def build_in_memory(input_filepath, output_filepath, config, columns,
+                    source_hash, profile, deferred, n_jobs):
+    """Load the given raw columns, clean them in memory with the given
+    options and save the cleaned data and the split."""
+    logger = logging.getLogger(__name__)
+
+    # Load data
+    df = load_raw_data(input_filepath, config, columns)
+
+    # Clean and save data for EDA, keeping the statistics of the cleaning
+    # steps to freeze them for new raw rows
+    records = [] if profile else None
+    statistics = {}
+    df_clean = clean_data(config, records, deferred, n_jobs, statistics)(df)
+    save_frozen(output_filepath, config, columns, statistics)
+    if profile:
+        logger.info('Cleaning profile:\n' + format_profile(records))
+        save_profile(records, output_filepath + '/cleaning_profile.json')
+    df_typed = apply_schema(df_clean)
+    logger.info('Memory of cleaned data: ' + memory_report(df_clean,
+                                                           df_typed))
+    df_clean = df_typed
+    df_clean.to_csv(output_filepath + '/data_clean.csv', index=False)
+
+    # Select features for pre-processing and modeling
+    target = config['features']['target']
+
+    X = df_clean.drop(columns=config['features']['drop_cols'])
+    y = df_clean[target]
+
+    # Split data and save X and y sets for modeling
+    save_features(X, y, output_filepath, config, source_hash)
 
 
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
 @click.argument('config_file', type=str, default='config.yml')
-def main(input_filepath, output_filepath, config_file):
+@click.option('--profile', is_flag=True,
+              help='Profile the cleaning steps and save the report to '
+                   'cleaning_profile.json.')
+@click.option('--deferred', is_flag=True,
+              help='Defer the row filters of the cleaning steps and apply '
+                   'them at once, without intermediate copies.')
+@click.option('--n-jobs', default=1, type=click.IntRange(1),
+              help='Number of processes running the row-local cleaning '
+                   'steps on partitions of the data. Only worth it on '
+                   'multi-core hosts and large data, see '
+                   'benchmark_parallel; the default runs serially.')
+@click.option('--chunked', is_flag=True,
+              help='Read the raw data in chunks fitting the memory budget of '
+                   'the config, for data larger than memory. The raw files '
+                   'must be converted to Parquet or Feather.')
+@click.option('--incremental', is_flag=True,
+              help='Only clean the raw rows added since the last '
+                   'incremental run, with the state saved to '
+                   'cleaning_state.pkl. The raw files must be converted to '
+                   'Parquet or Feather.')
+@click.option('--force', is_flag=True,
+              help='Build the features even if they are in the stage cache.')
+def main(input_filepath, output_filepath, config_file, profile, deferred,
+         n_jobs, chunked, incremental, force):
     """ Runs data loading and cleaning and pre-processing scripts and
     saves data in ../processed."""
     logger = logging.getLogger(__name__)
     logger.info('Loading collected data, cleaning it, splitting it and'
                 'saving it for pre-processing and modeling.')
 
+    if (chunked or incremental) and (profile or deferred or n_jobs > 1 or
+                                     (chunked and incremental)):
+        raise click.UsageError('--chunked and --incremental cannot be '
+                               'combined with each other or with '
+                               '--profile, --deferred or --n-jobs')
+
     # Parse config file
     config = parse_config(config_file)
+    raw_files = [find_raw_file(input_filepath + filename)
+                 for filename in config['cleaning']['filenames']]
+    source_hash = hash_files(raw_files)
 
-    # Load data
-    df = load_raw_data(input_filepath, config)
-
-    # Clean and save data for EDA
-    df_clean = clean_data(config)(df)
-    df_clean.to_csv(output_filepath + '/data_clean.csv', index=False)
-
-    # Select features for pre-processing and modeling
-    target = config['features']['target']
-
-    X = df_clean.drop(columns=config['features']['drop_cols'])
-    y = df_clean[target]
+    # Reuse the outputs of a previous build of the same raw data, config
+    # and code. Incremental builds depend on their saved state instead.
+    cache = StageCache(config['caching']['cache_dir'],
+                       config['caching']['max_size_mb'])
+    state_file = output_filepath + '/cleaning_state.pkl'
+    outputs = [output_filepath + filename for filename
+               in ('/data_clean.csv', '/split.parquet', '/cleaning.pkl')]
+    key = stage_key('build_features',
+                    [source_hash,
+                     hash_files([config['cleaning']['district_overrides']])],
+                    {section: config[section]
+                     for section in ('cleaning', 'features')},
+                    ['src.features'], {'chunked': chunked})
+    if not incremental and os.path.exists(state_file):
+        # Other builds rewrite the cleaned data and the split that the
+        # state of the incremental builds describes
+        os.remove(state_file)
+    if not (force or incremental or profile) and \
+            cache.restore(key, outputs):
+        logger.info('Restored the features from the stage cache')
+        return
 
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2,
-                                                        random_state=rng)
+    # Read only the raw columns used by the cleaning steps
+    columns = needed_columns(input_filepath, config)
 
-    # Save X and y sets for modeling
-    datasets = [X_train, X_test, y_train, y_test]
-    filenames = ['X_train', 'X_test', 'y_train', 'y_test']
-    for dataset, name in zip(datasets, filenames):
-        dataset.to_csv(output_filepath + '/{}.csv'.format(name), index=False)
+    if incremental:
+        build_incremental(input_filepath, output_filepath, config, columns,
+                          source_hash)
+        return
+    if chunked:
+        build_chunked(input_filepath, output_filepath, config, columns,
+                      source_hash)
+    else:
+        build_in_memory(input_filepath, output_filepath, config, columns,
+                        source_hash, profile, deferred, n_jobs)
+    cache.store(key, outputs)
 
 
 if __name__ == '__main__':
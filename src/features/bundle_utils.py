@@ -0,0 +1,270 @@
+import glob
+import hashlib
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.model_selection import train_test_split
+from .schema import SCHEMA
+
+BUNDLE_VERSION = 1
+
+
+def hash_files(filenames):
+    """Return the SHA-256 digest of the contents of a list of files."""
+    digest = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def save_split(filename, X_train, X_test, y_train, y_test, seed,
+               source_hash):
+    """Save the train and test sets to a single Parquet file.
+
+    The training rows are stored first, followed by the test rows. The
+    file metadata records the bundle version, a random id of the bundle,
+    the split seed, the hash of the source data, the number of training
+    rows, the feature and target columns and their dtypes and
+    categories. The rows appended to a previous bundle of the same file
+    are removed."""
+    _write_part(filename, X_train, X_test, y_train, y_test, {
+        'version': BUNDLE_VERSION,
+        'bundle_id': uuid.uuid4().hex,
+        'seed': seed,
+        'source_hash': source_hash})
+    _remove_parts(filename)
+
+
+def _write_part(filename, X_train, X_test, y_train, y_test, metadata):
+    """Write train and test sets to a Parquet file, the training rows
+    first, with the given metadata completed with the number of training
+    rows, the columns and their dtypes and categories."""
+    train = pd.concat([X_train, y_train], axis=1)
+    test = pd.concat([X_test, y_test], axis=1)
+    data = pd.concat([train, test], ignore_index=True)
+
+    metadata = {
+        **metadata,
+        'n_train': len(train),
+        'features': list(X_train.columns),
+        'target': list(y_train.columns),
+        'dtypes': {col: str(dtype) for col, dtype in data.dtypes.items()},
+        'categories': {col: list(data[col].cat.categories)
+                       for col in data.columns
+                       if str(data[col].dtype) == 'category'},
+    }
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **table.schema.metadata, b'split': json.dumps(metadata).encode()})
+    pq.write_table(table, filename)
+
+
+def _part_files(filename):
+    """Return the files of the rows appended to a saved split with
+    append_split, in order, including the ones left by a previous
+    bundle."""
+    parts = glob.glob(glob.escape(filename) + '.append-*')
+    return sorted(parts, key=lambda part: int(part.rsplit('-', 1)[1]))
+
+
+def _remove_parts(filename):
+    """Remove the files of the rows appended to a previous bundle."""
+    for part in _part_files(filename):
+        os.remove(part)
+
+
+def split_files(filename):
+    """Return the files of a saved split: the file saved with save_split
+    or SplitWriter and the files of the rows appended to it, e.g. to hash
+    the split."""
+    bundle_id = read_split_metadata(filename).get('bundle_id')
+    return [filename] + [part for part in _part_files(filename)
+                         if bundle_id is not None and
+                         read_split_metadata(part)['bundle_id'] == bundle_id]
+
+
+def append_split(filename, X, y, test_size, source_hash):
+    """Append new rows to a saved split without rewriting it, in a file
+    next to it. Every new row goes to the test set with probability
+    test_size, drawn with the split seed and the number of the appended
+    file, so the rows already saved keep their set."""
+    metadata = read_split_metadata(filename)
+    if (list(X.columns) != metadata['features'] or
+            list(y.columns) != metadata['target']):
+        raise ValueError('The new rows have other columns than the split')
+    parts = _part_files(filename)
+    part = int(parts[-1].rsplit('-', 1)[1]) + 1 if parts else 1
+
+    is_test = np.random.RandomState([metadata['seed'], part]).rand(
+        len(X)) < test_size
+    _write_part('{}.append-{}'.format(filename, part), X[~is_test],
+                X[is_test], y[~is_test], y[is_test], {
+                    'version': BUNDLE_VERSION,
+                    'bundle_id': metadata['bundle_id'],
+                    'seed': metadata['seed'],
+                    'source_hash': source_hash})
+
+
+def _arrow_type(dtype):
+    """Return the Arrow type of a column declared in the schema, with
+    categoricals stored as strings."""
+    if dtype == 'category':
+        return pa.string()
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+class SplitWriter:
+    """Write the train and test sets to a single Parquet file as
+    save_split does, from the cleaned data written in chunks, e.g. too
+    large to fit in memory.
+
+    The rows are split as train_test_split splits the whole data and
+    every row is written to a temporary file of its set, with its
+    position within the set in an order column, which load_split sorts
+    by. The categories of every categorical column are collected across
+    the chunks. Closing the writer copies the two sets to the file with
+    the metadata of save_split and removes the temporary files."""
+
+    order_column = '__order__'
+
+    def __init__(self, filename, n_rows, features, target, test_size, seed,
+                 source_hash):
+        train, test = train_test_split(np.arange(n_rows), test_size=test_size,
+                                       random_state=seed)
+        self.is_test = np.zeros(n_rows, dtype=bool)
+        self.is_test[test] = True
+        self.order = np.empty(n_rows, dtype=np.int64)
+        self.order[train] = np.arange(len(train))
+        self.order[test] = np.arange(len(test))
+
+        self.filename = filename
+        self.columns = list(features) + list(target)
+        self.schema = pa.schema(
+            [(col, _arrow_type(SCHEMA[col])) for col in self.columns]
+            + [(self.order_column, pa.int64())])
+        self.metadata = {
+            'version': BUNDLE_VERSION,
+            'bundle_id': uuid.uuid4().hex,
+            'seed': seed,
+            'source_hash': source_hash,
+            'n_train': len(train),
+            'features': list(features),
+            'target': list(target),
+            'dtypes': {col: SCHEMA[col] for col in self.columns},
+            'order_column': self.order_column,
+        }
+        self.categories = {col: set() for col in self.columns
+                           if SCHEMA[col] == 'category'}
+        self.parts = {part: '{}.{}'.format(filename, part)
+                      for part in ('train', 'test')}
+        self.writers = {part: pq.ParquetWriter(part_filename, self.schema)
+                        for part, part_filename in self.parts.items()}
+        self.start = 0
+
+    def write(self, data):
+        """Write the next rows of the cleaned data, with the dtypes of the
+        schema."""
+        rows = np.arange(self.start, self.start + len(data))
+        self.start += len(data)
+        data = data[self.columns].copy()
+        for col, categories in self.categories.items():
+            categories.update(data[col].cat.categories)
+            data[col] = data[col].astype(object)
+        data[self.order_column] = self.order[rows]
+
+        for part, selected in (('train', ~self.is_test[rows]),
+                               ('test', self.is_test[rows])):
+            self.writers[part].write_table(pa.Table.from_pandas(
+                data[selected], schema=self.schema, preserve_index=False))
+
+    def close(self):
+        """Write the file from the train and test sets and remove their
+        temporary files."""
+        if self.start != len(self.order):
+            raise ValueError('{} rows written out of {}'.format(
+                self.start, len(self.order)))
+        for writer in self.writers.values():
+            writer.close()
+
+        metadata = {**self.metadata, 'categories': {
+            col: sorted(categories)
+            for col, categories in self.categories.items()}}
+        schema = self.schema.with_metadata(
+            {b'split': json.dumps(metadata).encode()})
+        with pq.ParquetWriter(self.filename, schema) as writer:
+            for part_filename in self.parts.values():
+                part = pq.ParquetFile(part_filename)
+                for i in range(part.num_row_groups):
+                    writer.write_table(part.read_row_group(i))
+        for part_filename in self.parts.values():
+            os.remove(part_filename)
+        _remove_parts(self.filename)
+
+
+def read_split_metadata(filename):
+    """Return the metadata of a saved split without reading its
+    data."""
+    return json.loads(pq.read_schema(filename).metadata[b'split'])
+
+
+def _load_part(filename):
+    """Load the rows of a file of a saved split and return its train and
+    test sets as DataFrames, with its metadata."""
+    table = pq.read_table(filename, memory_map=True)
+    metadata = json.loads(table.schema.metadata[b'split'])
+    if metadata['version'] != BUNDLE_VERSION:
+        raise ValueError('Unsupported bundle version {}, rebuild the '
+                         'features'.format(metadata['version']))
+
+    changed = [col for col, dtype in metadata['dtypes'].items()
+               if SCHEMA.get(col) != dtype]
+    if changed:
+        raise ValueError('Columns saved with dtypes that differ from the '
+                         'schema: {}, rebuild the features'.format(changed))
+
+    data = table.to_pandas().astype({
+        col: pd.CategoricalDtype(categories)
+        for col, categories in metadata['categories'].items()})
+
+    n_train = metadata['n_train']
+    if 'order_column' in metadata:
+        # Sort the rows of each set written by SplitWriter
+        order = data.pop(metadata['order_column']).values.copy()
+        order[n_train:] += n_train
+        data = data.iloc[np.argsort(order)].reset_index(drop=True)
+    return data.iloc[:n_train], data.iloc[n_train:], metadata
+
+
+def load_split(filename):
+    """Load the train and test sets saved with save_split, memory-mapping
+    the file, followed by the rows appended with append_split. Raise a
+    ValueError if the bundle was saved with another version or with
+    dtypes that differ from the current schema."""
+    trains, tests = [], []
+    categories = {}
+    for part in split_files(filename):
+        train, test, metadata = _load_part(part)
+        trains.append(train)
+        tests.append(test)
+        for col, values in metadata['categories'].items():
+            categories[col] = list(dict.fromkeys(categories.get(col, []) +
+                                                 values))
+
+    train, test = trains[0], tests[0]
+    if len(trains) > 1:
+        dtypes = {col: pd.CategoricalDtype(values)
+                  for col, values in categories.items()}
+        train = pd.concat([part.astype(dtypes) for part in trains],
+                          ignore_index=True)
+        test = pd.concat([part.astype(dtypes) for part in tests],
+                         ignore_index=True)
+    X, y = metadata['features'], metadata['target']
+    return (train[X], test[X].reset_index(drop=True), train[y],
+            test[y].reset_index(drop=True))
@@ -0,0 +1,98 @@
+import importlib
+import json
+import os
+import shutil
+from .bundle_utils import hash_files
+from .incremental_utils import state_key
+
+
+def code_hash(modules):
+    """Return the SHA-256 digest of the source files of a list of modules
+    or packages given by name, e.g. the code version of a stage."""
+    filenames = []
+    for name in modules:
+        module = importlib.import_module(name)
+        for path in getattr(module, '__path__', []):
+            filenames += sorted(os.path.join(path, filename)
+                                for filename in os.listdir(path)
+                                if filename.endswith('.py'))
+        if not hasattr(module, '__path__'):
+            filenames.append(module.__file__)
+    return hash_files(filenames)
+
+
+def stage_key(stage, input_hashes, config, modules, options=None):
+    """Return the key of the outputs of a pipeline stage, hashing its name,
+    the hashes of the contents of its inputs (see hash_files), the config
+    sections it reads, the code of the modules it runs and the options
+    changing its outputs."""
+    return state_key(stage, input_hashes, config, code_hash(modules),
+                     options)
+
+
+def _entry_size(entry):
+    return sum(os.path.getsize(os.path.join(entry, filename))
+               for filename in os.listdir(entry))
+
+
+class StageCache:
+    """Cache of the output files of pipeline stages, keyed by stage_key,
+    in a directory of at most max_size_mb.
+
+    Every entry is a directory named after its key, holding copies of
+    the outputs and the list of their names. Entries are written to a
+    temporary directory first, so that interrupted stages leave no
+    partial entry, and the least recently used entries are evicted once
+    the cache grows over its size."""
+
+    def __init__(self, cache_dir, max_size_mb):
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+
+    def restore(self, key, outputs):
+        """Copy the cached outputs of a key to the given paths and return
+        True, or return False if they are not cached."""
+        entry = os.path.join(self.cache_dir, key)
+        manifest = os.path.join(entry, 'outputs.json')
+        if not os.path.exists(manifest):
+            return False
+        with open(manifest) as f:
+            names = json.load(f)
+        if names != [os.path.basename(output) for output in outputs]:
+            return False
+        for i, output in enumerate(outputs):
+            shutil.copyfile(os.path.join(entry, str(i)), output)
+        os.utime(entry)
+        return True
+
+    def store(self, key, outputs):
+        """Cache copies of the outputs of a key, then evict the least
+        recently used entries over the size of the cache."""
+        entry = os.path.join(self.cache_dir, key)
+        tmp = '{}.tmp-{}'.format(entry, os.getpid())
+        os.makedirs(tmp)
+        for i, output in enumerate(outputs):
+            shutil.copyfile(output, os.path.join(tmp, str(i)))
+        with open(os.path.join(tmp, 'outputs.json'), 'w') as f:
+            json.dump([os.path.basename(output) for output in outputs], f)
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.rename(tmp, entry)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        its size, and return the number of entries removed."""
+        entries = [os.path.join(self.cache_dir, name)
+                   for name in os.listdir(self.cache_dir)
+                   if '.tmp-' not in name]
+        sizes = {entry: _entry_size(entry) for entry in entries}
+        total = sum(sizes.values())
+        removed = 0
+        for entry in sorted(entries, key=os.path.getmtime):
+            if total <= self.max_size_mb * 1e6:
+                break
+            shutil.rmtree(entry)
+            total -= sizes[entry]
+            removed += 1
+        return removed
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from .profiling_utils import step_name
+
+# Keys (16 bytes) of the two 64-bit hashes making up the fingerprint of
+# a row
+FINGERPRINT_KEYS = ('0123456789123456', 'chunked-pipeline')
+
+
+def fingerprint(data):
+    """Return a 128-bit fingerprint of each row of a DataFrame, as two
+    uint64 columns. Rows with the same values have the same fingerprint,
+    and different rows are very unlikely to."""
+    return pd.DataFrame({
+        i: pd.util.hash_pandas_object(data, index=False, hash_key=key).values
+        for i, key in enumerate(FINGERPRINT_KEYS)}, index=data.index)
+
+
+def _compact(summary):
+    """Store the strings of a summary as categoricals."""
+    for col in summary.columns:
+        if summary[col].dtype == object:
+            summary[col] = summary[col].astype('category')
+    return summary
+
+
+def _summarize(data, columns, rows):
+    """Return the columns of some rows of a DataFrame read by a global
+    step, with strings stored as categoricals, or the fingerprint of
+    these rows."""
+    if columns is None:
+        return fingerprint(data.loc[rows])
+    return _compact(data.loc[rows, columns])
+
+
+def _is_filter(function):
+    return hasattr(function, 'mask')
+
+
+def _is_global(function):
+    return not getattr(function, 'row_local', False)
+
+
+class ChunkedPipeline:
+    """Run cleaning steps on data read in chunks, e.g. too large to fit
+    in memory, with the same output as on the whole data.
+
+    The data is read twice. When fitting, the steps up to the last
+    filter or global step run on every chunk, without dropping rows:
+    the masks of the row-local filters are kept, and for every global
+    step only the columns it reads (see reads). The global steps then
+    run on these columns, which gives the rows kept after every step,
+    their final index and the columns created by global steps. When
+    transforming, the steps run on every chunk again, with the global
+    steps replaced by their results.
+
+    Memory grows with the number of rows by the size of the masks and
+    of the columns read by global steps, a few tens of bytes per row."""
+
+    def __init__(self, list_functions):
+        for function in list_functions:
+            if _is_global(function) and not hasattr(function, 'reads'):
+                raise ValueError('Step {} is global and does not declare the '
+                                 'columns it reads'.format(
+                                     step_name(function)))
+        self.list_functions = list_functions
+        self.last = max([i for i, function in enumerate(list_functions)
+                         if _is_filter(function) or _is_global(function)],
+                        default=-1)
+
+    def fit(self, chunks):
+        """Read the chunks once and run the global steps on the columns
+        they read."""
+        n_steps = self.last + 1
+        self.set_state({'n_input_rows': 0, 'masks': [[]] * n_steps,
+                        'summaries': [[]] * n_steps})
+        return self.partial_fit(chunks)
+
+    def partial_fit(self, chunks):
+        """Read chunks of new rows, following the rows fitted so far, and
+        run the global steps again on the columns they read of all the
+        rows."""
+        steps = self.list_functions[:self.last + 1]
+        masks, summaries = self.masks, self.summaries
+
+        n_rows = self.n_input_rows
+        for chunk in chunks:
+            chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+            n_rows += len(chunk)
+            alive = np.ones(len(chunk), dtype=bool)
+            for i, function in enumerate(steps):
+                if _is_global(function):
+                    summaries[i].append(_summarize(chunk, function.reads,
+                                                   alive))
+                elif _is_filter(function):
+                    masks[i].append(function.mask(chunk, None))
+                    alive &= masks[i][-1]
+                else:
+                    chunk = function(chunk)
+
+        self.n_input_rows = n_rows
+        self._resolve()
+        return self
+
+    def get_state(self):
+        """Return the state of the fitted rows: the masks of the
+        row-local filters and the columns read by the global steps, which
+        can be saved, e.g. with joblib."""
+        return {
+            'n_input_rows': self.n_input_rows,
+            'masks': [[np.concatenate(masks)] if masks else []
+                      for masks in self.masks],
+            'summaries': [[_compact(pd.concat(summaries))] if summaries
+                          else [] for summaries in self.summaries],
+        }
+
+    def set_state(self, state):
+        """Restore the state of fitted rows, see get_state, and run the
+        global steps on it."""
+        if len(state['masks']) != self.last + 1:
+            raise ValueError('State of another pipeline')
+        self.n_input_rows = state['n_input_rows']
+        self.masks = [list(masks) for masks in state['masks']]
+        self.summaries = [list(summaries)
+                          for summaries in state['summaries']]
+        self._resolve()
+        return self
+
+    def _resolve(self):
+        """Run the filters and global steps on all the rows, keeping the
+        rows kept after every filter and at the end, the results of the
+        global steps that are not filters, the statistics of the global
+        steps that freeze them (see FrozenPipeline) and the final
+        index."""
+        masks, summaries = self.masks, self.summaries
+        keep = np.ones(self.n_input_rows, dtype=bool)
+        index = np.arange(self.n_input_rows)
+        self.kept, self.results, self.statistics = {}, {}, {}
+        created = set()
+
+        for i, function in enumerate(self.list_functions[:self.last + 1]):
+            if not _is_global(function):
+                if _is_filter(function) and masks[i]:
+                    keep &= np.concatenate(masks[i])
+            elif created.intersection(function.reads or []):
+                raise ValueError('Step {} reads columns created by a global '
+                                 'step'.format(step_name(function)))
+            elif summaries[i]:
+                summary = pd.concat(summaries[i])
+                summary = summary.loc[keep[summary.index.values]]
+                rows = summary.index.values
+                summary = summary.astype({
+                    col: object for col in summary.columns
+                    if str(summary[col].dtype) == 'category'})
+                summary.index = index[rows]
+                self._run_global(i, summary, rows, keep)
+                if i in self.results:
+                    created.update(self.results[i].columns)
+
+            if _is_filter(function):
+                self.kept[i] = keep.copy()
+                if function.reset_index:
+                    index[keep] = np.arange(keep.sum())
+
+        self.keep = keep
+        self.index = index
+        self.n_rows = int(keep.sum())
+
+    def _run_global(self, i, summary, rows, keep):
+        """Run a global step on the columns it reads of the given rows,
+        updating the kept rows if it is a filter, else keeping its
+        results."""
+        function = self.list_functions[i]
+        if hasattr(function, 'fit'):
+            self.statistics[i] = function.fit(summary)
+
+        if _is_filter(function):
+            keep[rows[~np.asarray(function.mask(summary, None))]] = False
+        else:
+            out = function(summary)
+            if len(out) != len(summary):
+                raise ValueError('Step {} drops rows but is not a row '
+                                 'filter'.format(step_name(function)))
+            out.index = rows
+            self.results[i] = out
+
+    def transform(self, chunks, start=0):
+        """Read the chunks again and yield them cleaned, skipping the
+        chunks left without rows. The chunks start at the given row, e.g.
+        to clean the rows added by partial_fit."""
+        for chunk in chunks:
+            ids = np.arange(start, start + len(chunk))
+            start += len(chunk)
+            chunk.index = ids
+            for i, function in enumerate(self.list_functions):
+                if i in self.kept:
+                    chunk = chunk.loc[self.kept[i][chunk.index.values]]
+                elif i in self.results:
+                    result = self.results[i].loc[chunk.index.values]
+                    for col in result.columns:
+                        chunk[col] = result[col].values
+                else:
+                    chunk = function(chunk)
+            if len(chunk):
+                chunk.index = self.index[chunk.index.values]
+                yield chunk
@@ -1,43 +1,233 @@
-from src.features import (read_data, drop_columns, drop_nans, rename_cols,
-                          drop_duplicates, drop_rows, filter_rows,
-                          clean_address, clean_district, impute_district,
+import os
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+
+from src.features import (read_columns, read_data, iter_data, write_data,
+                          drop_columns,
+                          drop_nans, rename_cols, drop_duplicates, drop_rows,
+                          filter_rows, clean_address, clean_district,
+                          read_overrides, impute_district,
                           clean_price, clean_sqm, clean_condition,
                           clean_outliers, remove_outliers_iqr,
                           create_price_sqm, create_property_class,
                           create_property_type, create_house_type,
-                          create_year_bins, create_heating,
-                          create_heating_type, create_heating_source,
-                          create_air_conditioning, create_energy_efficiency,
-                          create_listing_date, create_elevator,
-                          create_disabled_access, create_floor,
-                          create_garage_parking, create_external_parking,
-                          create_num_bathrooms, create_num_rooms,
-                          string_parser, create_parsed_features,
-                          create_windows, create_garden, create_furnished,
-                          create_terrace, create_exposure,
-                          create_other_features, create_pipeline, filter_data)
-
-
-def load_raw_data(path, config):
-    dfs = []
-    for filename in config['cleaning']['filenames']:
-        dfs.append(read_data(path + filename))
+                          create_year_bins, HEATING_SPEC,
+                          create_energy_efficiency, create_listing_date,
+                          LAYOUT_SPEC, extract_features,
+                          create_amenity_features, create_pipeline,
+                          filter_data, fingerprint, ChunkedPipeline,
+                          FrozenPipeline, plan_pipeline,
+                          fingerprinted_columns)
+
+
+COLUMNAR_FORMATS = ('.parquet', '.feather')
+
+# Ratio of the peak memory used to clean a chunk of raw data and write
+# it to the size of the chunk in memory
+CHUNK_OVERHEAD = 4
+
+
+def _column_selectors(config, columns=None):
+    """Return, for each raw file, a callable selecting the columns kept by
+    the config, and among them the given columns if any."""
+    drop_cols_1 = set(config['cleaning']['drop_cols_1'])
+    keep_cols = set(config['cleaning']['keep_cols'])
+    drop_cols_2 = set(config['cleaning']['drop_cols_2'])
+    selectors = [lambda col: col not in drop_cols_1,
+                 lambda col: col in keep_cols,
+                 lambda col: col not in drop_cols_2]
+    if columns is None:
+        return selectors
+    columns = set(columns)
+    return [lambda col, selector=selector: selector(col) and col in columns
+            for selector in selectors]
+
+
+def _keep_cols(config, columns=None):
+    """Return the columns kept from the second raw file, in order."""
+    return [col for col in config['cleaning']['keep_cols']
+            if columns is None or col in columns]
+
+
+def find_raw_file(filename):
+    """Return the columnar version of a raw file if it has been converted,
+    else the file itself. Raise a ValueError if the converted file is
+    older than the raw file, e.g. after a new crawl, as it would load
+    stale data."""
+    stem = os.path.splitext(filename)[0]
+    for extension in COLUMNAR_FORMATS:
+        converted = stem + extension
+        if os.path.exists(converted):
+            if os.path.exists(filename) and (os.path.getmtime(converted) <
+                                             os.path.getmtime(filename)):
+                raise ValueError('{} is older than {}, convert the raw data '
+                                 'again'.format(converted, filename))
+            return converted
+    return filename
+
+
+def _file_columns(path, config):
+    """Return the columns kept by the config of each raw file, reading
+    only their headers."""
+    filenames = [find_raw_file(path + filename)
+                 for filename in config['cleaning']['filenames']]
+    selectors = _column_selectors(config)
+    columns = [[col for col in read_columns(filename) if selector(col)]
+               for filename, selector in zip(filenames, selectors)]
+    columns[1] = _keep_cols(config)
+    return columns
+
+
+def raw_columns(path, config):
+    """Return the columns of the raw data loaded by load_raw_data, reading
+    only the headers of the raw files."""
+    return sum(_file_columns(path, config), [])
+
+
+def _fingerprint_cols(i):
+    """Return the names of the columns of the fingerprint of the i-th raw
+    file, see needed_columns."""
+    return ['Fingerprint_{}_{}'.format(i, j) for j in range(2)]
+
+
+def needed_columns(path, config):
+    """Return the columns of the raw data used by the cleaning pipeline,
+    see plan_pipeline.
+
+    The columns only compared by drop_duplicates are replaced by the
+    columns of the fingerprint of their values in each raw file (see
+    fingerprinted_columns), which load_raw_data and iter_raw_data compute
+    while reading the files, so that these columns are not kept in
+    memory."""
+    steps = cleaning_steps(config)
+    columns = raw_columns(path, config)
+    needed = set(plan_pipeline(steps, columns)[0])
+    fingerprinted = set(fingerprinted_columns(steps, columns))
+    return sum([[col for col in file_columns
+                 if col in needed and col not in fingerprinted] +
+                (_fingerprint_cols(i)
+                 if fingerprinted.intersection(file_columns) else [])
+                for i, file_columns
+                in enumerate(_file_columns(path, config))], [])
+
+
+def _fingerprinted(path, config, columns):
+    """Return, for each raw file, its columns to replace by their
+    fingerprint when reading the given columns, see needed_columns."""
+    names = [_fingerprint_cols(i)[0] for i in range(3)]
+    if columns is None or not set(names).intersection(columns):
+        return [[], [], []]
+    fingerprinted = set(fingerprinted_columns(cleaning_steps(config),
+                                              raw_columns(path, config)))
+    return [[col for col in file_columns if col in fingerprinted]
+            if name in columns else []
+            for name, file_columns in zip(names,
+                                          _file_columns(path, config))]
+
+
+def _replace_by_fingerprint(data, fingerprinted, i):
+    """Replace columns of the data read from the i-th raw file by their
+    fingerprint."""
+    if not fingerprinted:
+        return data
+    hashes = fingerprint(data[fingerprinted])
+    hashes.columns = _fingerprint_cols(i)
+    return data.drop(columns=fingerprinted).join(hashes)
+
+
+def _selected(config, columns, fingerprinted):
+    """Return, for each raw file, a callable selecting the given columns
+    kept by the config and the columns to replace by their
+    fingerprint."""
+    return [lambda col, selector=selector, cols=set(cols):
+            selector(col) or col in cols
+            for selector, cols in zip(_column_selectors(config, columns),
+                                      fingerprinted)]
 
-    df1 = dfs[0].drop(columns=config['cleaning']['drop_cols_1'])
-    df2 = dfs[1][config['cleaning']['keep_cols']]
-    df3 = dfs[2].drop(columns=config['cleaning']['drop_cols_2'])
+
+def _kept(config, columns, data):
+    """Return the columns of the second raw file kept by the config, in
+    order, and the columns of their fingerprint, if any."""
+    return data[_keep_cols(config, columns) + [
+        col for col in _fingerprint_cols(1) if col in data.columns]]
+
+
+def load_raw_data(path, config, columns=None):
+    """Load the three raw files in parallel, reading only the columns kept
+    by the config, and among them the given columns if any (e.g. the
+    needed columns). Files converted with convert_raw_data are read
+    instead of the Excel files."""
+    filenames = [find_raw_file(path + filename)
+                 for filename in config['cleaning']['filenames']]
+    fingerprinted = _fingerprinted(path, config, columns)
+
+    def read_file(i, filename, selector):
+        return _replace_by_fingerprint(read_data(filename, selector),
+                                       fingerprinted[i], i)
+
+    with ThreadPoolExecutor(max_workers=len(filenames)) as executor:
+        dfs = list(executor.map(read_file, range(len(filenames)), filenames,
+                                _selected(config, columns, fingerprinted)))
+
+    df1 = dfs[0]
+    df2 = _kept(config, columns, dfs[1])
+    df3 = dfs[2]
 
     df = df1.join(df2).join(df3)
     return df
 
 
-def clean_data(config):
-    cleaning_pipeline = create_pipeline([
+def iter_raw_data(path, config, chunk_size, columns=None, start=0):
+    """Read the three raw files in aligned chunks of chunk_size rows from
+    row start on, reading the columns read by load_raw_data. The raw
+    files must have been converted with convert_raw_data."""
+    filenames = [find_raw_file(path + filename)
+                 for filename in config['cleaning']['filenames']]
+    fingerprinted = _fingerprinted(path, config, columns)
+    readers = [iter_data(filename, chunk_size, selector, start)
+               for filename, selector
+               in zip(filenames, _selected(config, columns, fingerprinted))]
+
+    for chunks in zip(*readers):
+        df1, df2, df3 = [_replace_by_fingerprint(chunk, cols, i)
+                         for i, (chunk, cols)
+                         in enumerate(zip(chunks, fingerprinted))]
+        yield df1.join(_kept(config, columns, df2)).join(df3)
+
+
+def estimate_chunk_size(path, config, memory_budget, columns=None,
+                        sample_size=1000):
+    """Return the number of rows of the chunks that can be cleaned within
+    a memory budget in MB, estimated from the size in memory of the first
+    rows of the raw data."""
+    sample = next(iter_raw_data(path, config, sample_size, columns), None)
+    if sample is None or sample.empty:
+        return sample_size
+    row_size = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(1, int(memory_budget * 1e6 / (CHUNK_OVERHEAD * row_size)))
+
+
+def convert_raw_data(path, config, file_format='parquet'):
+    """Convert the raw files to a columnar format ('parquet' or
+    'feather'), next to the original files, and return the new
+    filenames."""
+    filenames = []
+    for filename in config['cleaning']['filenames']:
+        filename = path + filename
+        new_filename = os.path.splitext(filename)[0] + '.' + file_format
+        write_data(read_data(filename), new_filename)
+        filenames.append(new_filename)
+    return filenames
+
+
+def cleaning_steps(config):
+    """Return the steps of the cleaning pipeline."""
+    return [
         rename_cols,
         drop_duplicates,
         drop_rows([1279, 4985, 9049]),
         clean_address,
-        impute_district,
+        impute_district(config['cleaning']['district_overrides']),
         drop_nans(config['cleaning']['subset']),
         clean_district,
         filter_rows('Prezzo', 'Prezzo su richiesta'),
@@ -54,26 +244,57 @@ def clean_data(config):
         create_property_type,
         create_house_type,
         create_year_bins,
-        create_heating,
-        create_heating_type,
-        create_heating_source,
-        create_air_conditioning,
+        extract_features(HEATING_SPEC),
         create_energy_efficiency,
         create_listing_date,
-        create_elevator,
-        create_disabled_access,
-        create_floor,
-        create_garage_parking,
-        create_external_parking,
-        create_num_bathrooms,
-        create_num_rooms,
-        create_parsed_features(string_parser),
-        create_windows,
-        create_garden,
-        create_furnished,
-        create_terrace,
-        create_exposure,
-        create_other_features,
-        drop_columns(config['cleaning']['drop_cols'])
-    ])
+        extract_features(LAYOUT_SPEC),
+        create_amenity_features,
+        drop_columns(config['cleaning']['drop_cols'] + sum(
+            [_fingerprint_cols(i) for i in range(3)], []))
+    ]
+
+
+def clean_data(config, profile=None, deferred=False, n_jobs=1,
+               statistics=None):
+    """Return the cleaning pipeline, planned for the columns of the data
+    it runs on, see plan_pipeline and create_pipeline."""
+    list_functions = cleaning_steps(config)
+
+    def cleaning_pipeline(data):
+        steps = plan_pipeline(list_functions, data.columns)[1]
+        return create_pipeline(steps, profile, deferred, n_jobs,
+                               statistics)(data)
+
     return cleaning_pipeline
+
+
+def clean_data_chunked(config, columns):
+    """Return the cleaning pipeline for data read in chunks with the
+    given columns, see iter_raw_data."""
+    return ChunkedPipeline(plan_pipeline(cleaning_steps(config), columns)[1])
+
+
+def clean_data_frozen(config, columns):
+    """Return the cleaning pipeline for new rows with the given columns,
+    e.g. raw listings to price, run with the statistics frozen on the
+    training data, see FrozenPipeline."""
+    return FrozenPipeline(plan_pipeline(cleaning_steps(config), columns)[1],
+                          columns)
+
+
+def save_cleaning(filename, config, pipeline):
+    """Save a fitted frozen cleaning pipeline with the cleaning config it
+    was created with, e.g. next to the model. The district overrides are
+    saved in the config instead of the path of their csv file, so that
+    the pipeline is loaded without it."""
+    cleaning = dict(config['cleaning'], district_overrides=read_overrides(
+        config['cleaning']['district_overrides']))
+    joblib.dump({'cleaning': cleaning, 'columns': pipeline.columns,
+                 'state': pipeline.get_state()}, filename)
+
+
+def load_cleaning(filename):
+    """Load a frozen cleaning pipeline saved with save_cleaning."""
+    saved = joblib.load(filename)
+    return clean_data_frozen({'cleaning': saved['cleaning']},
+                             saved['columns']).set_state(saved['state'])
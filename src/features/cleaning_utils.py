@@ -1,10 +1,21 @@
+from functools import partial
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yaml
+from pandas.api.types import infer_dtype
 from scipy import stats
+from .token_utils import TokenMatrix
+from .profiling_utils import step_name, profile_step
+from .parallel_utils import run_parallel
 
 rng = np.random.RandomState(0)
 
+# Number of rows of the row groups of the Parquet files written by
+# write_data, which bounds the rows read at once in chunks
+ROW_GROUP_SIZE = 10000
+
 
 def parse_config(config_file):
     """Parse the config file containing all the workflow parameters."""
@@ -13,17 +24,192 @@ def parse_config(config_file):
     return config
 
 
-def read_data(filename):
-    """Read data and store it in a DataFrame."""
-    return pd.read_excel(filename)
+def read_columns(filename):
+    """Return the names of the columns of a data file, see read_data,
+    reading only its header."""
+    if filename.endswith('.parquet'):
+        return pq.read_schema(filename).names
+    if filename.endswith('.feather'):
+        return pa.ipc.open_file(pa.memory_map(filename)).schema.names
+    if filename.endswith('.csv'):
+        return list(pd.read_csv(filename, nrows=0).columns)
+    return list(pd.read_excel(filename, nrows=0).columns)
+
+
+def read_data(filename, usecols=None):
+    """Read data and store it in a DataFrame. Parquet, Feather and csv
+    files are recognized by their extension, any other file is read as
+    an Excel file. If given, usecols is a callable selecting the columns
+    to read by name, so that columnar files only read those columns."""
+    if filename.endswith(('.parquet', '.feather')):
+        columns = None if usecols is None else [
+            name for name in read_columns(filename) if usecols(name)]
+        if filename.endswith('.parquet'):
+            return pd.read_parquet(filename, columns=columns)
+        return pd.read_feather(filename, columns=columns)
+    if filename.endswith('.csv'):
+        return pd.read_csv(filename, usecols=usecols)
+    return pd.read_excel(filename, usecols=usecols)
+
+
+def _rechunk(frames, chunk_size):
+    """Yield DataFrames of chunk_size rows, the last one possibly
+    smaller, from DataFrames of any size."""
+    buffer, n_rows = [], 0
+    for frame in frames:
+        buffer.append(frame)
+        n_rows += len(frame)
+        while n_rows >= chunk_size:
+            data = pd.concat(buffer, ignore_index=True)
+            yield data.iloc[:chunk_size]
+            buffer, n_rows = [data.iloc[chunk_size:]], n_rows - chunk_size
+    if n_rows:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def _read_from(read, sizes, start):
+    """Yield the parts of a file read one at a time, given their numbers
+    of rows, from row start on, without reading the parts before it."""
+    offset = 0
+    for i, size in enumerate(sizes):
+        if offset + size > start:
+            yield read(i).iloc[max(start - offset, 0):]
+        offset += size
+
+
+def iter_data(filename, chunk_size, usecols=None, start=0):
+    """Read a Parquet or Feather file in chunks of chunk_size rows from
+    row start on, see read_data. Parquet files are read one row group at
+    a time and Feather files one record batch at a time. Raise a
+    ValueError for other files, whose types could differ from chunk to
+    chunk."""
+    if filename.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(filename)
+        names = parquet_file.schema_arrow.names
+        columns = None if usecols is None else [name for name in names
+                                                if usecols(name)]
+        sizes = [parquet_file.metadata.row_group(i).num_rows
+                 for i in range(parquet_file.num_row_groups)]
+        frames = _read_from(lambda i: parquet_file.read_row_group(
+            i, columns=columns).to_pandas(), sizes, start)
+    elif filename.endswith('.feather'):
+        reader = pa.ipc.open_file(pa.memory_map(filename))
+        names = reader.schema.names
+        columns = names if usecols is None else [name for name in names
+                                                 if usecols(name)]
+        sizes = [reader.get_batch(i).num_rows
+                 for i in range(reader.num_record_batches)]
+        frames = _read_from(lambda i: reader.get_batch(i).to_pandas()[columns],
+                            sizes, start)
+    else:
+        raise ValueError('Cannot read {} in chunks, convert it to Parquet '
+                         'or Feather first'.format(filename))
+    return _rechunk(frames, chunk_size)
+
+
+def write_data(data, filename):
+    """Write a DataFrame to a Parquet or Feather file, depending on the
+    extension of the filename.
+
+    Object columns mixing strings with other values, as Excel often
+    produces, are stored as strings."""
+    data = data.reset_index(drop=True)
+    for col in data.columns:
+        if infer_dtype(data[col], skipna=True).startswith('mixed'):
+            data[col] = data[col].where(data[col].isna(),
+                                        data[col].astype(str))
+    if filename.endswith('.feather'):
+        data.to_feather(filename)
+    else:
+        data.to_parquet(filename, index=False, row_group_size=ROW_GROUP_SIZE)
+
+
+def row_local(function):
+    """Mark a cleaning step as row-local: the values it computes for a
+    row only depend on that row, so deferred pipelines can run it on
+    rows that are yet to be filtered out and parallel pipelines on
+    partitions of the data. Filters are row-local if whether they keep
+    a row only depends on that row."""
+    function.row_local = True
+    return function
+
+
+def reads(columns):
+    """Declare the columns read by a cleaning step, so that planned
+    pipelines only read the columns they use (see plan_pipeline) and
+    chunked pipelines only keep the columns read by global steps. None
+    stands for whole rows, i.e. all the columns loaded before the step,
+    which chunked pipelines reduce to a fingerprint of each row."""
+
+    def decorator(function):
+        function.reads = columns
+        return function
+
+    return decorator
+
+
+def writes(columns):
+    """Declare the columns created or overwritten by a cleaning step, see
+    reads. Steps that only declare the columns they read write none."""
+
+    def decorator(function):
+        function.writes = columns
+        return function
+
+    return decorator
+
+
+def freezable(fit, freeze):
+    """Declare how a global cleaning step freezes the statistics it
+    computes on the data it runs on, so that frozen pipelines (see
+    FrozenPipeline) run it on new rows with the statistics of the
+    training data. fit takes the DataFrame the step runs on and returns
+    the statistics, which must be picklable, and freeze takes them and
+    returns the equivalent row-local step."""
+
+    def decorator(function):
+        function.fit = fit
+        function.freeze = freeze
+        return function
+
+    return decorator
+
+
+def row_filter(mask, reset_index=False):
+    """Create a cleaning step keeping the rows of a DataFrame selected by
+    a mask function, and optionally resetting the index.
+
+    The mask function takes the DataFrame and the boolean mask of the
+    rows still kept by a deferred pipeline (None if all of them are) and
+    returns a boolean mask of the rows to keep. It is the mask attribute
+    of the step, so that deferred pipelines can combine it with the
+    other filters instead of copying the data."""
+
+    def filterer(data):
+        data = data.loc[mask(data, None)]
+        if reset_index:
+            data = data.reset_index(drop=True)
+        return data
+
+    filterer.__qualname__ = mask.__qualname__
+    filterer.mask = mask
+    filterer.reset_index = reset_index
+    return filterer
+
+
+def _visible(data, keep):
+    """Return the rows of a DataFrame kept by a deferred mask."""
+    return data if keep is None else data.loc[keep]
 
 
 def drop_columns(cols):
     """Drop columns in a DataFrame."""
 
+    @row_local
     def dropper(data):
         return data.drop(columns=cols)
 
+    dropper.drops = cols
     return dropper
 
 
@@ -31,41 +217,63 @@ def drop_nans(subset):
     """Drop rows of a DataFrame with NaN values in a given column and
     reset the index."""
 
-    def dropper(data):
-        return data.dropna(subset=subset).reset_index(drop=True)
+    def mask(data, keep):
+        return data[subset].notna().all(axis=1).values
 
-    return dropper
+    return row_local(reads(subset)(row_filter(mask, reset_index=True)))
 
 
+@row_local
 def rename_cols(data):
     """Rename columns of a DataFrame by capitalizing them."""
-    return data.rename(columns=str.capitalize)
+    return data.rename(columns=rename_cols.renames)
 
 
-def drop_duplicates(data):
-    """Drop duplicate rows in a DataFrame."""
-    return data.drop_duplicates()
+rename_cols.renames = str.capitalize
+
+
+def _drop_duplicates(data, keep):
+    """Mask of the first occurrence of each row kept by a deferred
+    mask."""
+    if keep is None:
+        return ~data.duplicated().values
+    unique = np.zeros(len(data), dtype=bool)
+    unique[keep] = ~_visible(data, keep).duplicated().values
+    return unique
+
+
+# Drop duplicate rows in a DataFrame
+drop_duplicates = reads(None)(row_filter(_drop_duplicates))
 
 
 def drop_rows(rows):
     """Drop rows in a DataFrame and reset the index."""
 
-    def dropper(data):
-        return data.drop(rows).reset_index(drop=True)
+    def mask(data, keep):
+        dropped = data.index.isin(rows)
+        if keep is not None:
+            dropped &= keep
+        missing = set(rows) - set(data.index[dropped])
+        if missing:
+            raise KeyError('{} not found in axis'.format(sorted(missing)))
+        return ~dropped
 
-    return dropper
+    return reads([])(row_filter(mask, reset_index=True))
 
 
 def filter_rows(col, value):
     """Filter DataFrame by removing rows with unwanted values for a
     given column."""
 
-    def filterer(data):
-        return data.loc[data[col] != value]
+    def mask(data, keep):
+        return (data[col] != value).values
 
-    return filterer
+    return row_local(reads([col])(row_filter(mask)))
 
 
+@row_local
+@reads(['Indirizzo'])
+@writes(['Indirizzo'])
 def clean_address(data):
     """Clean the address feature."""
     data['Indirizzo'] = data['Indirizzo'].str.replace('[', '').str.replace(
@@ -73,69 +281,34 @@ def clean_address(data):
     return data
 
 
-def impute_district(data):
-    """Manually impute values for the district feature."""
-    data.loc[data['Indirizzo'] == 'Firenze, via vittorio emanuele orlando',
-             'Zona'] = 'Coverciano Bellariva'
-    data.loc[data['Indirizzo'] == 'Firenze, via borgo la noce', 'Zona'] = \
-        'Centro'
-    data.loc[data['Indirizzo'] == 'Firenze,'
-                                  'via Cigoli 31', 'Zona'] = 'L\'Isolotto'
-    data.loc[data['Indirizzo'] == 'Firenze, via impruneta per mezzomonte',
-             'Zona'] = 'Bellosguardo Galluzzo'
-    data.loc[data['Indirizzo'] == 'Firenze, via gioberti', 'Zona'] = 'Campo ' \
-                                                                     'Di ' \
-                                                                     'Marte ' \
-                                                                     'Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, via dei cioli 50', 'Zona'] = \
-        'Settignano Rovezzano'
-    data.loc[data['Indirizzo'] == 'Firenze, via spinucci 1', 'Zona'] = \
-        'Serpiolle Careggi'
-    data.loc[data['Indirizzo'] == 'Firenze, "via lungo laffrico 50"', 'Zona']\
-        = 'Coverciano Bellariva'
-    data.loc[data['Indirizzo'] == 'Firenze, via lippi', 'Zona'] = 'Legnaia ' \
-                                                                  'Soffiano'
-    data.loc[data['Indirizzo'] == 'Firenze, cairoli', 'Zona'] = 'Campo Di ' \
-                                                                'Marte Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, via aretina', 'Zona'] = \
-        'Coverciano Bellariva'
-    data.loc[data['Indirizzo'] == 'Firenze, via Fra Bartolommeo  40', 'Zona']\
-        = 'Campo Di Marte Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, viale don minzoni 1', 'Zona'] = \
-        'Campo Di Marte Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, viale don minzoni  1', 'Zona'] = \
-        'Campo Di Marte Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, piazza beccaria', 'Zona'] = \
-        'Campo Di Marte Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, via san zanobi', 'Zona'] = 'Centro'
-    data.loc[data['Indirizzo'] == 'Firenze, Piazzale Michelangelo', 'Zona'] = \
-        'Michelangelo Porta Romana'
-    data.loc[data['Indirizzo'] == 'Firenze, Via del Paradiso', 'Zona'] = \
-        'Zona Firenze Sud'
-    data.loc[data['Indirizzo'] == 'Firenze, via di Canonica', 'Zona'] = \
-        'Centro'
-    data.loc[data['Indirizzo'] == 'Firenze, Via di Canonica', 'Zona'] = \
-        'Centro'
-    data.loc[data['Indirizzo'] == 'Firenze, Via Frusa', 'Zona'] = 'Campo Di ' \
-                                                                  'Marte ' \
-                                                                  'Liberta'
-    data.loc[data['Indirizzo'] == 'Firenze, Via Vespucci', 'Zona'] = \
-        'Firenze Nord'
-    data.loc[data['Indirizzo'] == 'Firenze, via baracca  148', 'Zona'] = \
-        'Firenze Nord'
-    data.loc[data['Indirizzo'] == 'Firenze, via dei Tavolini 1', 'Zona'] = \
-        'Centro'
-    data.loc[data['Indirizzo'] == 'Firenze, via Pisana 980', 'Zona'] = \
-        'Ugnano Mantignano'
-    data.loc[data['Indirizzo'] == 'Firenze, VIA SENESE', 'Zona'] = \
-        'Bellosguardo Galluzzo'
-    data.loc[data['Indirizzo'] == 'Firenze, "piazza dAzeglio"', 'Zona'] = \
-        'Centro'
-    data.loc[data['Indirizzo'] == 'Firenze, "Piazza dazeglio"', 'Zona'] = \
-        'Centro'
-    return data
+def read_overrides(filename):
+    """Read a csv file of address/district overrides into a dictionary.
+    Later rows take precedence over earlier ones for the same address."""
+    overrides = pd.read_csv(filename, dtype=str, keep_default_na=False)
+    return dict(zip(overrides['indirizzo'], overrides['zona']))
+
 
+def impute_district(overrides):
+    """Impute the district of the addresses listed in a csv file of
+    overrides, or in a dictionary of them (see read_overrides), with a
+    single lookup of the cleaned addresses."""
+    if not isinstance(overrides, dict):
+        overrides = read_overrides(overrides)
+
+    @row_local
+    @reads(['Indirizzo', 'Zona'])
+    @writes(['Zona'])
+    def imputer(data):
+        districts = data['Indirizzo'].map(overrides)
+        data['Zona'] = districts.where(districts.notna(), data['Zona'])
+        return data
 
+    return imputer
+
+
+@row_local
+@reads(['Zona'])
+@writes(['Zona'])
 def clean_district(data):
     """Clean the district feature."""
     data['Zona'] = (data['Zona']
@@ -146,6 +319,9 @@ def clean_district(data):
     return data
 
 
+@row_local
+@reads(['Prezzo'])
+@writes(['Prezzo'])
 def clean_price(data):
     """Clean the price feature."""
     data['Prezzo'] = (data['Prezzo']
@@ -156,6 +332,9 @@ def clean_price(data):
     return data
 
 
+@row_local
+@reads(['Superficie'])
+@writes(['Superficie'])
 def clean_sqm(data):
     """Clean the square meters feature."""
     mask = data['Superficie'].str.contains(r'\|', na=False)
@@ -172,6 +351,9 @@ def clean_sqm(data):
     return data
 
 
+@row_local
+@reads(['Stato'])
+@writes(['Stato'])
 def clean_condition(data):
     """Clean the condition feature."""
     data['Stato'] = data['Stato'].str.replace(' / ', '/').str.lower()
@@ -181,6 +363,9 @@ def clean_condition(data):
 def clean_outliers(col, current_value, new_value):
     """Replace outlier values by new values."""
 
+    @row_local
+    @reads([col])
+    @writes([col])
     def cleaner(data):
         data.loc[data[col] == current_value, col] = new_value
         return data
@@ -192,45 +377,83 @@ def remove_outliers_iqr(cols, bounds=[.25, .75], k=1.5):
     """Remove all rows from a DataFrame that contain outliers based on
     the iqr of a set of columns."""
 
-    def remover(data):
-        q = data[cols].quantile(bounds)
-        iqr = q.iloc[1] - q.iloc[0]
-        mask = (data[cols] >= q.iloc[0] - k * iqr) & (data[cols] <= q.iloc[1]
-                                                      + k * iqr)
-        data = data[mask.all(axis=1)]
-        return data
+    def fit(data, keep=None):
+        # Column by column, as selecting several columns consolidates
+        # the whole DataFrame
+        limits = {}
+        for col in cols:
+            q = _visible(data[col], keep).quantile(bounds)
+            iqr = q.iloc[1] - q.iloc[0]
+            limits[col] = (q.iloc[0] - k * iqr, q.iloc[1] + k * iqr)
+        return limits
 
-    return remover
+    def inliers(data, limits):
+        mask = np.ones(len(data), dtype=bool)
+        for col, (low, high) in limits.items():
+            mask &= ((data[col] >= low) & (data[col] <= high)).values
+        return mask
+
+    def mask(data, keep):
+        return inliers(data, fit(data, keep))
+
+    def freeze(limits):
+        def mask(data, keep):
+            return inliers(data, limits)
+
+        return row_local(reads(cols)(row_filter(mask)))
+
+    return freezable(fit, freeze)(reads(cols)(row_filter(mask)))
 
 
 def remove_outliers_zscore(cols, z=3):
     """Remove all rows from a DataFrame that contain outliers based on
     the z-score of the variables."""
 
-    def remover(data):
-        data = data.loc[(np.abs(stats.zscore(np.log(data[cols]))) < z).all(
-            axis=1)]
-        return data
+    def mask(data, keep):
+        inliers = np.asarray((np.abs(stats.zscore(np.log(
+            _visible(data[cols], keep)))) < z).all(axis=1))
+        if keep is None:
+            return inliers
+        mask = np.zeros(len(data), dtype=bool)
+        mask[keep] = inliers
+        return mask
+
+    def fit(data):
+        logs = np.log(data[cols])
+        return logs.mean(), logs.std(ddof=0)
+
+    def freeze(moments):
+        def mask(data, keep):
+            mean, std = moments
+            return np.asarray((np.abs((np.log(data[cols]) - mean) / std)
+                               < z).all(axis=1))
 
-    return remover
+        return row_local(reads(cols)(row_filter(mask)))
+
+    return freezable(fit, freeze)(reads(cols)(row_filter(mask)))
 
 
 def filter_data(col, min_value, max_value):
     """Filter DataFrame by min and max value for a specific column."""
 
-    def filter(data):
-        data = data.loc[(data[col] > min_value) & (data[col] < max_value)]
-        return data
+    def mask(data, keep):
+        return ((data[col] > min_value) & (data[col] < max_value)).values
 
-    return filter
+    return row_local(reads([col])(row_filter(mask)))
 
 
+@row_local
+@reads(['Prezzo', 'Superficie'])
+@writes(['Prezzo_per_m2'])
 def create_price_sqm(data):
     """Create price per square meter feature."""
     data['Prezzo_per_m2'] = data['Prezzo'] / data['Superficie']
     return data
 
 
+@row_local
+@reads(['Tipo proprietà'])
+@writes(['Classe_immobile'])
 def create_property_class(data):
     """Create property type feature."""
     data['Classe_immobile'] = (data['Tipo proprietà']
@@ -240,6 +463,9 @@ def create_property_class(data):
     return data
 
 
+@row_local
+@reads(['Tipo proprietà', 'Contratto'])
+@writes(['Tipo_proprietà'])
 def create_property_type(data):
     """Create whole/naked property feature."""
     data['Tipo_proprietà'] = (data['Tipo proprietà']
@@ -259,8 +485,9 @@ def create_property_type(data):
     return data
 
 
-def create_house_type(data):
-    """Create house type feature."""
+def _house_type(data, others_list):
+    """Create house type feature, with the given house types set to
+    "other"."""
     data['Tipologia_casa'] = (data['Tipologia']
                               .str.lower()
                               .replace({'appartamento in'
@@ -274,16 +501,43 @@ def create_house_type(data):
                                         'villa a schiera': 'villa '
                                                            'unifamiliare'}))
 
-    # Value_counts lower than or equal to 15 set to "other"
-    others_list = (data['Tipologia']
-                   .value_counts()
-                   .loc[data['Tipologia'].value_counts() < 15].index.values)
+    # Rare house types set to "other"
     mask = data['Tipologia'].isin(others_list)
 
     data['Tipologia_casa'] = data['Tipologia_casa'].mask(mask, 'altro')
     return data
 
 
+def _rare_house_types(data):
+    """Return the house types with fewer than 15 rows."""
+    counts = data['Tipologia'].value_counts()
+    return counts.index[counts < 15].tolist()
+
+
+def _freeze_house_type(others_list):
+    """Create house type feature, with the house types that were rare in
+    the training data set to "other"."""
+
+    @row_local
+    @reads(['Tipologia'])
+    @writes(['Tipologia_casa'])
+    def create_house_type(data):
+        return _house_type(data, others_list)
+
+    return create_house_type
+
+
+@freezable(_rare_house_types, _freeze_house_type)
+@reads(['Tipologia'])
+@writes(['Tipologia_casa'])
+def create_house_type(data):
+    """Create house type feature."""
+    return _house_type(data, _rare_house_types(data))
+
+
+@row_local
+@reads(['Anno di costruzione'])
+@writes(['Anno_costruzione_bins'])
 def create_year_bins(data):
     """Create binned feature of year of construction."""
     data['Anno_costruzione_bins'] = (pd.cut(data['Anno di costruzione'],
@@ -291,42 +545,53 @@ def create_year_bins(data):
     return data
 
 
-def create_heating(data):
-    """Create centralized/autonomous heating feature."""
-    data['Riscaldamento_A_C'] = (data['Riscaldamento']
-                                 .str.lower()
-                                 .str.extract('(centralizzato|autonomo)')
-                                 .fillna('centralizzato'))
-    return data
+def _heating(matches, data):
+    """Centralized/autonomous heating feature."""
+    return matches['heating'].str.lower().fillna('centralizzato')
 
 
-def create_heating_type(data):
-    """Create heating type feature."""
-    data['Tipo_riscaldamento'] = (data['Riscaldamento']
-                                  .str
-                                  .extract('(radiatori|aria|pavimento|stufa)'))
-    return data
+def _heating_type(matches, data):
+    """Heating type feature."""
+    return matches['heating_type']
 
 
-def create_heating_source(data):
-    """Create heating source feature."""
-    data['Alimentazione_riscaldamento'] = (data['Riscaldamento'].str.extract(
-        '(metano|gas|gasolio|pompa di calore'
-        '|elettrica|fotovoltaico|pellet|gpl|solare)'))
-    return data
+def _heating_source(matches, data):
+    """Heating source feature."""
+    return matches['heating_source']
 
 
-def create_air_conditioning(data):
-    """Create air conditioning feature by extracting relevant
-    information."""
-    data['Climatizzazione'] = (data['Climatizzazione']
-                               .str.lower()
-                               .str.extract('(predisposizione|autonomo|'
-                                            'centralizzato)')
-                               .fillna('non presente'))
-    return data
+def _air_conditioning(matches, data):
+    """Air conditioning feature."""
+    return matches['air_conditioning'].str.lower().fillna('non presente')
 
 
+# Features extracted from the heating and air conditioning columns.
+# (?i:...) patterns match regardless of case and are lower-cased.
+HEATING_SPEC = {
+    'patterns': {
+        'Riscaldamento': {
+            'heating': r'(?i:centralizzato|autonomo)',
+            'heating_type': r'radiatori|aria|pavimento|stufa',
+            'heating_source': r'metano|gas|gasolio|pompa di calore'
+                              r'|elettrica|fotovoltaico|pellet|gpl|solare',
+        },
+        'Climatizzazione': {
+            'air_conditioning': r'(?i:predisposizione|autonomo'
+                                r'|centralizzato)',
+        },
+    },
+    'features': {
+        'Riscaldamento_A_C': _heating,
+        'Tipo_riscaldamento': _heating_type,
+        'Alimentazione_riscaldamento': _heating_source,
+        'Climatizzazione': _air_conditioning,
+    },
+}
+
+
+@row_local
+@reads(['Efficienza energetica'])
+@writes(['Efficienza_energetica'])
 def create_energy_efficiency(data):
     """Create energy efficiency feature by grouping the energy classes
     into three groups."""
@@ -338,11 +603,15 @@ def create_energy_efficiency(data):
     choices = ['alta (A, A+, A1-A4)', 'media (B, C, D)', 'bassa (E, F, G)']
 
     data['Efficienza_energetica'] = (pd.Series(np.select(conditions, choices,
-                                                         np.nan))
+                                                         np.nan),
+                                               index=data.index)
                                      .replace({'nan': np.nan}))
     return data
 
 
+@row_local
+@reads(['Riferimento e data annuncio'])
+@writes(['Data_annuncio'])
 def create_listing_date(data):
     """Create listing date feature."""
     data['Data_annuncio'] = (data['Riferimento e data annuncio']
@@ -353,189 +622,217 @@ def create_listing_date(data):
     return data
 
 
-def create_elevator(data):
-    """Create elevator feature."""
-    mask = data['Piano'].str.contains('ascensore', na=False)
-    data['Ascensore'] = np.where(mask, 'sì', 'no')
-    return data
-
-
-def create_disabled_access(data):
-    """Create disabled access feature."""
-    mask = data['Piano'].str.contains('accesso disabili', na=False)
-    data['Accesso_disabili'] = np.where(mask, 'sì', 'no')
-    return data
-
-
-def create_floor(data):
-    """Create floor feature."""
-    mask1 = data['Piano'].str.lower().str.contains(r'\d+°|oltre il decimo '
-                                                   r'piano|su più livelli',
-                                                   na=False)
-    mask2 = data['Piano'].str.lower().str.contains('seminterrato|interrato|'
-                                                   'ammezzato', na=False)
-    mask3 = data['Piano'].str.lower().str.contains('terra|piano rialzato',
-                                                   na=False)
-    mask4 = data['Piano'].str.lower().str.contains('ultimo', na=False)
-    mask5 = (data['Totale piani edificio'].str.extract(r'(\d+)',
-                                                       expand=False) ==
-             data['Piano'].str.extract(r'(\d+)', expand=False))
-
-    data['Piano'] = (data['Piano']
-                     .mask(mask1, 'intermedio')
-                     .mask(mask2, 'interrato')
-                     .mask(mask3, 'terra')
-                     .mask(mask4 | mask5, 'ultimo'))
-    return data
-
-
-def create_garage_parking(data):
-    """Create garage parking feature."""
-    data['Posti_garage'] = (data['Posti auto']
-                            .str.extract(r'(\d).*garage\/box')
-                            .astype('float')
-                            .fillna(0))
-    return data
-
-
-def create_external_parking(data):
-    """Create external parking feature."""
-    data['Posti_esterni'] = (data['Posti auto']
-                             .str.extract(r'(\d+).*esterno')
-                             .astype('float')
-                             .fillna(0))
-    return data
-
-
-def create_num_bathrooms(data):
-    """Create number of bathrooms feature."""
-    data['Num_bagni'] = data['Locali'].str.extract(r'(\d\+?) bagn\w')
-    # Set 3+ toilets to 4
-    data['Num_bagni'] = data['Num_bagni'].mask(data['Num_bagni'] == '3+', 4)
-    return data
-
-
-def create_num_rooms(data):
-    """Create number of rooms feature."""
-    # All types of rooms
-    data['Num_altri'] = (data['Locali']
-                         .str.extract(r'(\d+\+?) altr\w')
-                         .astype('float64')
-                         .fillna(0))
-    data['Num_camere_letto'] = (data['Locali']
-                                .str.extract(r'(\d+\+?) camer\w da letto')
-                                .astype('float64')
-                                .fillna(0))
-    data['Num_locali'] = (data['Locali']
-                          .str.extract(r'(\d+\+?) local\w')
-                          .astype('float64').fillna(0))
-
-    # Total number of rooms
-    data['Num_tot_locali'] = ((data['Num_altri'] + data['Num_camere_letto'] +
-                               data['Num_locali'])
-                              .mask(data['Locali'].isna(), np.nan))
-    return data
-
-
-def string_parser(row):
-    """Parse string values in other features column to extract all the
-    features and store them in a list."""
-    if pd.notnull(row['Altre caratteristiche']):
-        string_list = row['Altre caratteristiche'].split('\n')
-        row['Altre_caratteristiche'] = ([string.strip().replace(' ', '_')
-                                         for string in string_list if
-                                         string.strip() != ''])
-    else:
-        row['Altre_caratteristiche'] = []
-    return row['Altre_caratteristiche']
-
-
-def create_parsed_features(parser):
-    """Create feature from parsed attributes."""
-
-    def creator(data):
-        data['Altre_caratteristiche'] = data['Altre caratteristiche'].copy()
-        data['Altre_caratteristiche'] = data.apply(parser, axis=1)
-        return data
-
-    return creator
-
-
-def create_windows(data):
-    """Create windows feature."""
-    data['Infissi'] = (data['Altre_caratteristiche']
-                       .apply(lambda x: str([y for y in x if 'Infissi' in y]))
-                       .str.extract('(doppio|triplo)', expand=False)
-                       .fillna('singolo'))
-    return data
-
-
-def create_garden(data):
-    """Create garden feature."""
-    data['Giardino'] = (data['Altre_caratteristiche']
-                        .apply(lambda x: str([y for y in x if 'Giardino' in
-                                              y]))
-                        .str.extract('(comune|privato)', expand=False)
-                        .fillna('non presente'))
-    return data
-
-
-def create_furnished(data):
-    """Create furnished feature."""
-    data['Arredato'] = (data['Altre_caratteristiche']
-                        .apply(lambda x: str([y for y in x if 'Arredat' in
-                                              y])))
-    data['Arredato'] = (data['Arredato']
+def _yes_no(name, matches, data):
+    """Yes/no feature telling whether a pattern matched."""
+    return np.where(matches[name].notna(), 'sì', 'no')
+
+
+def _floor(matches, data):
+    """Floor feature: floors not recognized keep their value."""
+    top_floor = matches['total_floors'] == matches['floor_number']
+    return (data['Piano']
+            .mask(matches['intermediate'].notna(), 'intermedio')
+            .mask(matches['basement'].notna(), 'interrato')
+            .mask(matches['ground'].notna(), 'terra')
+            .mask(matches['top'].notna() | top_floor, 'ultimo'))
+
+
+def _count(name, matches, data):
+    """Number of parking spaces or rooms, 0 if not given."""
+    return matches[name].astype('float64').fillna(0)
+
+
+def _num_bathrooms(matches, data):
+    """Number of bathrooms feature, with 3+ bathrooms set to 4."""
+    return matches['bathrooms'].mask(matches['bathrooms'] == '3+', 4)
+
+
+def _num_rooms(matches, data):
+    """Total number of rooms feature."""
+    return ((data['Num_altri'] + data['Num_camere_letto'] +
+             data['Num_locali'])
+            .mask(data['Locali'].isna(), np.nan))
+
+
+# Features extracted from the floor, parking and rooms columns
+LAYOUT_SPEC = {
+    'patterns': {
+        'Piano': {
+            'elevator': r'ascensore',
+            'disabled_access': r'accesso disabili',
+            'intermediate': r'(?i:\d+°|oltre il decimo piano|su più livelli)',
+            'basement': r'(?i:seminterrato|interrato|ammezzato)',
+            'ground': r'(?i:terra|piano rialzato)',
+            'top': r'(?i:ultimo)',
+            'floor_number': r'\d+',
+        },
+        'Totale piani edificio': {
+            'total_floors': r'\d+',
+        },
+        'Posti auto': {
+            'garage_parking': r'(\d).*garage\/box',
+            'external_parking': r'(\d+).*esterno',
+        },
+        'Locali': {
+            'bathrooms': r'(\d\+?) bagn\w',
+            'other_rooms': r'(\d+\+?) altr\w',
+            'bedrooms': r'(\d+\+?) camer\w da letto',
+            'rooms': r'(\d+\+?) local\w',
+        },
+    },
+    'features': {
+        'Ascensore': partial(_yes_no, 'elevator'),
+        'Accesso_disabili': partial(_yes_no, 'disabled_access'),
+        'Piano': _floor,
+        'Posti_garage': partial(_count, 'garage_parking'),
+        'Posti_esterni': partial(_count, 'external_parking'),
+        'Num_bagni': _num_bathrooms,
+        'Num_altri': partial(_count, 'other_rooms'),
+        'Num_camere_letto': partial(_count, 'bedrooms'),
+        'Num_locali': partial(_count, 'rooms'),
+        'Num_tot_locali': _num_rooms,
+    },
+}
+
+
+# Amenities extracted as yes/no features from the other features column
+AMENITIES = ['Fibra_ottica', 'Cancello_elettrico', 'Cantina',
+             'Impianto_di_allarme', 'Mansarda', 'Taverna', 'Cablato',
+             'Idromassaggio', 'Piscina']
+
+
+@row_local
+@reads(['Altre caratteristiche'])
+@writes(['Infissi', 'Giardino', 'Arredato', 'Terrazza', 'Esposizione']
+        + AMENITIES)
+def create_amenity_features(data):
+    """Create the windows, garden, furnished, terrace, exposure and
+    amenity features from the other features column, which is parsed
+    only once into a token matrix."""
+    tokens = TokenMatrix(data['Altre caratteristiche'])
+
+    data['Infissi'] = (tokens.first_match('Infissi', '(doppio|triplo)')
+                       .fillna('singolo')
+                       .values)
+    data['Giardino'] = (tokens.first_match('Giardino', '(comune|privato)')
+                        .fillna('non presente')
+                        .values)
+    data['Arredato'] = (tokens.containing('Arredat')
                         .replace({'[\'Parzialmente_'
                                   'Arredato\']': 'parzialmente',
                                   '[\'Solo_Cucina_Arredata\']': 'parzialmente',
                                   '[\'Arredato\']': 'totalmente',
-                                  '[]': 'no'}))
-    return data
-
-
-def create_terrace(data):
-    """Create terrace features."""
-    data['Terrazza'] = (data['Altre_caratteristiche']
-                        .apply(lambda x: str([y for y in x if 'Terrazza' in y
-                                              or 'Balcone' in y])))
-    data.loc[~(data['Terrazza'] == '[]'), 'Terrazza'] = 'sì'
-    data.loc[data['Terrazza'] == '[]', 'Terrazza'] = 'no'
+                                  '[]': 'no'})
+                        .values)
+    data['Terrazza'] = np.where(tokens.has_any('Terrazza', 'Balcone'), 'sì',
+                                'no')
+    data['Esposizione'] = (tokens.first_match('Esposizione',
+                                              '(doppia|esterna|interna)')
+                           .fillna('esterna')
+                           .values)
+
+    # Create column for each amenity
+    for feature in AMENITIES:
+        data[feature] = np.where(tokens.has(feature), 'sì', 'no')
     return data
 
 
-def create_exposure(data):
-    """Create exposure feature."""
-    data['Esposizione'] = (data['Altre_caratteristiche']
-                           .apply(lambda x: str([y for y in x if
-                                                 'Esposizione' in y]))
-                           .str.extract('(doppia|esterna|interna)',
-                                        expand=False)
-                           .fillna('esterna'))
-    return data
-
-
-def create_other_features(data):
-    """Create columns for each other feature extracted."""
-    # Features list
-    features_list = ['Fibra_ottica', 'Cancello_elettrico', 'Cantina',
-                     'Impianto_di_allarme', 'Mansarda', 'Taverna',
-                     'Cablato', 'Idromassaggio', 'Piscina']
+def _deferred_index(keep):
+    """Return the index of a DataFrame with deferred filters after it is
+    reset: the kept rows are numbered in order and the others have
+    negative labels."""
+    index = -1 - np.arange(len(keep))
+    index[keep] = np.arange(keep.sum())
+    return index
+
+
+def _run_deferred(list_functions, data, run):
+    """Run pipeline steps with deferred row filters, see
+    create_pipeline."""
+    keep = None
+
+    def defer(function):
+        def deferred_filter(data):
+            nonlocal keep
+            mask = function.mask(data, keep)
+            keep = mask if keep is None else keep & mask
+            if function.reset_index:
+                data.index = _deferred_index(keep)
+            return data
+
+        return deferred_filter
+
+    def apply_mask(data):
+        nonlocal keep
+        if not keep.all():
+            data = data.loc[keep]
+        keep = None
+        return data
 
-    # Create column for each extracted feature
-    for feature in features_list:
-        mask = data['Altre_caratteristiche'].apply(lambda x: feature in x)
-        data[feature] = np.where(mask, 'sì', 'no')
+    for function in list_functions:
+        if hasattr(function, 'mask'):
+            data = run(defer(function), data, step_name(function))
+            continue
+        if keep is not None and not getattr(function, 'row_local', False):
+            data = run(apply_mask, data, 'apply_mask')
+        data = run(function, data)
+    if keep is not None:
+        data = run(apply_mask, data, 'apply_mask')
     return data
 
 
-def create_pipeline(list_functions):
-    """Pipeline function for data cleaning steps."""
+def _fitting(function, statistics, i):
+    """Return a step running a freezable step with the statistics it
+    computes on the data it runs on, which are stored in statistics
+    under the position i of the step."""
+
+    def fitting(data):
+        statistics[i] = function.fit(data)
+        return function.freeze(statistics[i])(data)
+
+    fitting.__qualname__ = function.__qualname__
+    return fitting
+
+
+def create_pipeline(list_functions, profile=None, deferred=False,
+                    n_jobs=1, statistics=None):
+    """Pipeline function for data cleaning steps. If a list is given as
+    profile, every step is profiled and its record is appended to it.
+    If a dictionary is given as statistics, the statistics of the steps
+    that freeze them (see freezable) are stored in it by position of the
+    step, as FrozenPipeline.fit does.
+
+    If deferred, the pipeline takes ownership of the data, which steps
+    may modify in place, and row filters are not applied one by one:
+    their masks are combined into a single mask, which is applied only
+    when a step that is not row-local needs the remaining rows, and at
+    the end. The output is the same as without deferring.
+
+    If n_jobs is greater than 1, consecutive row-local steps run on
+    partitions of the data in n_jobs processes, and the other steps on
+    the whole data. The output is the same as with a single process."""
+    if deferred and n_jobs > 1:
+        raise ValueError('Deferred pipelines run in a single process')
+    if statistics is not None:
+        list_functions = [_fitting(function, statistics, i)
+                          if hasattr(function, 'fit') else function
+                          for i, function in enumerate(list_functions)]
+
+    def run(function, data, name=None):
+        if profile is None:
+            return function(data)
+        out, record = profile_step(function, data, name)
+        profile.append(record)
+        return out
 
     def pipeline(data):
+        if deferred:
+            return _run_deferred(list_functions, data, run)
+        if n_jobs > 1:
+            return run_parallel(list_functions, data, run, n_jobs)
         out = data
         for function in list_functions:
-            out = function(out)
+            out = run(function, out)
         return out
 
     return pipeline
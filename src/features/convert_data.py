@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import click
+import logging
+from pathlib import Path
+from dotenv import find_dotenv, load_dotenv
+from src.features import parse_config, convert_raw_data
+
+
+@click.command()
+@click.argument('input_filepath', type=click.Path(exists=True))
+@click.argument('config_file', type=str, default='config.yml')
+@click.option('--format', 'file_format', default='parquet',
+              type=click.Choice(['parquet', 'feather']),
+              help='Columnar format of the converted files.')
+def main(input_filepath, config_file, file_format):
+    """ Converts the collected data once to a columnar format, which is
+    then loaded instead of the Excel files."""
+    logger = logging.getLogger(__name__)
+    logger.info('Converting collected data to {}.'.format(file_format))
+
+    # Parse config file
+    config = parse_config(config_file)
+
+    for filename in convert_raw_data(input_filepath, config, file_format):
+        logger.info('Wrote {}'.format(filename))
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    # not used in this stub but often useful for finding various files
+    project_dir = Path(__file__).resolve().parents[2]
+
+    # find .env automagically by walking up directories until it's
+    # found, then load up the .env entries as environment variables
+    load_dotenv(find_dotenv())
+
+    main()
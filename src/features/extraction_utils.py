@@ -0,0 +1,58 @@
+import re
+import pandas as pd
+from .cleaning_utils import row_local, reads, writes
+
+
+def compile_patterns(patterns):
+    """Combine named patterns into a single regex, so that a string is
+    scanned once for all of them.
+
+    Every pattern is searched independently from the start of the
+    string, as with re.search. The value of a pattern is its capturing
+    group if it has one, else the whole match. Return the regex and the
+    index of the group holding the value of each pattern."""
+    parts, groups = [], {}
+    for name, pattern in patterns.items():
+        n_groups = re.compile(pattern).groups
+        if n_groups > 1:
+            raise ValueError('Pattern {} has more than one group'.format(name))
+        if n_groups == 0:
+            pattern = '(' + pattern + ')'
+        groups[name] = len(groups)
+        parts.append(r'(?=(?:[\s\S]*?' + pattern + ')?)')
+    return re.compile(r'\A' + ''.join(parts)), groups
+
+
+def extract_features(spec):
+    """Extract features from text columns as declared by a spec.
+
+    The spec maps 'patterns' to a dictionary of source column -> named
+    patterns, and 'features' to a dictionary of output column ->
+    function of the matches and of the data. Each source column is
+    factorized once and its distinct values are scanned with a single
+    regex. The features are then created in order from the first match
+    of each pattern (NaN if it does not match). Feature functions may
+    only read the source columns and the features created before
+    them."""
+    compiled = {column: compile_patterns(patterns)
+                for column, patterns in spec['patterns'].items()}
+
+    @row_local
+    @reads(list(spec['patterns']))
+    @writes(list(spec['features']))
+    def extractor(data):
+        matches = {}
+        for column, (regex, groups) in compiled.items():
+            codes, uniques = pd.factorize(data[column])
+            extracted = (pd.Series(uniques, dtype=object)
+                         .str.extract(regex, expand=True)
+                         .reindex(codes))
+            for name, group in groups.items():
+                matches[name] = extracted[group].values
+        matches = pd.DataFrame(matches, index=data.index)
+
+        for feature, function in spec['features'].items():
+            data[feature] = function(matches, data)
+        return data
+
+    return extractor
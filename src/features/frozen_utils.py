@@ -0,0 +1,81 @@
+import numpy as np
+from .chunk_utils import _is_filter, _is_global
+from .planning_utils import _columns_after
+from .profiling_utils import step_name
+
+
+class FrozenPipeline:
+    """Run cleaning steps fitted on training data on new rows, e.g. single
+    raw listings to price, cleaning every row as it would have been
+    cleaned with the training data.
+
+    When fitting, the steps run on the training data up to the last
+    global step that freezes its statistics (see freezable), which are
+    kept. When transforming, these steps are replaced by their frozen
+    row-local versions and the global filters that do not freeze any
+    statistics, such as drop_duplicates and drop_rows, are skipped, as
+    they only clean the training data. The filters are combined into a
+    single mask, the drop steps are skipped and the output columns are
+    selected at the end, so that small batches are not copied between
+    steps. The kept rows keep their index.
+
+    The pipeline reads the given input columns of the data it runs on."""
+
+    def __init__(self, list_functions, columns):
+        for function in list_functions:
+            if _is_global(function) and not _is_filter(function) \
+                    and not hasattr(function, 'fit'):
+                raise ValueError('Step {} is global and does not freeze its '
+                                 'statistics'.format(step_name(function)))
+        self.list_functions = list_functions
+        self.columns = list(columns)
+        self.output = self.columns
+        for function in list_functions:
+            self.output = _columns_after(function, self.output)
+        self.last = max([i for i, function in enumerate(list_functions)
+                         if hasattr(function, 'fit')], default=-1)
+
+    def fit(self, data):
+        """Run the steps on the training data up to the last one freezing
+        its statistics, and freeze them."""
+        statistics = {}
+        data = data[self.columns]
+        for i, function in enumerate(self.list_functions[:self.last + 1]):
+            if hasattr(function, 'fit'):
+                statistics[i] = function.fit(data)
+                function = function.freeze(statistics[i])
+            data = function(data)
+        return self.set_state({'statistics': statistics})
+
+    def get_state(self):
+        """Return the frozen statistics of the global steps, which can be
+        saved, e.g. with joblib."""
+        return {'statistics': self.statistics}
+
+    def set_state(self, state):
+        """Restore the frozen statistics of the global steps, see
+        get_state, e.g. those of a fitted chunked pipeline running the
+        same steps."""
+        self.statistics = state['statistics']
+        self.steps = []
+        for i, function in enumerate(self.list_functions):
+            if hasattr(function, 'fit'):
+                if i not in self.statistics:
+                    raise ValueError('State of another pipeline')
+                self.steps.append(function.freeze(self.statistics[i]))
+            elif not hasattr(function, 'drops') and not (
+                    _is_global(function) and _is_filter(function)):
+                self.steps.append(function)
+        return self
+
+    def transform(self, data):
+        """Return the rows of the data kept by the cleaning steps, cleaned
+        with the frozen statistics."""
+        data = data[self.columns]
+        keep = np.ones(len(data), dtype=bool)
+        for function in self.steps:
+            if _is_filter(function):
+                keep &= function.mask(data, None)
+            else:
+                data = function(data)
+        return data.loc[keep, self.output]
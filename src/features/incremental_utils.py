@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+# Version of the saved cleaning states, to be increased when the cleaning
+# steps change
+STATE_VERSION = 1
+
+
+def state_key(*parts):
+    """Return a key of JSON-serializable parts, e.g. the config and the
+    columns a cleaning state is saved for."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True)
+                          .encode()).hexdigest()
+
+
+def cleaning_outcome(pipeline, start=0):
+    """Return the outcome of the cleaning of the rows fitted by a chunked
+    pipeline from start on: whether every row is kept and the columns
+    created by the global steps for the kept rows."""
+    keep = pipeline.keep[start:]
+    rows = start + np.flatnonzero(keep)
+    results = {}
+    for i, result in pipeline.results.items():
+        read = pipeline.list_functions[i].reads
+        results[i] = result.loc[rows, [col for col in result.columns
+                                       if col not in read]]
+    return keep, results
+
+
+def extend_outcome(outcome, new):
+    """Return an outcome followed by the outcome of new rows."""
+    keep, results = outcome
+    return (np.concatenate([keep, new[0]]),
+            {i: pd.concat([result, new[1][i]])
+             for i, result in results.items()})
+
+
+def drift(pipeline, outcome):
+    """Return the number of rows that a chunked pipeline now cleans
+    differently from an outcome of the cleaning of its first rows, as a
+    fraction of the rows kept by the outcome. These are the rows kept
+    by only one of them and the kept rows whose columns created by
+    global steps changed."""
+    keep, results = outcome
+    current_keep, current = cleaning_outcome(pipeline)
+    changed = keep != current_keep[:len(keep)]
+    rows = np.flatnonzero(keep & ~changed)
+    for i, result in results.items():
+        old, new = result.loc[rows], current[i].loc[rows]
+        differ = ~((old == new) | (old.isna() & new.isna())).all(axis=1)
+        changed[rows[differ.values]] = True
+    return changed.sum() / max(keep.sum(), 1)
+
+
+def save_state(filename, pipeline, outcome, key, bundle_id):
+    """Save the state of a chunked pipeline and the outcome of the
+    cleaning of its rows, written to the split bundle of the given
+    id."""
+    joblib.dump({'version': STATE_VERSION, 'key': key,
+                 'bundle_id': bundle_id, 'pipeline': pipeline.get_state(),
+                 'outcome': outcome}, filename)
+
+
+def load_state(filename, pipeline, key, bundle_id):
+    """Restore the state of a chunked pipeline saved with save_state and
+    return the outcome of the cleaning of its rows, or None if no state
+    was saved with this version and key for the split bundle of the
+    given id, e.g. because another build rewrote the split since."""
+    if not os.path.exists(filename):
+        return None
+    state = joblib.load(filename)
+    if (state['version'] != STATE_VERSION or state['key'] != key or
+            state.get('bundle_id') != bundle_id or bundle_id is None):
+        return None
+    pipeline.set_state(state['pipeline'])
+    return state['outcome']
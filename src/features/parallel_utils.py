@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from .profiling_utils import step_name
+
+
+def split_stages(list_functions):
+    """Split pipeline steps into stages, each a list of steps and
+    whether they are row-local. Consecutive row-local steps form a
+    single stage, which ends after a filter resetting the index."""
+    stages, local = [], []
+    for function in list_functions:
+        if getattr(function, 'row_local', False):
+            local.append(function)
+            if getattr(function, 'reset_index', False):
+                stages.append((local, True))
+                local = []
+        else:
+            if local:
+                stages.append((local, True))
+                local = []
+            stages.append(([function], False))
+    if local:
+        stages.append((local, True))
+    return stages
+
+
+def _run_partition(functions, data):
+    """Run the steps of a stage on a partition of its data. A final
+    filter keeps the index, which is reset once the partitions are
+    concatenated."""
+    for function in functions:
+        if getattr(function, 'reset_index', False):
+            data = data.loc[function.mask(data, None)]
+        else:
+            data = function(data)
+    return data
+
+
+def run_partitioned(functions, data, n_jobs, parallel):
+    """Run row-local steps on n_jobs contiguous partitions of a DataFrame
+    in the worker processes of a joblib Parallel and concatenate the
+    partitions in order."""
+    if data.empty:
+        for function in functions:
+            data = function(data)
+        return data
+
+    edges = np.linspace(0, len(data), min(n_jobs, len(data)) + 1, dtype=int)
+    partitions = parallel(delayed(_run_partition)(functions,
+                                                  data.iloc[start:stop])
+                          for start, stop in zip(edges[:-1], edges[1:]))
+
+    out = pd.concat(partitions)
+    if getattr(functions[-1], 'reset_index', False):
+        out = out.reset_index(drop=True)
+    return out
+
+
+def run_parallel(list_functions, data, run, n_jobs):
+    """Run pipeline steps with the row-local stages on partitions of the
+    data in n_jobs processes and the other steps on the whole data. The
+    processes are started once and reused by every stage; the steps and
+    partitions are sent to them pickled (closures with cloudpickle),
+    and copied rather than memory-mapped, as steps write to them. Each
+    stage is run as a single step, whose profile does not include the
+    memory used by the worker processes."""
+    with Parallel(n_jobs=n_jobs, max_nbytes=None) as parallel:
+        for functions, local in split_stages(list_functions):
+            if local:
+                name = step_name(functions[0])
+                if len(functions) > 1:
+                    name += '..' + step_name(functions[-1])
+                data = run(lambda data: run_partitioned(functions, data,
+                                                        n_jobs, parallel),
+                           data, name)
+            else:
+                data = run(functions[0], data)
+    return data
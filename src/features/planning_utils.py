@@ -0,0 +1,132 @@
+from .cleaning_utils import drop_columns
+from .profiling_utils import step_name
+
+
+def _columns_after(function, columns):
+    """Return the columns of a DataFrame after a pipeline step."""
+    if hasattr(function, 'drops'):
+        return [col for col in columns if col not in function.drops]
+    if hasattr(function, 'renames'):
+        return [function.renames(col) for col in columns]
+    return columns + [col for col in getattr(function, 'writes', [])
+                      if col not in columns]
+
+
+def _columns_used(function, columns, used, whole_rows=True):
+    """Return the columns used before a pipeline step, out of its input
+    columns, given the columns used after it, or None if the step only
+    writes unused columns and can be skipped. Unless whole_rows is True,
+    steps reading whole rows are taken to read no column."""
+    if hasattr(function, 'drops'):
+        return None
+    if hasattr(function, 'renames'):
+        return {col for col in columns if function.renames(col) in used}
+    if function.reads is None:
+        # Steps reading whole rows use every column they are given
+        return set(columns) if whole_rows else set(used)
+    written = set(getattr(function, 'writes', []))
+    if not hasattr(function, 'mask') and not written & used:
+        return None
+    # Overwritten columns are kept until then, so that they keep their
+    # position in the output
+    return used.difference(written.difference(columns)).union(
+        function.reads or [])
+
+
+def _plan_columns(list_functions, columns, whole_rows=True):
+    """Return the columns used before each pipeline step (see
+    _columns_used) and the output columns."""
+    before = []
+    for function in list_functions:
+        if not any(hasattr(function, attr)
+                   for attr in ('reads', 'drops', 'renames')):
+            raise ValueError('Step {} does not declare the columns it '
+                             'reads'.format(step_name(function)))
+        before.append(columns)
+        columns = _columns_after(function, columns)
+    output = columns
+
+    used, needed = set(output), []
+    for function, columns in reversed(list(zip(list_functions, before))):
+        used_before = _columns_used(function, columns, used, whole_rows)
+        needed.append(used_before)
+        if used_before is not None:
+            used = used_before
+    needed.reverse()
+    return needed, output
+
+
+def _used_inputs(columns, needed, output):
+    """Return the input columns used by a pipeline, out of the columns
+    used before each step and the output columns, see _plan_columns."""
+    used = next((used for used in needed if used is not None), set(output))
+    return [col for col in columns if col in used]
+
+
+def fingerprinted_columns(list_functions, columns):
+    """Return the input columns that pipeline steps run on data with the
+    given columns only use through the steps reading whole rows, such as
+    drop_duplicates, in order.
+
+    These steps only compare rows, so that these columns can be replaced
+    by a fingerprint of their values when the data is loaded (see
+    fingerprint) and the columns themselves are not kept. Columns written
+    before a step reading whole rows are left out, as their fingerprint
+    would not be that of the values compared."""
+    columns = list(columns)
+    needed, output = _plan_columns(list_functions, columns)
+    narrow = _used_inputs(columns, *_plan_columns(list_functions, columns,
+                                                  whole_rows=False))
+    fingerprinted = {col: col
+                     for col in _used_inputs(columns, needed, output)
+                     if col not in narrow}
+    last = max([i for i, function in enumerate(list_functions)
+                if getattr(function, 'reads', ()) is None], default=-1)
+    for function in list_functions[:last]:
+        if hasattr(function, 'renames'):
+            fingerprinted = {col: function.renames(name)
+                             for col, name in fingerprinted.items()}
+        written = set(getattr(function, 'writes', []))
+        fingerprinted = {col: name for col, name in fingerprinted.items()
+                         if name not in written}
+    return [col for col in columns if col in fingerprinted]
+
+
+def plan_pipeline(list_functions, columns):
+    """Plan the columns read by pipeline steps run on data with the given
+    columns.
+
+    Every step declares the columns it reads and writes (see reads and
+    writes), drops (drop_columns) or renames (rename_cols). Going back
+    from the output, a column is used before a step if the step reads it
+    or if it is used after the step and not created by it. Steps reading
+    whole rows, such as drop_duplicates, use every column loaded before
+    them, so no column is dropped before them: the columns only they use
+    are better loaded as a fingerprint, see fingerprinted_columns.
+
+    Return the input columns used by the pipeline, in order, and its
+    steps run on the whole input: the steps that only write unused
+    columns and the drop steps are skipped, and unused columns are
+    dropped before the first step and after their last use instead. The
+    output is the same as without planning."""
+    inputs = list(columns)
+    needed, output = _plan_columns(list_functions, inputs)
+
+    steps, columns = [], inputs
+    for function, used_before in zip(list_functions, needed):
+        if used_before is None:
+            continue
+        unused = [col for col in columns if col not in used_before]
+        if unused:
+            steps.append(drop_columns(unused))
+            columns = [col for col in columns if col in used_before]
+        missing = used_before.difference(columns)
+        if missing:
+            raise ValueError('Step {} reads missing columns {}'.format(
+                step_name(function), sorted(missing)))
+        steps.append(function)
+        columns = _columns_after(function, columns)
+    unused = [col for col in columns if col not in output]
+    if unused:
+        steps.append(drop_columns(unused))
+    return _used_inputs(inputs, needed, output), steps
@@ -0,0 +1,76 @@
+import json
+import time
+import tracemalloc
+
+
+def step_name(function):
+    """Return the name of a pipeline step, i.e. the name of the function
+    or of the factory that created it."""
+    name = getattr(function, '__qualname__', None)
+    if name is None:
+        name = getattr(function, 'func', function).__qualname__
+    return name.split('.<locals>.')[0].lstrip('_')
+
+
+def profile_step(function, data, name=None):
+    """Run a pipeline step on a DataFrame and return its output and a
+    record of its elapsed time, peak and retained memory (allocations made
+    by the step, traced with tracemalloc), shape in and out and changed
+    dtypes. Tracing memory slows the step down, so times are only
+    comparable between profiled runs. The step is named after the
+    function unless a name is given."""
+    rows_in, cols_in = data.shape
+    dtypes_in = data.dtypes.astype(str).to_dict()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        out = function(data)
+        seconds = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    dtypes_out = out.dtypes.astype(str).to_dict()
+    record = {
+        'step': name or step_name(function),
+        'seconds': seconds,
+        'peak_mb': peak / 1e6,
+        'retained_mb': retained / 1e6,
+        'rows_in': rows_in,
+        'rows_out': len(out),
+        'cols_in': cols_in,
+        'cols_out': out.shape[1],
+        'dtypes_changed': {col: [dtypes_in[col], dtype]
+                           for col, dtype in dtypes_out.items()
+                           if col in dtypes_in and dtypes_in[col] != dtype},
+    }
+    return out, record
+
+
+def format_profile(profile):
+    """Return the records of a profiled pipeline as a table."""
+    width = max([len('total')] + [len(record['step']) for record in profile])
+    row = '{:>3} {:<%d} {:>8} {:>9} {:>9} {:>15} {:>9}  {}' % width
+    lines = [row.format('#', 'step', 'time (s)', 'peak (MB)', 'kept (MB)',
+                        'rows', 'cols', 'dtypes changed')]
+    for i, record in enumerate(profile):
+        changed = ', '.join('{} {}->{}'.format(col, *dtypes) for col, dtypes
+                            in record['dtypes_changed'].items())
+        lines.append(row.format(
+            i, record['step'], '{:.3f}'.format(record['seconds']),
+            '{:.1f}'.format(record['peak_mb']),
+            '{:.1f}'.format(record['retained_mb']),
+            '{}->{}'.format(record['rows_in'], record['rows_out']),
+            '{}->{}'.format(record['cols_in'], record['cols_out']),
+            changed).rstrip())
+    total = sum(record['seconds'] for record in profile)
+    lines.append(row.format('', 'total', '{:.3f}'.format(total), '', '', '',
+                            '', '').rstrip())
+    return '\n'.join(lines)
+
+
+def save_profile(profile, filename):
+    """Save the records of a profiled pipeline to a JSON file."""
+    with open(filename, 'w') as f:
+        json.dump(profile, f, indent=2)
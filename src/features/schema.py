@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Declared dtypes of the cleaned dataset: low-cardinality strings are
+# categoricals, sì/no flags are booleans and counts are downcast floats
+# (they can be missing). The target and the price per square meter are
+# kept in double precision.
+SCHEMA = {
+    'Superficie': 'float32',
+    'Piano': 'category',
+    'Zona': 'category',
+    'Prezzo': 'float64',
+    'Stato': 'category',
+    'Climatizzazione': 'category',
+    'Prezzo_per_m2': 'float64',
+    'Classe_immobile': 'category',
+    'Tipo_proprietà': 'category',
+    'Tipologia_casa': 'category',
+    'Anno_costruzione_bins': 'category',
+    'Riscaldamento_A_C': 'category',
+    'Tipo_riscaldamento': 'category',
+    'Alimentazione_riscaldamento': 'category',
+    'Efficienza_energetica': 'category',
+    'Ascensore': 'bool',
+    'Accesso_disabili': 'bool',
+    'Posti_garage': 'float32',
+    'Posti_esterni': 'float32',
+    'Num_bagni': 'float32',
+    'Num_tot_locali': 'float32',
+    'Infissi': 'category',
+    'Giardino': 'category',
+    'Arredato': 'category',
+    'Terrazza': 'bool',
+    'Esposizione': 'category',
+    'Fibra_ottica': 'bool',
+    'Cancello_elettrico': 'bool',
+    'Cantina': 'bool',
+    'Impianto_di_allarme': 'bool',
+    'Mansarda': 'bool',
+    'Taverna': 'bool',
+    'Cablato': 'bool',
+    'Idromassaggio': 'bool',
+    'Piscina': 'bool',
+}
+
+FLAGS = {'sì': True, 'no': False, True: True, False: False}
+
+
+def _to_category(values):
+    """Convert values to a categorical of strings, e.g. the intervals of
+    binned features, keeping missing values."""
+    values = values.astype(object)
+    return values.where(values.isna(), values.astype(str)).astype('category')
+
+
+def _to_bool(values):
+    """Convert sì/no flags to booleans."""
+    if values.dtype == bool:
+        return values
+    flags = values.map(FLAGS)
+    if flags.isna().any():
+        raise ValueError('Column {} has values other than sì/no: {}'.format(
+            values.name, sorted(map(str, values[flags.isna()].unique()))))
+    return flags.astype(bool)
+
+
+def apply_schema(data):
+    """Cast the columns of a DataFrame to the dtypes declared in the
+    schema. Raise a ValueError for columns that are not declared."""
+    unknown = [col for col in data.columns if col not in SCHEMA]
+    if unknown:
+        raise ValueError('Columns not in the schema: {}'.format(unknown))
+
+    data = data.copy()
+    for col in data.columns:
+        if SCHEMA[col] == 'category':
+            data[col] = _to_category(data[col])
+        elif SCHEMA[col] == 'bool':
+            data[col] = _to_bool(data[col])
+        else:
+            data[col] = pd.to_numeric(data[col]).astype(SCHEMA[col])
+    return data
+
+
+def feature_types(data):
+    """Return the categorical, boolean and numerical columns of a
+    DataFrame, as declared in the schema."""
+    cat_features = [col for col in data.columns if SCHEMA[col] == 'category']
+    bool_features = [col for col in data.columns if SCHEMA[col] == 'bool']
+    num_features = [col for col in data.columns
+                    if SCHEMA[col] not in ('category', 'bool')]
+    return cat_features, bool_features, num_features
+
+
+def memory_usage(data):
+    """Return the memory used by a DataFrame in bytes."""
+    return data.memory_usage(deep=True).sum()
+
+
+def memory_report(before, after):
+    """Return a summary of the memory saved by the schema."""
+    before, after = memory_usage(before), memory_usage(after)
+    return '{:.2f} MB -> {:.2f} MB ({:.1f}x smaller)'.format(
+        before / 1e6, after / 1e6, before / np.maximum(after, 1))
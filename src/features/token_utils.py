@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class TokenMatrix:
+    """Sparse boolean matrix of the tokens of a column of separated
+    strings, with a row per value and a column per distinct token.
+
+    The values are split in a single pass over their concatenation and
+    every distinct token is normalized (stripped, spaces replaced by
+    underscores) only once. The position of the tokens within their
+    value is kept, so that features depending on the first matching
+    token of a row can be derived as well. Missing values and empty
+    tokens have no tokens."""
+
+    def __init__(self, values, sep='\n'):
+        # Split all the values at once, as a single joined string
+        values = values.where(values.notna(), '').values
+        counts = np.fromiter((value.count(sep) for value in values),
+                             dtype=np.int64, count=len(values)) + 1
+        tokens = np.array(sep.join(values).split(sep) if len(values) else [],
+                          dtype=object)
+        rows = np.repeat(np.arange(len(values)), counts)
+
+        raw_codes, raw_tokens = pd.factorize(tokens)
+        normalized = (pd.Series(raw_tokens, dtype=object)
+                      .str.strip()
+                      .str.replace(' ', '_', regex=False))
+        token_codes, vocab = pd.factorize(normalized.mask(normalized == ''))
+
+        codes = np.where(raw_codes >= 0, token_codes[raw_codes], -1)
+        found = codes >= 0
+        self.rows = rows[found]
+        self.codes = codes[found]
+        self.vocab = pd.Index(vocab, dtype=object)
+        self.n_rows = len(values)
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(self.codes), dtype=bool), (self.rows, self.codes)),
+            shape=(self.n_rows, len(self.vocab)))
+
+    def _containing(self, *substrings):
+        """Return a mask of the tokens containing any of the
+        substrings."""
+        mask = np.zeros(len(self.vocab), dtype=bool)
+        for substring in substrings:
+            mask |= self.vocab.str.contains(substring, regex=False)
+        return mask
+
+    def has(self, token):
+        """Return whether each row has a token."""
+        if token not in self.vocab:
+            return np.zeros(self.n_rows, dtype=bool)
+        column = self.matrix[:, self.vocab.get_loc(token)]
+        return column.toarray().ravel()
+
+    def has_any(self, *substrings):
+        """Return whether each row has a token containing any of the
+        substrings."""
+        columns = np.flatnonzero(self._containing(*substrings))
+        return self.matrix[:, columns].getnnz(axis=1) > 0
+
+    def first_match(self, substring, pattern):
+        """Return, for each row, the first match of a regex with a single
+        group in the tokens containing a substring, in the order of the
+        tokens, or NaN."""
+        matches = (pd.Series(self.vocab, dtype=object)
+                   .where(self._containing(substring))
+                   .str.extract(pattern, expand=False)
+                   .values[self.codes])
+        found = pd.notna(matches)
+        rows, first = np.unique(self.rows[found], return_index=True)
+
+        result = np.full(self.n_rows, np.nan, dtype=object)
+        result[rows] = matches[found][first]
+        return pd.Series(result)
+
+    def containing(self, substring):
+        """Return, for each row, the string representation of the list of
+        its tokens containing a substring, e.g. "['Arredato']"."""
+        selected = self._containing(substring)[self.codes]
+        rows = self.rows[selected]
+        codes = self.codes[selected]
+
+        result = np.full(self.n_rows, '[]', dtype=object)
+        counts = np.bincount(rows, minlength=self.n_rows)
+        single = counts[rows] == 1
+        reprs = np.array([str([token]) for token in self.vocab], dtype=object)
+        result[rows[single]] = reprs[codes[single]]
+
+        if (~single).any():
+            lists = (pd.Series(self.vocab.values[codes[~single]],
+                               index=rows[~single])
+                     .groupby(level=0, sort=False)
+                     .agg(list))
+            result[lists.index.values] = lists.map(str).values
+        return pd.Series(result)
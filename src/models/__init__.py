@@ -1,5 +1,7 @@
 from .preprocessing_utils import CustomEncoder, ColumnSelector
 from .preprocessing_pipeline import preprocessing_pipeline
+from .tuning_utils import FoldCache, cross_val_scores, successive_halving
 from .model import Model
 
-__all__ = (CustomEncoder, ColumnSelector, preprocessing_pipeline, Model)
+__all__ = (CustomEncoder, ColumnSelector, preprocessing_pipeline, FoldCache,
+           cross_val_scores, successive_halving, Model)
@@ -1,6 +1,6 @@
 import joblib
-from sklearn.model_selection import GridSearchCV
-from sklearn.model_selection import cross_val_score
+from sklearn.base import clone
+from .tuning_utils import cross_val_scores, successive_halving
 
 
 class Model:
@@ -26,15 +26,23 @@ class Model:
         self.model.fit(X, y)
 
     @classmethod
-    def tune(cls, model, X, y, param_grid, cv=5):
-        """Instantiate class with tuned model."""
-        grid_search = GridSearchCV(model, cv=cv, param_grid=param_grid)
-        grid_search.fit(X, y)
-        return cls(grid_search.best_estimator_)
-
-    def cv_score(self, X, y, scoring, cv=5):
-        """Return model cross-validated score."""
-        return cross_val_score(self.model, X, y, cv=cv, scoring=scoring).mean()
+    def tune(cls, model, X, y, param_grid, cv=5, scoring=None, n_jobs=1,
+             factor=3, random_state=None, cache=None):
+        """Instantiate class with the model tuned by successive halving
+        (see successive_halving) and trained with the best parameters,
+        and return it with the scores and times of the candidates."""
+        params, results = successive_halving(model, X, y, param_grid, cv,
+                                             scoring, n_jobs, factor,
+                                             random_state, cache)
+        tuned = cls(clone(model).set_params(**params))
+        tuned.train(X, y)
+        return tuned, results
+
+    def cv_score(self, X, y, scoring, cv=5, n_jobs=1, cache=None):
+        """Return model cross-validated score, fitting the pre-processing
+        once per fold (see cross_val_scores)."""
+        return cross_val_scores(self.model, X, y, scoring, cv, n_jobs,
+                                cache).mean()
 
     def predict(self, X):
         """Return predictions from model."""
@@ -5,18 +5,40 @@ from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
 import numpy as np
 import pandas as pd
-from src.features import parse_config
+from src.features import (parse_config, load_split, split_files, hash_files,
+                          load_raw_data, load_cleaning, apply_schema,
+                          stage_key, StageCache)
 from src.visualization import plot_predictions
 from src.models import Model
 from sklearn.metrics import mean_squared_error
 
 
+def predict_raw(model, cleaning, raw_data, config):
+    """Return the predictions of a model for raw listings, e.g. of a new
+    crawl, with the columns of the raw files, cleaned with the frozen
+    cleaning pipeline saved next to the model. The listings filtered out
+    by the cleaning steps, e.g. outliers, are not predicted."""
+    X = apply_schema(cleaning.transform(raw_data)).drop(
+        columns=config['features']['drop_cols'])
+    if X.empty:
+        return pd.Series([], index=X.index, dtype=float)
+    return pd.Series(model.predict(X), index=X.index)
+
+
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('model_filepath', type=click.Path())
 @click.argument('output_filepath', type=click.Path())
 @click.argument('config_file', type=str, default='config.yml')
-def main(input_filepath, model_filepath, output_filepath, config_file):
+@click.option('--force', is_flag=True,
+              help='Predict even if the plots are in the stage cache.')
+@click.option('--raw-path', type=click.Path(exists=True), default=None,
+              help='Directory of raw files, e.g. of a new crawl, whose '
+                   'listings are priced with the model and the cleaning '
+                   'pipeline saved with it, to raw_predictions.csv, '
+                   'instead of predicting the test set.')
+def main(input_filepath, model_filepath, output_filepath, config_file,
+         force, raw_path):
     """Runs data loading and cleaning and pre-processing scripts and
     saves data in ../processed."""
     logger = logging.getLogger(__name__)
@@ -24,16 +46,41 @@ def main(input_filepath, model_filepath, output_filepath, config_file):
 
     # Parse config file
     config = parse_config(config_file)
+    inputs = [input_filepath + '/split.parquet',
+              model_filepath + config['predicting']['model_name']]
 
-    # Load data
-    X_train = pd.read_csv(input_filepath + '/X_train.csv')
-    y_train = pd.read_csv(input_filepath + '/y_train.csv').values.ravel()
+    # Price raw listings, indexed by their row in the raw files
+    if raw_path is not None:
+        cleaning = load_cleaning(model_filepath +
+                                 config['predicting']['cleaning_name'])
+        raw_data = load_raw_data(raw_path, config, cleaning.columns)
+        predictions = predict_raw(Model.load(inputs[1]), cleaning, raw_data,
+                                  config)
+        logger.info('Priced {} raw listings out of {}'.format(
+            len(predictions), len(raw_data)))
+        predictions.to_frame(config['features']['target'][0]).to_csv(
+            output_filepath + '/raw_predictions.csv')
+        return
 
-    X_test = pd.read_csv(input_filepath + '/X_test.csv')
-    y_test = pd.read_csv(input_filepath + '/y_test.csv').values.ravel()
+    # Reuse the plots of the same model, test set and code
+    cache = StageCache(config['caching']['cache_dir'],
+                       config['caching']['max_size_mb'])
+    outputs = [output_filepath + '/pred_plots.png']
+    key = stage_key('predict_model',
+                    [hash_files(split_files(inputs[0]) + inputs[1:])],
+                    {'predicting': config['predicting']},
+                    ['src.features', 'src.models', 'src.visualization'])
+    if not force and cache.restore(key, outputs):
+        logger.info('Restored the predictions from the stage cache')
+        return
+
+    # Load data
+    X_train, X_test, y_train, y_test = load_split(inputs[0])
+    y_train = y_train.values.ravel()
+    y_test = y_test.values.ravel()
 
     # Load model
-    model = Model.load(model_filepath + config['predicting']['model_name'])
+    model = Model.load(inputs[1])
 
     # Make predictions
     train_pred = model.predict(X_train)
@@ -50,7 +97,8 @@ def main(input_filepath, model_filepath, output_filepath, config_file):
     )
     pred_plots = plot_predictions(scores, train_pred, test_pred, y_train,
                                   y_test)
-    pred_plots.savefig(output_filepath + '/pred_plots.png')
+    pred_plots.savefig(outputs[0])
+    cache.store(key, outputs)
 
 
 if __name__ == '__main__':
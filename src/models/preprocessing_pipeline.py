@@ -4,9 +4,11 @@ from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 
 
-def preprocessing_pipeline(cat_features, num_features):
+def preprocessing_pipeline(cat_features, num_features, bool_features=()):
     """Create pre-processing pipeline to concatenate with the final
-    estimator."""
+    estimator. Boolean features are one-hot encoded like categoricals,
+    but do not need imputing, and raise a ValueError at predict time for
+    values other than True and False, e.g. sì/no strings."""
     cat_transformer = Pipeline([
         ('imputing', SimpleImputer(strategy='most_frequent')),
         ('oh_encoding', OneHotEncoder(handle_unknown='ignore'))
@@ -19,7 +21,10 @@ def preprocessing_pipeline(cat_features, num_features):
 
     pipeline = ColumnTransformer([
         ('categoricals', cat_transformer, cat_features),
-        ('numericals', num_transformer, num_features)
+        ('numericals', num_transformer, num_features),
+        ('booleans', OneHotEncoder(
+            categories=[[False, True]] * len(bool_features)),
+         list(bool_features))
     ],
         remainder='passthrough'
     )
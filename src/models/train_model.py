@@ -1,23 +1,29 @@
 # -*- coding: utf-8 -*-
 import click
 import logging
+import shutil
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
 import numpy as np
-import pandas as pd
 from sklearn.pipeline import Pipeline
-# from sklearn.model_selection import KFold
 from sklearn.compose import TransformedTargetRegressor
 from sklearn.svm import SVR
-# from src.features import parse_config, rng
-from src.models import preprocessing_pipeline, Model
+from src.features import (parse_config, load_split, split_files, hash_files,
+                          feature_types, stage_key, StageCache)
+from src.models import preprocessing_pipeline, FoldCache, Model
 
 
 @click.command()
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
 @click.argument('config_file', type=str, default='config.yml')
-def main(input_filepath, output_filepath, config_file):
+@click.option('--tune', is_flag=True,
+              help='Tune the model on the parameter grid of the config by '
+                   'successive halving and save the scores and times of the '
+                   'candidates to tuning_results.csv.')
+@click.option('--force', is_flag=True,
+              help='Train the model even if it is in the stage cache.')
+def main(input_filepath, output_filepath, config_file, tune, force):
     """Runs data loading and cleaning and pre-processing scripts and
     saves data in ../processed."""
     logger = logging.getLogger(__name__)
@@ -25,33 +31,65 @@ def main(input_filepath, output_filepath, config_file):
                 'training and evaluating final model.')
 
     # Parse config file
-    # config = parse_config(config_file)
+    config = parse_config(config_file)
+    cache = StageCache(config['caching']['cache_dir'],
+                       config['caching']['max_size_mb'])
+    inputs = [input_filepath + '/split.parquet',
+              input_filepath + '/cleaning.pkl']
 
     # Load training data
-    X_train = pd.read_csv(input_filepath + '/X_train.csv')
-    y_train = pd.read_csv(input_filepath + '/y_train.csv').values.ravel()
+    X_train, _, y_train, _ = load_split(inputs[0])
+    y_train = y_train.values.ravel()
 
     # Pre-processing and modeling pipeline
-    cat_features = X_train.select_dtypes(exclude='float64').columns
-    num_features = X_train.select_dtypes(include='float64').columns
+    cat_features, bool_features, num_features = feature_types(X_train)
 
     pipe = Pipeline([
-        ('preprocessing', preprocessing_pipeline(cat_features, num_features)),
+        ('preprocessing', preprocessing_pipeline(cat_features, num_features,
+                                                 bool_features)),
         ('model', TransformedTargetRegressor(regressor=SVR(), func=np.log1p,
                                              inverse_func=np.expm1))
     ])
 
-    # Tune or select model
-    #   kf = KFold(config['modeling']['num_folds'], shuffle=True,
-    #   random_state=rng).get_n_splits(X_train.values)
-
     model = Model(model=pipe)
 
-    # Train model
-    model.train(X_train, y_train)
+    # Reuse the model trained on the same features, config and code
+    outputs = [output_filepath + model.name + '.pkl',
+               output_filepath + 'cleaning.pkl']
+    if tune:
+        outputs.append(output_filepath + 'tuning_results.csv')
+    key = stage_key('train_model',
+                    [hash_files(split_files(inputs[0]) + inputs[1:])],
+                    {section: config[section]
+                     for section in ('features', 'modeling')},
+                    ['src.features', 'src.models'], {'tune': tune})
+    if not force and cache.restore(key, outputs):
+        logger.info('Restored the model from the stage cache')
+        return
+
+    # Tune and train model, or train it with the default parameters
+    if tune:
+        modeling = config['modeling']
+        model, results = Model.tune(pipe, X_train, y_train,
+                                    modeling['param_grid'],
+                                    cv=modeling['num_folds'],
+                                    scoring=modeling['scoring'],
+                                    n_jobs=modeling['n_jobs'],
+                                    factor=modeling['halving_factor'],
+                                    random_state=modeling['search_seed'],
+                                    cache=FoldCache(
+                                        modeling['fold_cache_mb']))
+        logger.info('Tuned parameters: {}'.format(
+            {name: model.get_params()[name]
+             for name in modeling['param_grid']}))
+        results.to_csv(outputs[2], index=False)
+    else:
+        model.train(X_train, y_train)
 
-    # Save model
-    model.save(output_filepath + model.name + '.pkl')
+    # Save model, and next to it the cleaning pipeline for raw data
+    model.save(outputs[0])
+    shutil.copyfile(inputs[1], outputs[1])
+    cache.store(key, outputs)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,208 @@
+import math
+import time
+from collections import OrderedDict
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone, is_classifier
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import KFold, ParameterGrid, check_cv
+
+
+def _nbytes(data):
+    """Return the size in bytes of a dense or sparse matrix or of a
+    DataFrame."""
+    if hasattr(data, 'memory_usage'):
+        return int(data.memory_usage(deep=True).sum())
+    if hasattr(data, 'indptr'):
+        return data.data.nbytes + data.indices.nbytes + data.indptr.nbytes
+    return np.asarray(data).nbytes
+
+
+class FoldCache:
+    """Bounded in-memory cache of the samples of cross-validation folds
+    transformed by the pre-processing steps of a pipeline, fitted on the
+    training samples of each fold. Folds are keyed by the pre-processing
+    parameters and the samples, and the least recently used ones are
+    dropped once the cache holds more than max_size_mb."""
+
+    def __init__(self, max_size_mb=512):
+        self.max_size_mb = max_size_mb
+        self.folds = OrderedDict()
+        self.size = 0
+
+    def keys(self, preprocessing, X, y, folds):
+        """Return the keys of the folds of some samples."""
+        data = joblib.hash((clone(preprocessing), X, y))
+        return [joblib.hash((data, train, test)) for train, test in folds]
+
+    def get(self, key):
+        """Return a cached fold, i.e. its transformed training and test
+        samples, or None."""
+        if key not in self.folds:
+            return None
+        self.folds.move_to_end(key)
+        return self.folds[key][0]
+
+    def put(self, key, fold):
+        """Cache a fold, dropping the least recently used ones over the
+        size of the cache."""
+        size = sum(_nbytes(data) for data in fold)
+        self.folds[key] = fold, size
+        self.size += size
+        while self.size > self.max_size_mb * 1e6:
+            _, (_, size) = self.folds.popitem(last=False)
+            self.size -= size
+
+
+def _split_pipeline(model, candidates):
+    """Return the pre-processing steps and final estimator of a pipeline
+    and the parameters of the candidates for the final estimator, or None
+    if the model is not a pipeline or candidates set pre-processing
+    parameters."""
+    if len(getattr(model, 'steps', [])) < 2:
+        return None
+    prefix = model.steps[-1][0] + '__'
+    if not all(name.startswith(prefix)
+               for params in candidates for name in params):
+        return None
+    return model[:-1], model.steps[-1][1], [
+        {name[len(prefix):]: value for name, value in params.items()}
+        for params in candidates]
+
+
+def _fit_transform_fold(preprocessing, X, y, train, test):
+    """Fit pre-processing steps on the training samples of a fold and
+    return the transformed training and test samples."""
+    preprocessing = clone(preprocessing)
+    return (preprocessing.fit_transform(X.iloc[train], y[train]),
+            preprocessing.transform(X.iloc[test]))
+
+
+def _transform_folds(parallel, preprocessing, X, y, folds, cache):
+    """Return the samples of every fold transformed by pre-processing
+    steps fitted on its training samples, fitting the folds missing from
+    the cache in parallel."""
+    keys = cache.keys(preprocessing, X, y, folds)
+    transformed = {i: cache.get(key) for i, key in enumerate(keys)}
+    missing = [i for i, fold in transformed.items() if fold is None]
+    fitted = parallel(delayed(_fit_transform_fold)(preprocessing, X, y,
+                                                   *folds[i])
+                      for i in missing)
+    for i, fold in zip(missing, fitted):
+        cache.put(keys[i], fold)
+        transformed[i] = fold
+    return [transformed[i] for i in range(len(folds))]
+
+
+def _fit_and_score(model, params, X_train, y_train, X_test, y_test,
+                   scoring):
+    """Fit a model with the given parameters on the training samples of a
+    fold and return its score on the test samples, its fit time and its
+    score time."""
+    model = clone(model).set_params(**params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    score = check_scoring(model, scoring)(model, X_test, y_test)
+    return score, fit_time, time.perf_counter() - start
+
+
+def _cross_validate(parallel, model, candidates, X, y, folds, scoring,
+                    cache):
+    """Return the test score, fit time and score time of every candidate
+    on every fold, as an array of shape (candidates, folds, 3).
+
+    If the candidates only set parameters of the final estimator of a
+    pipeline, its pre-processing steps are fitted once per fold (see
+    FoldCache) and only the final estimator is fitted per candidate,
+    which gives the same scores. The times then leave out
+    pre-processing."""
+    split = _split_pipeline(model, candidates)
+    if split is None:
+        samples = [(X.iloc[train], X.iloc[test]) for train, test in folds]
+    else:
+        preprocessing, model, candidates = split
+        samples = _transform_folds(parallel, preprocessing, X, y, folds,
+                                   cache)
+    scores = parallel(
+        delayed(_fit_and_score)(model, params, X_train, y[train], X_test,
+                                y[test], scoring)
+        for params in candidates
+        for (X_train, X_test), (train, test) in zip(samples, folds))
+    return np.array(scores).reshape(len(candidates), len(folds), 3)
+
+
+def cross_val_scores(model, X, y, scoring=None, cv=5, n_jobs=1,
+                     cache=None):
+    """Return the cross-validated scores of a model on every fold, as
+    cross_val_score, fitting the pre-processing steps of a pipeline once
+    per fold and caching them, so that other models with the same
+    pre-processing reuse them."""
+    y = np.asarray(y)
+    folds = list(check_cv(cv, y, classifier=is_classifier(model)).split(X, y))
+    with Parallel(n_jobs=n_jobs) as parallel:
+        scores = _cross_validate(parallel, model, [{}], X, y, folds, scoring,
+                                 cache or FoldCache())
+    return scores[0, :, 0]
+
+
+def _n_iterations(n_candidates, factor):
+    """Return the number of iterations needed to select a single candidate
+    out of n_candidates, keeping 1 / factor of them every iteration."""
+    if factor is None or n_candidates <= 1:
+        return 1
+    return max(1, math.ceil(math.log(n_candidates, factor)))
+
+
+def successive_halving(model, X, y, param_grid, cv=5, scoring=None,
+                       n_jobs=1, factor=3, random_state=None, cache=None):
+    """Search a parameter grid by successive halving and return the best
+    parameters and a table of the scores and times of every candidate at
+    every iteration.
+
+    Every iteration cross-validates the remaining candidates on a random
+    subset of the samples, and keeps the best 1 / factor of them. The
+    subsets grow by factor so that the last iteration uses all the
+    samples, as an exhaustive grid search would. The folds of all the
+    candidates are fitted in n_jobs processes, and the pre-processing
+    steps of a pipeline once per fold (see FoldCache). Without a factor,
+    every candidate is cross-validated on all the samples."""
+    y = np.asarray(y)
+    cache = cache or FoldCache()
+    candidates = list(ParameterGrid(param_grid))
+    n_iterations = _n_iterations(len(candidates), factor)
+    order = np.random.RandomState(random_state).permutation(len(X))
+
+    results = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for iteration in range(n_iterations):
+            n_samples = len(X) if iteration == n_iterations - 1 else max(
+                cv * 2, len(X) // factor ** (n_iterations - 1 - iteration))
+            rows = np.sort(order[:n_samples])
+            X_iter, y_iter = X.iloc[rows], y[rows]
+            folds = list(KFold(cv).split(X_iter))
+
+            scores = _cross_validate(parallel, model, candidates, X_iter,
+                                     y_iter, folds, scoring, cache)
+            table = pd.DataFrame({
+                'iteration': iteration,
+                'n_samples': n_samples,
+                'params': candidates,
+                'mean_test_score': scores[:, :, 0].mean(axis=1),
+                'std_test_score': scores[:, :, 0].std(axis=1),
+                'mean_fit_time': scores[:, :, 1].mean(axis=1),
+                'mean_score_time': scores[:, :, 2].mean(axis=1),
+                'total_time': scores[:, :, 1:].sum(axis=(1, 2)),
+            })
+            results.append(table)
+
+            n_kept = max(1, math.ceil(len(candidates) / factor)) if factor \
+                else 1
+            best = np.argsort(-table['mean_test_score'].values,
+                              kind='stable')[:n_kept]
+            candidates = [candidates[i] for i in best]
+
+    return candidates[0], pd.concat(results, ignore_index=True)
@@ -114,8 +114,8 @@ def ordered_barchart(data):
                   .sort_values('Prezzo_per_m2', ascending=False))
 
     fig = plt.figure(figsize=(12, 10))
-    sns.barplot(x=gb_ordered['Prezzo_per_m2'], y=gb_ordered.index, ci=None,
-                color="lightblue")
+    sns.barplot(x=gb_ordered['Prezzo_per_m2'], y=gb_ordered.index,
+                order=gb_ordered.index, ci=None, color="lightblue")
     plt.xlabel("Average price/m2", size=12)
     plt.ylabel("District", size=12)
     plt.title('Average price/m2 per district', size=14)
@@ -4,7 +4,8 @@ import logging
 from pathlib import Path
 from dotenv import find_dotenv, load_dotenv
 import pandas as pd
-from src.features import parse_config
+from src.features import (parse_config, apply_schema, hash_files, stage_key,
+                          StageCache)
 from src.visualization import (histogram, boxplot, create_hue, scatterplot,
                                hist_per_district, scatter_per_district,
                                ordered_barchart, correlation_plot)
@@ -14,7 +15,9 @@ from src.visualization import (histogram, boxplot, create_hue, scatterplot,
 @click.argument('input_filepath', type=click.Path(exists=True))
 @click.argument('output_filepath', type=click.Path())
 @click.argument('config_file', type=str, default='config.yml')
-def main(input_filepath, output_filepath, config_file):
+@click.option('--force', is_flag=True,
+              help='Create the plots even if they are in the stage cache.')
+def main(input_filepath, output_filepath, config_file, force):
     """ Loads cleaned data and creates visualizations that are then
     stored in reports/figures."""
     logger = logging.getLogger(__name__)
@@ -23,8 +26,23 @@ def main(input_filepath, output_filepath, config_file):
     # Parse config file
     config = parse_config(config_file)
 
+    # Reuse the plots of the same cleaned data, config and code
+    cache = StageCache(config['caching']['cache_dir'],
+                       config['caching']['max_size_mb'])
+    outputs = [output_filepath + '/' + filename for filename in (
+        'histograms.png', 'boxplots.png', 'scatter.png',
+        'facetgrid_histograms.png', 'facetgrid_scatters.png',
+        'barchart.png', 'corr_plot.png')]
+    key = stage_key('visualize',
+                    [hash_files([input_filepath + '/data_clean.csv'])],
+                    {'visualizing': config['visualizing']},
+                    ['src.features', 'src.visualization'])
+    if not force and cache.restore(key, outputs):
+        logger.info('Restored the plots from the stage cache')
+        return
+
     # Load data
-    df = pd.read_csv(input_filepath + '/data_clean.csv')
+    df = apply_schema(pd.read_csv(input_filepath + '/data_clean.csv'))
 
     # Histograms
     histograms = histogram(df, config['visualizing']['continuous_vars'],
@@ -61,6 +79,7 @@ def main(input_filepath, output_filepath, config_file):
     # Correlation plot
     corr_plot = correlation_plot(df, config['visualizing']['corr_cols'])
     corr_plot.savefig(output_filepath + '/corr_plot.png')
+    cache.store(key, outputs)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src.features import (create_pipeline, drop_columns, drop_duplicates,
+                          drop_nans, rename_cols, row_local, reads, writes,
+                          plan_pipeline, fingerprinted_columns, fingerprint,
+                          parse_config, write_data, needed_columns,
+                          load_raw_data, iter_raw_data)
+from src.benchmarks import raw_tables
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@row_local
+@reads(['a'])
+@writes(['e'])
+def overwrite(data):
+    data['e'] = data['a'] * 2
+    return data
+
+
+def test_columns_only_compared_are_fingerprinted():
+    steps = [rename_cols, drop_duplicates, drop_nans(['A']),
+             drop_columns(['B', 'D'])]
+    columns = ['a', 'b', 'c', 'd']
+    assert fingerprinted_columns(steps, columns) == ['b', 'd']
+    # Whole-row steps read every loaded column, so none can be dropped
+    # before them without a fingerprint
+    assert plan_pipeline(steps, columns)[0] == columns
+
+    # Columns written before the comparison are not the loaded values
+    steps = [overwrite, drop_duplicates, drop_columns(['b', 'e'])]
+    assert fingerprinted_columns(steps, list('abe')) == ['b']
+
+
+def test_fingerprint_keeps_the_duplicates():
+    data = pd.DataFrame({'a': [1, 1, 1, 2], 'b': ['x', 'x', 'y', 'x'],
+                         'c': [0.5, 0.5, 0.5, np.nan]})
+    steps = [drop_duplicates, drop_columns(['b', 'Fingerprint_0',
+                                            'Fingerprint_1'])]
+    hashes = fingerprint(data[['b']])
+    hashes.columns = ['Fingerprint_0', 'Fingerprint_1']
+    narrow = data.drop(columns=['b']).join(hashes)
+    pd.testing.assert_frame_equal(
+        create_pipeline(plan_pipeline(steps, narrow.columns)[1])(narrow),
+        create_pipeline(plan_pipeline(steps, data.columns)[1])(data))
+
+
+def test_unused_raw_column_is_not_read(tmp_path):
+    config = parse_config(str(ROOT / 'config.yml'))
+    config['cleaning']['district_overrides'] = str(
+        ROOT / config['cleaning']['district_overrides'])
+    tables = raw_tables(100, config)
+    # Only the unused column tells the last two rows apart
+    tables[0].loc[99] = tables[0].loc[98]
+    tables[1].loc[99] = tables[1].loc[98]
+    tables[2].loc[99] = tables[2].loc[98]
+    tables[2].loc[99, 'disponibilità'] = 'Libero subito'
+    tables[2].loc[98, 'disponibilità'] = 'Occupato'
+    for filename, table in zip(config['cleaning']['filenames'], tables):
+        write_data(table, str(tmp_path) + filename.replace('.xlsx',
+                                                           '.parquet'))
+    path = str(tmp_path)
+
+    columns = needed_columns(path, config)
+    assert 'disponibilità' not in columns
+    for data in [load_raw_data(path, config, columns),
+                 next(iter_raw_data(path, config, 100, columns))]:
+        assert 'disponibilità' not in data.columns
+        assert list(data.columns) == columns
+        assert not data.loc[[98, 99]].duplicated().any()
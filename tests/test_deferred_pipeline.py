@@ -0,0 +1,61 @@
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src.features import (create_pipeline, drop_columns, drop_duplicates,
+                          drop_nans, drop_rows, filter_data,
+                          remove_outliers_iqr, row_local, reads, writes)
+
+
+@row_local
+@reads(['a', 'b'])
+@writes(['ratio'])
+def create_ratio(data):
+    data['ratio'] = data['a'] / data['b']
+    return data
+
+
+STEPS = [drop_duplicates, drop_nans(['c']), drop_rows([0, 10, 20]),
+         filter_data('a', 0.05, 0.95), create_ratio,
+         filter_data('b', 0.05, 0.95), filter_data('ratio', 0.1, 10),
+         remove_outliers_iqr(['d', 'e']), filter_data('f', 0.1, 0.9),
+         drop_columns(['g'])]
+
+
+def make_data(n_rows=100000, n_cols=20):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.random((n_rows, n_cols)),
+                        columns=['abcdefghijklmnopqrst'[i]
+                                 for i in range(n_cols)])
+    data.loc[rng.random(n_rows) < 0.05, 'c'] = np.nan
+    return data
+
+
+def peak_memory(pipeline, data):
+    """Return the output of a pipeline and its peak traced memory."""
+    tracemalloc.start()
+    try:
+        out = pipeline(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return out, peak
+
+
+def test_deferred_output_is_eager_output():
+    eager = create_pipeline(STEPS)(make_data())
+    deferred = create_pipeline(STEPS, deferred=True)(make_data())
+    pd.testing.assert_frame_equal(deferred, eager)
+
+
+def test_deferred_peak_memory_bound():
+    data = make_data()
+    size = data.memory_usage(deep=True).sum()
+    _, peak = peak_memory(create_pipeline(STEPS, deferred=True), data)
+    assert peak < 2 * size
+
+
+def test_deferred_peak_memory_below_eager():
+    _, eager = peak_memory(create_pipeline(STEPS), make_data())
+    _, deferred = peak_memory(create_pipeline(STEPS, deferred=True),
+                              make_data())
+    assert deferred < eager
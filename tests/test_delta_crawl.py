@@ -0,0 +1,56 @@
+import shutil
+from src.data import WebScraper, parse_listing
+from src.benchmarks import listing_page, serve_pages
+
+N_LISTINGS = 30
+
+
+def crawl(tmp_path, url):
+    """Crawl the stand-in website into the same directories each time,
+    as successive runs of make_dataset do."""
+    scraper = WebScraper(str(tmp_path / 'raw') + '/',
+                         str(tmp_path / 'interim') + '/', url, n_pages=3)
+    data = scraper.get_data()
+    return scraper, data
+
+
+def listings(log, status):
+    """Return the listing numbers of the logged responses of a status."""
+    return sorted(int(path.split('/')[2]) for path, code in log
+                  if path.startswith('/annunci/') and code == status)
+
+
+def test_delta_crawl_refetches_only_changed_listings(tmp_path):
+    (tmp_path / 'raw').mkdir()
+    (tmp_path / 'interim').mkdir()
+    pages = [listing_page(i) for i in range(N_LISTINGS)]
+    log = []
+    with serve_pages(pages, per_page=10, validators=True, log=log) as url:
+        _, first = crawl(tmp_path, url)
+        assert listings(log, 200) == list(range(N_LISTINGS))
+        assert len(first[0]) == N_LISTINGS
+
+        # Change two listings and delist one between the runs
+        pages[3] = listing_page(3, seed=1)
+        pages[7] = listing_page(7, seed=1)
+        pages[5] = None
+        del log[:]
+        scraper, second = crawl(tmp_path, url)
+        assert listings(log, 200) == [3, 7]
+        assert listings(log, 304) == [i for i in range(N_LISTINGS)
+                                      if i not in (3, 5, 7)]
+        assert scraper.store.removed_urls() == [
+            url.split('/vendita')[0] + '/annunci/5/']
+        assert list(scraper.store.records()) == [
+            parse_listing(page) for page in pages if page is not None]
+        assert len(second[0]) == N_LISTINGS - 1
+
+        # Validators outliving the archive fall back to a full download
+        shutil.rmtree(tmp_path / 'raw' / 'archive')
+        del log[:]
+        scraper, third = crawl(tmp_path, url)
+        unchanged = [i for i in range(N_LISTINGS) if i != 5]
+        assert listings(log, 304) == unchanged
+        assert listings(log, 200) == unchanged
+        for view, expected in zip(third, second):
+            assert view.equals(expected)
@@ -0,0 +1,25 @@
+import pandas as pd
+from src.features import impute_district, read_overrides
+
+
+def test_impute_district_from_overrides_table():
+    data = pd.DataFrame({'Indirizzo': ['via A', 'via B'],
+                         'Zona': ['Centro', None]})
+    out = impute_district({'via B': 'Oltrarno'})(data)
+    assert out['Zona'].tolist() == ['Centro', 'Oltrarno']
+
+
+def test_later_overrides_take_precedence(tmp_path):
+    filename = tmp_path / 'overrides.csv'
+    filename.write_text('indirizzo,zona\n'
+                        'via A,Centro\n'
+                        'via B,Oltrarno\n'
+                        'via A,Firenze Nord\n')
+    assert read_overrides(str(filename)) == {'via A': 'Firenze Nord',
+                                             'via B': 'Oltrarno'}
+
+    data = pd.DataFrame({'Indirizzo': ['via A', 'via B', 'via C'],
+                         'Zona': ['Centro', None, None]})
+    out = impute_district(str(filename))(data)
+    assert out['Zona'][:2].tolist() == ['Firenze Nord', 'Oltrarno']
+    assert out['Zona'].isna()[2]
@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+from src.features import create_energy_efficiency
+
+# The cleaning steps are written for the pandas version of
+# requirements.txt
+pytestmark = pytest.mark.skipif(pd.__version__ >= '2',
+                                reason='needs pandas 1')
+
+
+def test_energy_efficiency_aligns_on_the_data_index():
+    # Earlier filters leave gaps in the index of the data
+    data = pd.DataFrame({'Efficienza energetica': ['A4', 'C', None, 'G']},
+                        index=[3, 5, 6, 9])
+    out = create_energy_efficiency(data)
+    assert out.index.tolist() == [3, 5, 6, 9]
+    assert out['Efficienza_energetica'][[3, 5, 9]].tolist() == [
+        'alta (A, A+, A1-A4)', 'media (B, C, D)', 'bassa (E, F, G)']
+    assert out['Efficienza_energetica'].isna().tolist() == [
+        False, False, True, False]
+
+    # Each row only depends on itself, as the incremental build assumes
+    subset = create_energy_efficiency(data.loc[[5, 9]].copy())
+    assert subset['Efficienza_energetica'].equals(
+        out['Efficienza_energetica'][[5, 9]])
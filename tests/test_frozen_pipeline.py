@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.features import (create_pipeline, drop_duplicates, drop_nans,
+                          filter_data, remove_outliers_iqr, FrozenPipeline)
+
+STEPS = [drop_duplicates, drop_nans(['c']), filter_data('a', 0.1, 0.9),
+         remove_outliers_iqr(['b']), filter_data('c', 0.05, 0.95),
+         remove_outliers_iqr(['d', 'e'], k=0.5)]
+
+
+def make_data(n_rows=10000):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.standard_normal((n_rows, 5)) ** 2,
+                        columns=list('abcde'))
+    data.loc[rng.random(n_rows) < 0.05, 'c'] = np.nan
+    return data
+
+
+@pytest.mark.parametrize('options', [{}, {'deferred': True},
+                                     {'n_jobs': 2}])
+def test_pipeline_statistics_are_frozen_statistics(options):
+    statistics = {}
+    out = create_pipeline(STEPS, statistics=statistics, **options)(
+        make_data())
+    pd.testing.assert_frame_equal(out, create_pipeline(STEPS)(make_data()))
+
+    frozen = FrozenPipeline(STEPS, list('abcde'))
+    assert statistics == frozen.fit(make_data()).statistics
+    assert frozen.set_state({'statistics': statistics}) is frozen
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+import yaml
+from pathlib import Path
+from click.testing import CliRunner
+from src.features import parse_config, write_data, load_split
+from src.benchmarks import raw_tables
+from src.features.build_features import main
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# The cleaning steps are written for the pandas version of
+# requirements.txt
+pytestmark = pytest.mark.skipif(pd.__version__ >= '2',
+                                reason='needs pandas 1')
+
+
+def write_raw(path, config, tables, n_rows):
+    """Write the first n_rows of raw tables as Parquet files."""
+    for filename, table in zip(config['cleaning']['filenames'], tables):
+        write_data(table.iloc[:n_rows], str(path) + filename.replace(
+            '.xlsx', '.parquet'))
+
+
+def build(raw, out, config_file, *options):
+    result = CliRunner().invoke(main, [str(raw), str(out), str(config_file),
+                                       *options], catch_exceptions=False)
+    assert result.exit_code == 0, result.output
+    data = pd.read_csv(str(out) + '/data_clean.csv')
+    train, test = load_split(str(out) + '/split.parquet')[:2]
+    return data, len(train) + len(test)
+
+
+def test_incremental_build_after_full_build_has_no_duplicates(tmp_path):
+    config = parse_config(str(ROOT / 'config.yml'))
+    config['cleaning']['district_overrides'] = str(
+        ROOT / config['cleaning']['district_overrides'])
+    config['caching']['cache_dir'] = str(tmp_path / 'cache')
+    config_file = tmp_path / 'config.yml'
+    config_file.write_text(yaml.safe_dump(config))
+    raw, out = tmp_path / 'raw', tmp_path / 'out'
+    raw.mkdir()
+    out.mkdir()
+    tables = raw_tables(12000, config)
+
+    write_raw(raw, config, tables, 10000)
+    build(raw, out, config_file, '--incremental')
+    state_file = out / 'cleaning_state.pkl'
+    state = state_file.read_bytes()
+    write_raw(raw, config, tables, 12000)
+    full, n_split = build(raw, out, config_file)
+    assert not state_file.exists()
+    assert not full.duplicated().any()
+
+    # The state of the first incremental build does not describe the new
+    # split, so all the rows are cleaned again instead of appending the
+    # last 2000 a second time, even if the state is left behind
+    for left_behind in (False, True):
+        if left_behind:
+            state_file.write_bytes(state)
+        data, n_incremental = build(raw, out, config_file, '--incremental')
+        assert not data.duplicated().any()
+        pd.testing.assert_frame_equal(data, full)
+        assert n_incremental == n_split == len(full)
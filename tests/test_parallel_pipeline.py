@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.features import (create_pipeline, drop_columns, drop_duplicates,
+                          drop_nans, filter_data, remove_outliers_iqr,
+                          clean_outliers, row_local, reads, writes)
+
+
+def scale(col, factor):
+    """Row-local closure, which the worker processes receive pickled."""
+
+    @row_local
+    @reads([col])
+    @writes([col + '_scaled'])
+    def scaler(data):
+        data[col + '_scaled'] = data[col] * factor
+        return data
+
+    return scaler
+
+
+STEPS = [drop_duplicates, drop_nans(['c']), scale('a', 2.0),
+         clean_outliers('b', 0.5, 0.0), filter_data('a_scaled', 0.1, 1.9),
+         remove_outliers_iqr(['d']), scale('d', 3.0),
+         filter_data('e', 0.1, 0.9), drop_columns(['f'])]
+
+
+def make_data(n_rows=10000):
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.random((n_rows, 6)), columns=list('abcdef'))
+    data.loc[rng.random(n_rows) < 0.05, 'c'] = np.nan
+    data.loc[::100, 'b'] = 0.5
+    return data
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3])
+def test_parallel_output_is_serial_output(n_jobs):
+    serial = create_pipeline(STEPS)(make_data())
+    parallel = create_pipeline(STEPS, n_jobs=n_jobs)(make_data())
+    pd.testing.assert_frame_equal(parallel, serial)
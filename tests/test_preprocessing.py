@@ -0,0 +1,18 @@
+import pandas as pd
+import pytest
+from src.features import apply_schema
+from src.models import preprocessing_pipeline
+
+
+def test_boolean_features_reject_flag_strings():
+    X = apply_schema(pd.DataFrame({'Terrazza': [True, False, True],
+                                   'Piscina': [False, False, False],
+                                   'Superficie': [50.0, 60.0, 70.0]}))
+    pipeline = preprocessing_pipeline(
+        [], ['Superficie'], ['Terrazza', 'Piscina']).fit(X)
+    # A flag never seen when fitting is still encoded
+    encoded = pipeline.transform(X.assign(Piscina=True))
+    assert encoded[:, 1:].tolist() == [[0, 1, 0, 1], [1, 0, 0, 1],
+                                       [0, 1, 0, 1]]
+    with pytest.raises(ValueError):
+        pipeline.transform(X.assign(Terrazza='sì', Piscina='no'))
@@ -0,0 +1,69 @@
+import re
+import time
+from src.data import create_session, fetch_all, RequestScheduler
+from src.benchmarks import listing_page, serve_pages
+
+N_LISTINGS = 40
+THROTTLE = 5
+MAX_WORKERS = 8
+
+
+class TimedLog(list):
+    """Log of the server responses with the time they were sent."""
+
+    def append(self, item):
+        super().append(item + (time.monotonic(),))
+
+
+class RecordingScheduler(RequestScheduler):
+    """Scheduler recording the lowest concurrency limit it backed off
+    to."""
+
+    def _decrease(self):
+        super()._decrease()
+        self.lowest = min(getattr(self, 'lowest', self.limit), self.limit)
+
+
+def test_scheduler_backs_off_and_retries_throttled_requests():
+    pages = [listing_page(i) for i in range(N_LISTINGS)]
+    log = TimedLog()
+    with serve_pages(pages, delay=0.01, log=log, throttle=THROTTLE,
+                     retry_after=1) as url:
+        base = url.split('/vendita')[0]
+        urls = ['{}/annunci/{}/'.format(base, i) for i in range(N_LISTINGS)]
+        scheduler = RecordingScheduler(create_session(MAX_WORKERS),
+                                       max_workers=MAX_WORKERS, backoff=0.01)
+        start = time.monotonic()
+        responses = list(fetch_all(scheduler, urls, max_workers=MAX_WORKERS))
+        elapsed = time.monotonic() - start
+
+    # Every throttled request is retried once and succeeds
+    n_throttled = N_LISTINGS // THROTTLE
+    assert [response.status_code for _, response in responses] == \
+        [200] * N_LISTINGS
+    assert [response.text for _, response in responses] == pages
+    assert sorted(status for _, status, _ in log) == \
+        [200] * N_LISTINGS + [429] * (n_throttled // 2) + \
+        [503] * (n_throttled // 2)
+    assert scheduler.stats['ok'] == N_LISTINGS
+    assert scheduler.stats['retries'] == n_throttled
+    assert scheduler.stats['failed'] == 0
+
+    # Concurrency backs off and the Retry-After pauses are honoured
+    assert scheduler.lowest <= MAX_WORKERS / 2
+    sent = {}
+    for path, status, sent_at in log:
+        if status != 200:
+            sent[path] = sent_at
+        elif path in sent:
+            assert sent_at - sent.pop(path) >= 0.99
+    assert not sent
+
+    # The reported throughput is that of the whole run
+    n_pages, seconds, rate = re.match(
+        r'(\d+) pages .* in ([\d.]+) s: ([\d.]+) pages/s',
+        scheduler.report()).groups()
+    assert int(n_pages) == N_LISTINGS
+    assert abs(float(seconds) - elapsed) <= 0.1 + 0.1 * elapsed
+    assert abs(float(rate) - N_LISTINGS / elapsed) <= \
+        0.2 * N_LISTINGS / elapsed
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV, KFold, cross_val_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from src.models import FoldCache, cross_val_scores, successive_halving
+from src.models import tuning_utils
+
+CV = KFold(5)
+SCORING = 'neg_mean_absolute_error'
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame(rng.normal(size=(200, 4)) * [1, 10, 100, 1000],
+                     columns=['a', 'b', 'c', 'd'])
+    y = X.values @ [1, 0.1, 0.01, 0.001] + rng.normal(size=200)
+    return X, y
+
+
+def model():
+    return Pipeline([('scale', StandardScaler()), ('ridge', Ridge())])
+
+
+def test_cross_val_scores_match_sklearn_and_cache(data, monkeypatch):
+    X, y = data
+    expected = cross_val_score(model(), X, y, scoring=SCORING, cv=CV)
+    cache = FoldCache()
+    np.testing.assert_allclose(
+        cross_val_scores(model(), X, y, scoring=SCORING, cv=CV, cache=cache),
+        expected)
+    assert len(cache.folds) == CV.get_n_splits()
+
+    # The cached folds give the same scores without refitting
+    def refit(*args):
+        raise AssertionError('pre-processing refitted')
+
+    monkeypatch.setattr(tuning_utils, '_fit_transform_fold', refit)
+    np.testing.assert_allclose(
+        cross_val_scores(model().set_params(ridge__alpha=1.0), X, y,
+                         scoring=SCORING, cv=CV, cache=cache),
+        expected)
+
+
+@pytest.mark.parametrize('param_grid', [
+    {'ridge__alpha': [0.1, 1.0, 100.0]},
+    {'scale__with_std': [True, False], 'ridge__alpha': [0.1, 100.0]}])
+def test_search_scores_match_grid_search(data, param_grid):
+    # The first grid cross-validates cached folds, the second refits the
+    # pre-processing steps per candidate
+    X, y = data
+    search = GridSearchCV(model(), param_grid, scoring=SCORING, cv=CV).fit(
+        X, y)
+    best, results = successive_halving(model(), X, y, param_grid, cv=5,
+                                       scoring=SCORING, factor=None)
+    assert best == search.best_params_
+    np.testing.assert_allclose(results['mean_test_score'],
+                               search.cv_results_['mean_test_score'])
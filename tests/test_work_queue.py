@@ -0,0 +1,58 @@
+import multiprocessing
+from src.data import WebScraper, WorkQueue, parse_listing
+from src.benchmarks import listing_page, serve_pages
+
+N_LISTINGS = 60
+PER_PAGE = 10
+
+
+def scraper(tmp_path, url):
+    return WebScraper(str(tmp_path / 'raw') + '/',
+                      str(tmp_path / 'interim') + '/', url,
+                      n_pages=N_LISTINGS // PER_PAGE)
+
+
+def work(tmp_path, url, worker_id):
+    """Run a worker process of a distributed crawl."""
+    scraper(tmp_path, url).work(WorkQueue(tmp_path / 'queue.sqlite'),
+                                worker_id, batch_size=4, lease_seconds=60,
+                                poll_seconds=0.1)
+
+
+def test_workers_crawl_every_listing_once(tmp_path):
+    (tmp_path / 'raw').mkdir()
+    (tmp_path / 'interim').mkdir()
+    pages = [listing_page(i) for i in range(N_LISTINGS)]
+    with serve_pages(pages, per_page=PER_PAGE) as url:
+        queue = WorkQueue(tmp_path / 'queue.sqlite')
+        main = scraper(tmp_path, url)
+        main.seed_queue(queue)
+        # A worker that dies after claiming two index pages: their lease
+        # expires and the other workers reclaim them
+        lost = [task_id for task_id, _, _ in queue.claim(
+            'dead', n=2, lease_seconds=1)]
+
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=work,
+                                   args=(tmp_path, url, 'worker-{}'.format(i)))
+                   for i in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=120)
+            assert worker.exitcode == 0
+
+        assert queue.is_finished()
+        assert queue.counts() == {'done': N_LISTINGS // PER_PAGE +
+                                  N_LISTINGS}
+        owners = queue.conn.execute(
+            'SELECT owner, attempts FROM tasks WHERE id IN (?, ?)',
+            lost).fetchall()
+        assert [attempts for _, attempts in owners] == [2, 2]
+        assert {owner for owner, _ in owners} <= {'worker-0', 'worker-1'}
+
+        data = main.assemble_queue(queue)
+        assert len(data[0]) == N_LISTINGS
+        assert list(main.store.records()) == [parse_listing(page)
+                                              for page in pages]
+        assert main.assemble_queue(queue) is None